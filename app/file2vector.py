@@ -0,0 +1,265 @@
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+from scripts.utils import load_custom_settings, create_supabase_client, fit_chunk_size, CUSTOM_SETTINGS_PATH
+from scripts.ingest import collect_files, make_job, ingest_files, summarize
+from scripts.journal import get_journal
+from scripts.metrics import metrics, set_profile_dir
+from scripts.chunking import NLTK_DATA_PATH, TIKTOKEN_CACHE_PATH
+from scripts.dedup import DEDUP_SCOPES
+from scripts.vector_store import create_vector_store, DEFAULT_LOCAL_STORE_PATH, VECTOR_STORE_BACKENDS
+
+# ✅ Settings that can come from the environment instead of the settings file
+ENV_SETTINGS = ("SUPABASE_URL", "SUPABASE_KEY", "COHERE_API_KEY", "OPENAI_API_KEY", "TABLE_NAME")
+
+
+# ✅ Function to merge the settings file, environment variables and command line flags
+def resolve_settings(args):
+    settings = load_custom_settings(args.settings) if os.path.exists(args.settings) else {}
+    for name in ENV_SETTINGS:
+        if os.environ.get(name):
+            settings[name] = os.environ[name]
+    overrides = {
+        "TABLE_NAME": args.table,
+        "EXPECTED_DIM": args.expected_dim,
+        "CHUNK_SIZE": args.chunk_size,
+        "CHUNK_OVERLAP": args.chunk_overlap,
+        "EXTRACT_WORKERS": args.workers,
+        "VECTOR_STORE": args.store,
+        "LOCAL_STORE_PATH": args.store_path,
+        "DEDUP": getattr(args, "dedup", None),
+        "MEMORY_BUDGET_MB": getattr(args, "memory_budget_mb", None),
+    }
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+    return settings
+
+
+# ✅ `file2vector ingest <path>`: batch ingest files or directories without the UI
+def ingest_command(args):
+    settings = resolve_settings(args)
+    model = args.model
+    api_key = settings.get("COHERE_API_KEY" if model == "Cohere" else "OPENAI_API_KEY")
+    backend = settings.get("VECTOR_STORE", "Supabase")
+    required = ("SUPABASE_URL", "SUPABASE_KEY", "TABLE_NAME") if backend == "Supabase" else ()
+    missing = [name for name in required if not settings.get(name)]
+    if not api_key:
+        missing.append("COHERE_API_KEY" if model == "Cohere" else "OPENAI_API_KEY")
+    if missing:
+        print(f"error: missing settings: {', '.join(missing)}", file=sys.stderr)
+        return 2
+
+    files = [file for path in args.paths for file in collect_files(path, args.recursive)]
+    if not files:
+        print("error: no supported files found", file=sys.stderr)
+        return 2
+
+    chunk_size = fit_chunk_size(settings.get("CHUNK_SIZE", 300), model)  # Within the provider's input limit
+    jobs = [make_job(file, chunk_size, int(settings.get("CHUNK_OVERLAP", 0)), int(settings.get("TABLE_BATCH_ROWS", 1000)),
+                     replace=args.replace) for file in files]
+
+    set_profile_dir(args.profile_dir or settings.get("PROFILE_DIR"))
+    supabase = create_supabase_client(settings["SUPABASE_URL"], settings["SUPABASE_KEY"]) if backend == "Supabase" else None
+    store = create_vector_store(backend, supabase, settings.get("TABLE_NAME"), settings.get("LOCAL_STORE_PATH", DEFAULT_LOCAL_STORE_PATH))
+    start = time.perf_counter()
+    results = []
+    for _, result in ingest_files(
+        jobs, store, settings.get("TABLE_NAME"), int(settings.get("EXPECTED_DIM", 1024)), model,
+        settings.get("COHERE_API_KEY"), settings.get("OPENAI_API_KEY"),
+        workers=int(settings.get("EXTRACT_WORKERS", 1)),
+        dedup=settings.get("DEDUP", "Off"),
+        memory_budget=int(settings.get("MEMORY_BUDGET_MB", 256)) * 1024 * 1024,
+        insert_batch_rows=int(settings.get("INSERT_BATCH_ROWS", 500)),
+        insert_batch_bytes=int(settings.get("INSERT_BATCH_BYTES", 4_000_000)),
+        insert_concurrency=int(settings.get("INSERT_CONCURRENCY", 2)),
+        embed_concurrency=int(settings.get("EMBED_CONCURRENCY", 4)),
+    ):
+        results.append(result)
+        line = (f"[{len(results)}/{len(jobs)}] {result['status']:8} {result['file']}: {result['chunks']} chunks, "
+                f"{result['rows_written']} rows, extract {result['extract_seconds']:.2f}s, upload {result['upload_seconds']:.2f}s")
+        if result["error"]:
+            line += f" ({result['error']})"
+        print(line, flush=True)
+
+    summary = summarize(results, time.perf_counter() - start)
+    store.close()
+    print(f"\n{summary['files']} files ({summary['failed']} failed), {summary['chunks']} chunks, "
+          f"{summary['tokens']} tokens, {summary['rows_written']} rows in {summary['seconds']:.1f}s "
+          f"({summary['chunks_per_second']:.1f} chunks/s)")
+    if summary["skipped"]:
+        print(f"{summary['skipped']} chunks were already stored by earlier runs and were skipped")
+    if summary["deduplicated"]:
+        print(f"{summary['deduplicated']} duplicate chunks were dropped before embedding "
+              f"(~{summary['requests_saved']} embedding requests and {summary['deduplicated']} rows saved)")
+    if args.metrics_file:
+        print(f"Metrics written to {metrics.write_prometheus(args.metrics_file)}")
+    return 1 if summary["failed"] else 0
+
+
+# ✅ `file2vector jobs`: list checkpointed ingest jobs; unfinished ones resume when their files are ingested again
+def jobs_command(args):
+    jobs = get_journal().jobs(status=args.status, limit=args.limit)
+    if not jobs:
+        print("no jobs")
+    for job in jobs:
+        updated = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(job["updated_at"]))
+        line = f"{updated} {job['job_id']} {job['status']:8} {job['filename']}: {job['stored']}/{job['chunks']} chunks stored ({job['target']})"
+        if job["error"]:
+            line += f" ({job['error']})"
+        print(line)
+    return 0
+
+
+# ✅ `file2vector delete`: batched, resumable delete by filename, content hash or ingest job (or everything)
+def delete_command(args):
+    from scripts.deletion import delete_scope, describe_scope, count_rows, delete_rows
+
+    settings = resolve_settings(args)
+    backend = settings.get("VECTOR_STORE", "Supabase")
+    missing = [name for name in ("SUPABASE_URL", "SUPABASE_KEY", "TABLE_NAME") if backend == "Supabase" and not settings.get(name)]
+    if missing:
+        print(f"error: missing settings: {', '.join(missing)}", file=sys.stderr)
+        return 2
+    selected = [(kind, value) for kind, value in (("Filename", args.filename), ("Content hash", args.content_hash), ("Ingest job", args.job)) if value]
+    if len(selected) > 1 or (not selected and not args.all):
+        print("error: pass exactly one of --filename, --content-hash, --job or --all", file=sys.stderr)
+        return 2
+
+    scope = delete_scope(*selected[0]) if selected else delete_scope()
+    supabase = create_supabase_client(settings["SUPABASE_URL"], settings["SUPABASE_KEY"]) if backend == "Supabase" else None
+    store = create_vector_store(backend, supabase, settings.get("TABLE_NAME"), settings.get("LOCAL_STORE_PATH", DEFAULT_LOCAL_STORE_PATH))
+    rows = count_rows(store, scope)
+    if args.dry_run:
+        print(f"{rows} {describe_scope(scope)} would be deleted")
+        return 0
+
+    def on_progress(done, total, message):
+        print(message, flush=True)
+
+    deleted = delete_rows(store, scope, args.batch_rows, on_progress=on_progress)
+    store.close()
+    print(f"deleted {deleted} {describe_scope(scope)}")
+    return 0
+
+
+# ✅ `file2vector bench`: offline throughput benchmark with a fake provider and database
+def bench_command(args):
+    from scripts.benchmark import run_benchmark, save_results, compare_results
+
+    def on_progress(iteration, file_type, result):
+        print(f"[{iteration + 1}/{args.repeat}] {file_type:5} {result['chunks']} chunks in {result['seconds']:.2f}s", flush=True)
+
+    results = run_benchmark(
+        args.workdir, args.pages, args.paragraphs, args.rows, args.repeat, args.store,
+        args.embed_latency_ms / 1000, args.embed_error_rate, args.insert_latency_ms / 1000, args.insert_error_rate,
+        args.chunk_size, args.expected_dim, args.embed_concurrency, on_progress=on_progress,
+    )
+    path = save_results(results, args.output)
+
+    print(f"\n{'file':6}{'chunks':>8}{'chunks/s':>12}{'best (s)':>10}")
+    for file_type, result in results["files"].items():
+        print(f"{file_type:6}{result['chunks']:>8}{result['chunks_per_second']:>12.1f}{result['best_seconds']:>10.2f}")
+    print(f"\n{'stage':16}{'count':>7}{'p50 (ms)':>11}{'p99 (ms)':>11}")
+    for stage, stats in sorted(results["stages"].items()):
+        print(f"{stage:16}{stats['count']:>7}{stats['p50_ms']:>11.2f}{stats['p99_ms']:>11.2f}")
+    print(f"\npeak RSS {results['peak_rss_mb']} MB, {results['store_request_bytes'] / 1e6:.1f} MB sent to the store")
+
+    print(f"\n{'cold start':18}{'import (s)':>11}  heavy modules loaded")
+    for module, result in results["cold_start"].items():
+        seconds = "error" if result["seconds"] is None else f"{result['seconds']:.2f}"
+        flag = "" if result["within_budget"] else "  ⚠️ over budget"
+        print(f"{module:18}{seconds:>11}  {', '.join(result['heavy_modules']) or result['error'] or '-'}{flag}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            ratios = compare_results(results, json.load(f))
+        for file_type, ratio in ratios.items():
+            print(f"{file_type}: {ratio:.2f}x the chunks/s of {args.compare}")
+    print(f"results saved to {path}")
+    return 0 if all(result["within_budget"] for result in results["cold_start"].values()) else 1
+
+
+# ✅ `file2vector fetch-tokenizer`: download the Punkt sentence model and the tiktoken encoding once, for hosts that run offline
+def fetch_tokenizer_command(args):
+    from scripts.chunking import download_sentence_model, download_token_encoding
+    print(f"Punkt model saved under {download_sentence_model(args.path)}")
+    print(f"Token encoding saved under {download_token_encoding(args.tiktoken_path)}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="file2vector", description="Extract, chunk, embed and store files in a vector database.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="Ingest files or directories in batch mode.")
+    ingest.add_argument("paths", nargs="+", help="Files or directories to ingest.")
+    ingest.add_argument("--recursive", "-r", action="store_true", help="Descend into subdirectories.")
+    ingest.add_argument("--model", choices=["OpenAI", "Cohere"], default="OpenAI", help="Embedding provider.")
+    ingest.add_argument("--settings", default=CUSTOM_SETTINGS_PATH, help="Settings file (JSON).")
+    ingest.add_argument("--store", choices=VECTOR_STORE_BACKENDS, help="Vector store backend.")
+    ingest.add_argument("--store-path", help="Directory of the local vector store.")
+    ingest.add_argument("--table", help="Target table name.")
+    ingest.add_argument("--expected-dim", type=int, help="Stored vector dimension.")
+    ingest.add_argument("--chunk-size", type=int, help="Chunk size in tokens.")
+    ingest.add_argument("--chunk-overlap", type=int, help="Chunk overlap in tokens.")
+    ingest.add_argument("--workers", type=int, help="Extraction processes.")
+    ingest.add_argument("--replace", action="store_true", help="Delete each file's existing rows before inserting.")
+    ingest.add_argument("--dedup", choices=DEDUP_SCOPES, help="Drop duplicate chunks before embedding, per document or across the run.")
+    ingest.add_argument("--memory-budget-mb", type=int, help="Extracted chunks held in memory per file before extraction pauses.")
+    ingest.add_argument("--metrics-file", help="Write pipeline metrics in Prometheus text format to this file.")
+    ingest.add_argument("--profile-dir", help="Write a cProfile dump per file to this directory.")
+    ingest.set_defaults(handler=ingest_command)
+
+    bench = commands.add_parser("bench", help="Benchmark ingest throughput offline (fake provider and database).")
+    bench.add_argument("--pages", type=int, default=50, help="Pages in the generated PDF (0 to skip).")
+    bench.add_argument("--paragraphs", type=int, default=400, help="Paragraphs in the generated DOCX (0 to skip).")
+    bench.add_argument("--rows", type=int, default=20000, help="Rows in the generated CSV and XLSX (0 to skip).")
+    bench.add_argument("--repeat", type=int, default=3, help="Runs per file.")
+    bench.add_argument("--store", choices=VECTOR_STORE_BACKENDS, default="Supabase", help="Fake Supabase or a temporary local store.")
+    bench.add_argument("--embed-latency-ms", type=float, default=50.0, help="Simulated latency per embedding request.")
+    bench.add_argument("--embed-error-rate", type=float, default=0.0, help="Fraction of embedding requests failing with 429/503.")
+    bench.add_argument("--insert-latency-ms", type=float, default=20.0, help="Simulated latency per insert request.")
+    bench.add_argument("--insert-error-rate", type=float, default=0.0, help="Fraction of insert requests failing with 503.")
+    bench.add_argument("--chunk-size", type=int, default=300, help="Chunk size in tokens.")
+    bench.add_argument("--expected-dim", type=int, default=1024, help="Stored vector dimension.")
+    bench.add_argument("--embed-concurrency", type=int, default=4, help="Embedding requests in flight.")
+    bench.add_argument("--workdir", help="Directory for generated inputs and caches (default: a temporary directory).")
+    bench.add_argument("--output", help="Results file (default: cache/benchmarks/bench-<timestamp>.json).")
+    bench.add_argument("--compare", help="Earlier results file to compare throughput against.")
+    bench.set_defaults(handler=bench_command)
+
+    delete = commands.add_parser("delete", help="Delete stored rows in resumable batches.")
+    delete.add_argument("--filename", help="Delete the rows of this file (metadata.filename).")
+    delete.add_argument("--content-hash", help="Delete the rows of this file version (metadata.content_hash).")
+    delete.add_argument("--job", help="Delete the rows stored by this ingest job (see `jobs`).")
+    delete.add_argument("--all", action="store_true", help="Delete every row.")
+    delete.add_argument("--dry-run", action="store_true", help="Only count the rows that would be deleted.")
+    delete.add_argument("--batch-rows", type=int, default=1000, help="Rows per delete request.")
+    delete.add_argument("--settings", default=CUSTOM_SETTINGS_PATH, help="Settings file (JSON).")
+    delete.add_argument("--store", choices=VECTOR_STORE_BACKENDS, help="Vector store backend.")
+    delete.add_argument("--store-path", help="Directory of the local vector store.")
+    delete.add_argument("--table", help="Target table name.")
+    delete.set_defaults(handler=delete_command, expected_dim=None, chunk_size=None, chunk_overlap=None, workers=None)
+
+    tokenizer = commands.add_parser("fetch-tokenizer", help="Download the Punkt sentence model and the token encoding for offline use.")
+    tokenizer.add_argument("--path", default=NLTK_DATA_PATH, help="NLTK data directory to fill.")
+    tokenizer.add_argument("--tiktoken-path", default=TIKTOKEN_CACHE_PATH, help="tiktoken cache directory to fill (read via TIKTOKEN_CACHE_DIR if not the default).")
+    tokenizer.set_defaults(handler=fetch_tokenizer_command)
+
+    jobs = commands.add_parser("jobs", help="List checkpointed ingest jobs.")
+    jobs.add_argument("--status", choices=["running", "partial", "failed", "done"], help="Only jobs in this state.")
+    jobs.add_argument("--limit", type=int, default=50, help="Number of jobs to show.")
+    jobs.set_defaults(handler=jobs_command)
+    return parser
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(message)s")
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
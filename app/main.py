@@ -1,37 +1,25 @@
+import importlib
 import streamlit as st
-from st_pages import database, contact, home, monitor, upload
-import nltk
 # from scripts import query_agent
 
+# Must be the first Streamlit call of every run
+st.set_page_config(page_title="File2Vector", page_icon="📂", layout="wide")
 
-# ✅ Cache NLTK download so it wruns only once per session
-@st.cache_resource
-def load_nltk_dependencies():
-    nltk.download('punkt')
-    
-# Call the cachd function
-load_nltk_dependencies()
- 
-# Streamlit Sidebar for API and Table Configuration@
+# ✅ Pages are imported when first opened, so Home and Contact never load pandas, PDF parsers or API clients
+PAGES = {
+    "Home": "st_pages.home",
+    "Upload": "st_pages.upload",
+    "Monitor": "st_pages.monitor",
+    "Search": "st_pages.search",
+    # "Agents": "scripts.query_agent",
+    "Database": "st_pages.database",
+    "Contact": "st_pages.contact",
+}
+
+# Streamlit Sidebar for API and Table Configuration
 st.sidebar.title("Navigation")
 
-page = st.sidebar.radio("Go to", ["Home", "Upload", "Monitor", "Database", "Contact"])
+page = st.sidebar.radio("Go to", list(PAGES))
 st.sidebar.write("***")
 
-if page == "Home":
-    home.show()
-
-elif page == "Upload":
-    upload.show()  
-
-elif page == "Monitor":
-    monitor.show()
-    
-# elif page == "Agents":
-#     query_agent.show()
-    
-elif page == "Database":
-    database.show()
-    
-elif page == "Contact":
-    contact.show()
+importlib.import_module(PAGES[page]).show()
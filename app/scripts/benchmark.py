@@ -0,0 +1,498 @@
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import tempfile
+import threading
+import subprocess
+from collections import defaultdict
+import numpy as np
+from scripts.utils import (
+    EMBEDDING_PROVIDERS, register_embedding_client, extract_text_from_pdf, extract_text_from_docx, split_text,
+    iter_table_frames, table_rows_to_chunks, upload_file_chunks,
+)
+from scripts.pipeline import get_rate_limiter
+from scripts.metrics import metrics
+from scripts.embedding_cache import EmbeddingCache
+from scripts.vector_store import BatchWriter, SupabaseVectorStore, LocalVectorStore
+
+# The fake provider answers as Cohere under this key; it never leaves the process
+BENCHMARK_MODEL = "Cohere"
+BENCHMARK_API_KEY = "offline-benchmark"
+BENCHMARK_TABLE = "benchmark_vectors"
+
+DEFAULT_RESULTS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "cache", "benchmarks")
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# ✅ Cold start: entry modules imported in a fresh interpreter, the heavy dependencies they must not pull in,
+# and the import time allowed for each
+COLD_START_MODULES = ("st_pages.home", "st_pages.contact", "scripts.utils", "scripts.ingest")
+HEAVY_MODULES = ("pandas", "pymupdf", "docx", "openpyxl", "cohere", "openai", "supabase", "nltk")
+COLD_START_BUDGET_SECONDS = 1.5
+
+WORDS = (
+    "vector embedding model document chunk token search index table page storage query latency batch "
+    "provider request database memory stream file upload metadata result score sentence paragraph "
+    "the a of and to in is for with on by as at from that this it be are was"
+).split()
+
+
+# ✅ Per-stage latency samples (seconds) collected from any thread
+class StageTimings:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self.lock:
+            self.samples[stage].append(seconds)
+
+    def time(self, stage):
+        timings = self
+
+        class Timer:
+            def __enter__(self):
+                self.start = time.perf_counter()
+                return self
+
+            def __exit__(self, exc_type, exc_value, traceback):
+                timings.add(stage, time.perf_counter() - self.start)
+
+        return Timer()
+
+    def summary(self):
+        with self.lock:
+            samples = {stage: np.asarray(values) * 1000 for stage, values in self.samples.items()}
+        return {
+            stage: {
+                "count": len(values),
+                "p50_ms": round(float(np.percentile(values, 50)), 3),
+                "p99_ms": round(float(np.percentile(values, 99)), 3),
+                "mean_ms": round(float(values.mean()), 3),
+                "total_s": round(float(values.sum()) / 1000, 3),
+            }
+            for stage, values in samples.items()
+        }
+
+
+# ✅ Function to record every call of `fn` under `stage`
+def timed(fn, timings, stage):
+    def wrapper(*args, **kwargs):
+        with timings.time(stage):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+# ✅ Error shaped like a provider/PostgREST HTTP error, so the real retry logic handles it
+class FakeHTTPError(Exception):
+    def __init__(self, status_code, retry_after=0.05):
+        super().__init__(f"Simulated HTTP {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"status_code": status_code, "headers": {"retry-after": str(retry_after)}})()
+
+
+# ✅ Deterministic offline embedding provider with the Cohere client's `embed` interface
+# Vectors depend only on the text; latency and error rate are configurable
+class FakeEmbeddingClient:
+    def __init__(self, dimension, latency=0.0, error_rate=0.0, seed=0, timings=None):
+        self.dimension = dimension
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.timings = timings
+        self.requests = 0
+        self.errors = 0
+
+    def embed(self, texts, model=None, input_type=None):
+        start = time.perf_counter()
+        with self.lock:
+            self.requests += 1
+            fail = self.random.random() < self.error_rate
+            jitter = self.random.uniform(0.8, 1.2)
+        if self.latency:
+            time.sleep(self.latency * jitter)
+        if fail:
+            with self.lock:
+                self.errors += 1
+            raise FakeHTTPError(self.random.choice([429, 503]))
+
+        embeddings = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+            embeddings.append((vector / np.linalg.norm(vector)).tolist())  # Real clients return JSON floats
+        if self.timings is not None:
+            self.timings.add("embed_request", time.perf_counter() - start)
+        return type("EmbedResponse", (), {"embeddings": embeddings})()
+
+
+# ✅ In-process stand-in for the Supabase client: the PostgREST query builder calls the app uses
+class FakeSupabase:
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0, timings=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.timings = timings
+        self.rows = defaultdict(list)
+        self.next_id = defaultdict(int)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.request_bytes = 0
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table_name = table
+        self.operation = "select"
+        self.payload = None
+        self.filters = []
+        self.count = None
+        self.head = False
+        self.with_metadata = False
+        self.max_rows = None
+
+    def insert(self, rows):
+        self.operation, self.payload = "insert", rows
+        return self
+
+    def update(self, values):
+        self.operation, self.payload = "update", values
+        return self
+
+    def delete(self, count=None, returning=None):
+        self.operation, self.count = "delete", count
+        return self
+
+    def select(self, *columns, count=None, head=False):
+        self.operation, self.count, self.head = "select", count, head
+        self.with_metadata = "metadata" in ",".join(columns)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append((column, lambda found: found > value))
+        return self
+
+    def gte(self, column, value):
+        self.filters.append((column, lambda found: found >= value))
+        return self
+
+    def lte(self, column, value):
+        self.filters.append((column, lambda found: found <= value))
+        return self
+
+    def order(self, column):
+        return self  # Rows are kept in id order
+
+    def limit(self, count):
+        self.max_rows = count
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, {str(value)}))
+        return self
+
+    def neq(self, column, value):
+        self.filters.append((column, None))  # Only used as "match everything"
+        return self
+
+    def in_(self, column, values):
+        self.filters.append((column, {str(value) for value in values}))
+        return self
+
+    def _matches(self, row):
+        for column, values in self.filters:
+            if values is None:
+                continue
+            key = column.split("->>")[-1]
+            source = row.get("metadata", {}) if "->>" in column else row
+            if callable(values):
+                if not values(source.get(key)):
+                    return False
+            elif str(source.get(key)) not in values:
+                return False
+        return True
+
+    def execute(self):
+        client = self.client
+        start = time.perf_counter()
+        body = json.dumps(self.payload) if self.payload is not None else ""  # What PostgREST would receive
+        with client.lock:
+            client.requests += 1
+            client.request_bytes += len(body)
+            fail = client.random.random() < client.error_rate
+        if client.latency:
+            time.sleep(client.latency)
+        if fail:
+            with client.lock:
+                client.errors += 1
+            raise FakeHTTPError(503)
+
+        with client.lock:
+            table = client.rows[self.table_name]
+            if self.operation == "insert":
+                for row in self.payload:
+                    table.append({"id": client.next_id[self.table_name], "metadata": row.get("metadata", {})})
+                    client.next_id[self.table_name] += 1
+                data, count = [], None
+            elif self.operation == "update":
+                found = [row for row in table if self._matches(row)]
+                for row in found:
+                    row.update(self.payload)
+                data, count = [], None
+            elif self.operation == "delete":
+                kept = [row for row in table if not self._matches(row)]
+                data, count = [], len(table) - len(kept)
+                client.rows[self.table_name] = kept
+            else:
+                found = [row for row in table if self._matches(row)]
+                data = [] if self.head else [
+                    {"id": row["id"], "metadata": row["metadata"]} if self.with_metadata else {"id": row["id"]} for row in found[:self.max_rows]
+                ]
+                count = len(found) if self.count else None
+        if client.timings is not None:
+            client.timings.add(f"store_{self.operation}", time.perf_counter() - start)
+        return type("Response", (), {"data": data, "count": count})()
+
+
+# ✅ Deterministic filler text
+def make_sentences(rng, count):
+    sentences = []
+    for _ in range(count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(6, 24))]
+        sentences.append(" ".join(words).capitalize() + ".")
+    return sentences
+
+# ✅ Functions to generate benchmark inputs of each supported type
+def make_pdf(path, pages, seed=0):
+    import pymupdf
+    rng = random.Random(seed)
+    doc = pymupdf.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(pymupdf.Rect(40, 40, 555, 800), " ".join(make_sentences(rng, 40)), fontsize=9)
+    doc.save(path)
+    doc.close()
+
+def make_docx(path, paragraphs, seed=0):
+    import docx
+    rng = random.Random(seed)
+    document = docx.Document()
+    for _ in range(paragraphs):
+        document.add_paragraph(" ".join(make_sentences(rng, 5)))
+    document.save(path)
+
+def make_table_rows(rows, seed=0):
+    rng = random.Random(seed)
+    for i in range(rows):
+        yield [i, rng.choice(WORDS), rng.choice(WORDS), round(rng.uniform(0, 1000), 2), " ".join(make_sentences(rng, 1))]
+
+TABLE_COLUMNS = ["id", "category", "label", "amount", "description"]
+
+def make_csv(path, rows, seed=0):
+    import csv
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(TABLE_COLUMNS)
+        writer.writerows(make_table_rows(rows, seed))
+
+def make_xlsx(path, rows, seed=0):
+    import openpyxl
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(TABLE_COLUMNS)
+    for row in make_table_rows(rows, seed):
+        sheet.append(row)
+    workbook.save(path)
+
+# ✅ Function to write one input per file type; returns {file_type: path}
+def generate_inputs(directory, pages=50, paragraphs=400, rows=20000, seed=0):
+    os.makedirs(directory, exist_ok=True)
+    inputs = {}
+    for file_type, make, size in (("pdf", make_pdf, pages), ("docx", make_docx, paragraphs), ("csv", make_csv, rows), ("xlsx", make_xlsx, rows)):
+        if size:
+            path = os.path.join(directory, f"benchmark.{file_type}")
+            make(path, size, seed)
+            inputs[file_type] = path
+    return inputs
+
+
+# ✅ Peak resident set size of this process in MB (None where it cannot be measured)
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)  # bytes on macOS, KB elsewhere
+    except ImportError:
+        try:
+            import psutil
+            return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+        except Exception:
+            return None
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+# ✅ Function to time each module's import in a fresh interpreter and list the heavy modules it loaded
+def measure_cold_start(modules=COLD_START_MODULES, budget=COLD_START_BUDGET_SECONDS):
+    results = {}
+    for module in modules:
+        script = (
+            "import sys, json, time\n"
+            "start = time.perf_counter()\n"
+            f"import {module}\n"
+            "seconds = time.perf_counter() - start\n"
+            f"print(json.dumps([seconds, [name for name in {HEAVY_MODULES!r} if name in sys.modules]]))\n"
+        )
+        process = subprocess.run([sys.executable, "-c", script], cwd=APP_DIR, capture_output=True, text=True, timeout=120)
+        if process.returncode == 0:
+            seconds, heavy = json.loads(process.stdout.strip().splitlines()[-1])
+            error = ""
+        else:
+            seconds, heavy = None, []
+            error = (process.stderr.strip().splitlines() or ["import failed"])[-1]
+        results[module] = {
+            "seconds": None if seconds is None else round(seconds, 3),
+            "heavy_modules": heavy,
+            "within_budget": seconds is not None and seconds <= budget and not heavy,
+            "error": error,
+        }
+    return results
+
+
+# ✅ Function to ingest one file through the real extract → chunk → embed → store code paths
+def run_file(file_type, path, store, timings, chunk_size, expected_dim, max_inflight, table_batch_rows, insert_batch_rows, cache=None):
+    metadata = {"filename": os.path.basename(path)}
+
+    # Stand-alone extraction and chunking, timed per stage
+    with timings.time(f"{file_type}_extract"):
+        if file_type == "pdf":
+            text = extract_text_from_pdf(path)
+        elif file_type == "docx":
+            text = extract_text_from_docx(path)
+        else:
+            frames = list(iter_table_frames(path, file_type, table_batch_rows))
+    with timings.time(f"{file_type}_chunk"):
+        if file_type in ("pdf", "docx"):
+            split_text(text, chunk_size)
+        else:
+            for df in frames:
+                table_rows_to_chunks(df, metadata)
+
+    # End-to-end upload as the app runs it: streamed from disk with bounded memory
+    writer = BatchWriter(store, max_rows=insert_batch_rows, max_inflight=2)
+    start = time.perf_counter()
+    with writer:
+        chunks = upload_file_chunks(store, BENCHMARK_TABLE, path, file_type, metadata, expected_dim, BENCHMARK_MODEL, BENCHMARK_API_KEY, None, chunk_size, writer, max_inflight, table_batch_rows=table_batch_rows, cache=cache)
+    seconds = time.perf_counter() - start
+    timings.add(f"{file_type}_ingest", seconds)
+    return {"chunks": chunks, "seconds": seconds, "rows_written": writer.rows_written, "rows_failed": writer.rows_failed}
+
+
+# ✅ Function to run the whole suite offline; returns the JSON-serializable report
+# Embeddings go through a private cache in the work directory, so the user's shared cache is never touched
+def run_benchmark(workdir=None, pages=50, paragraphs=400, rows=20000, repeat=3, store_backend="Supabase",
+                  embed_latency=0.05, embed_error_rate=0.0, insert_latency=0.02, insert_error_rate=0.0,
+                  chunk_size=300, expected_dim=1024, max_inflight=4, table_batch_rows=1000, insert_batch_rows=500,
+                  warm_cache=False, seed=0, on_progress=None):
+    workdir = workdir or tempfile.mkdtemp(prefix="file2vector-bench-")
+    timings = StageTimings()
+
+    # Everything stays inside the work directory: embedding cache, fake provider, fake database or local store
+    cache = EmbeddingCache(os.path.join(workdir, "embeddings.sqlite"))
+    dimension = EMBEDDING_PROVIDERS[BENCHMARK_MODEL]["dimension"]
+    provider = FakeEmbeddingClient(dimension, embed_latency, embed_error_rate, seed, timings)
+    register_embedding_client(BENCHMARK_MODEL, BENCHMARK_API_KEY, provider)
+    get_rate_limiter(BENCHMARK_MODEL, BENCHMARK_API_KEY)  # No quota: measure the pipeline, not the limiter
+    supabase = FakeSupabase(insert_latency, insert_error_rate, seed, timings)
+    if store_backend == "Local":
+        store = LocalVectorStore(os.path.join(workdir, "store"))
+        store.add = timed(store.add, timings, "store_insert")
+    else:
+        store = SupabaseVectorStore(supabase, BENCHMARK_TABLE)
+
+    start = time.perf_counter()
+    inputs = generate_inputs(os.path.join(workdir, "inputs"), pages, paragraphs, rows, seed)
+    generate_seconds = time.perf_counter() - start
+
+    metrics.reset()
+    runs = defaultdict(list)
+    for iteration in range(repeat):
+        if not warm_cache:
+            cache.clear()  # Every repeat pays for its embeddings
+        for file_type, path in inputs.items():
+            result = run_file(file_type, path, store, timings, chunk_size, expected_dim, max_inflight, table_batch_rows, insert_batch_rows, cache)
+            runs[file_type].append(result)
+            if on_progress:
+                on_progress(iteration, file_type, result)
+
+    files = {}
+    for file_type, results in runs.items():
+        chunks = sum(result["chunks"] for result in results)
+        seconds = sum(result["seconds"] for result in results)
+        files[file_type] = {
+            "size_bytes": os.path.getsize(inputs[file_type]),
+            "chunks": results[0]["chunks"],
+            "chunks_per_second": round(chunks / seconds, 1) if seconds else 0.0,
+            "best_seconds": round(min(result["seconds"] for result in results), 3),
+            "rows_failed": sum(result["rows_failed"] for result in results),
+        }
+    store.close()
+    cache.close()
+
+    counters = {}
+    for row in metrics.snapshot()["counters"]:
+        counters[row["metric"]] = counters.get(row["metric"], 0) + row["value"]
+
+    return {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "settings": {
+            "pages": pages, "paragraphs": paragraphs, "rows": rows, "repeat": repeat, "store": store_backend,
+            "embed_latency": embed_latency, "embed_error_rate": embed_error_rate,
+            "insert_latency": insert_latency, "insert_error_rate": insert_error_rate,
+            "chunk_size": chunk_size, "expected_dim": expected_dim, "max_inflight": max_inflight,
+            "table_batch_rows": table_batch_rows, "insert_batch_rows": insert_batch_rows, "warm_cache": warm_cache,
+        },
+        "generate_seconds": round(generate_seconds, 3),
+        "files": files,
+        "stages": timings.summary(),
+        "embedding_requests": provider.requests,
+        "embedding_errors": provider.errors,
+        "store_requests": supabase.requests,
+        "store_request_bytes": supabase.request_bytes,
+        "counters": counters,  # Pipeline metrics (chunks, tokens, retries...) summed over labels
+        "cold_start": measure_cold_start(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+# ✅ Function to save a report; returns its path
+def save_results(results, path=None):
+    if path is None:
+        os.makedirs(DEFAULT_RESULTS_DIR, exist_ok=True)
+        path = os.path.join(DEFAULT_RESULTS_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    return path
+
+# ✅ Function to compare throughput against an earlier report: {file_type: current / previous}
+def compare_results(current, previous):
+    ratios = {}
+    for file_type, result in current["files"].items():
+        before = previous.get("files", {}).get(file_type, {}).get("chunks_per_second")
+        if before:
+            ratios[file_type] = round(result["chunks_per_second"] / before, 3)
+    return ratios
@@ -0,0 +1,200 @@
+import os
+import re
+import hashlib
+import logging
+from collections import deque
+from scripts.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# ✅ Local NLTK data directory searched for the Punkt model (NLTK_DATA and NLTK's defaults are searched too)
+# Nothing is downloaded at runtime; `python file2vector.py fetch-tokenizer` fills it once on a connected host
+NLTK_DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "cache", "nltk_data")
+PUNKT_PACKAGE = "punkt_tab"
+
+# ✅ Local tiktoken cache holding the cl100k_base BPE file (TIKTOKEN_CACHE_DIR overrides it)
+# tiktoken downloads missing files on first use, so the encoding is only loaded once it is cached here;
+# `python file2vector.py fetch-tokenizer` fills it
+TIKTOKEN_CACHE_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "cache", "tiktoken")
+TOKEN_ENCODING = "cl100k_base"
+TOKEN_ENCODING_URL = "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken"
+
+# Sentence boundaries used when the Punkt model is not available
+SENTENCE_PATTERN = re.compile(r"\S.*?(?:[.!?]+(?=\s|$)|$)", re.DOTALL)
+
+_token_encoding = None
+_sentence_tokenizer = None
+
+
+def token_cache_dir():
+    return os.path.abspath(os.environ.get("TIKTOKEN_CACHE_DIR") or TIKTOKEN_CACHE_PATH)
+
+# ✅ Offline tokenizer (tiktoken's cl100k_base, read from the local cache), with a character estimate as fallback
+def get_token_encoding():
+    global _token_encoding
+    if _token_encoding is None:
+        cache_dir = token_cache_dir()
+        try:
+            import tiktoken
+            # tiktoken names cached files by the SHA-1 of their URL
+            if not os.path.exists(os.path.join(cache_dir, hashlib.sha1(TOKEN_ENCODING_URL.encode()).hexdigest())):
+                raise FileNotFoundError(f"{TOKEN_ENCODING} is not cached in {cache_dir}")
+            os.environ["TIKTOKEN_CACHE_DIR"] = cache_dir
+            _token_encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+        except Exception as e:
+            logger.warning("⚠️ Tokenizer unavailable (%s); estimating tokens as characters / 4, so chunks differ from hosts "
+                           "with the tokenizer. Run `python file2vector.py fetch-tokenizer` to cache it.", e)
+            _token_encoding = False
+    return _token_encoding or None
+
+# ✅ Function to download the cl100k_base encoding into the local tiktoken cache (network access)
+def download_token_encoding(path=TIKTOKEN_CACHE_PATH):
+    global _token_encoding
+    import tiktoken
+    path = os.path.abspath(path)
+    os.makedirs(path, exist_ok=True)
+    os.environ["TIKTOKEN_CACHE_DIR"] = path
+    tiktoken.get_encoding(TOKEN_ENCODING)
+    _token_encoding = None  # Load the cached encoding on next use
+    return path
+
+# ✅ Function to count tokens in a text
+def count_tokens(text):
+    encoding = get_token_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode_ordinary(text))
+
+# ✅ Function to cut a text to at most `max_tokens` tokens
+def truncate_tokens(text, max_tokens):
+    encoding = get_token_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode_ordinary(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+# ✅ Punkt sentence tokenizer, if NLTK and its English model are available locally
+def get_sentence_tokenizer():
+    global _sentence_tokenizer
+    if _sentence_tokenizer is None:
+        try:
+            import nltk
+            from nltk.tokenize.punkt import PunktTokenizer
+            path = os.path.abspath(NLTK_DATA_PATH)
+            if path not in nltk.data.path:
+                nltk.data.path.insert(0, path)
+            _sentence_tokenizer = PunktTokenizer("english")  # Reads the model from disk only
+        except Exception as e:
+            logger.info("Punkt model unavailable (%s); splitting sentences on punctuation", e)
+            _sentence_tokenizer = False
+    return _sentence_tokenizer or None
+
+# ✅ Function to download the Punkt model into the local NLTK data directory (the only network access)
+def download_sentence_model(path=NLTK_DATA_PATH):
+    global _sentence_tokenizer
+    import nltk
+    os.makedirs(path, exist_ok=True)
+    if not nltk.download(PUNKT_PACKAGE, download_dir=os.path.abspath(path), quiet=True):
+        raise RuntimeError(f"Could not download {PUNKT_PACKAGE} into {path}")
+    _sentence_tokenizer = None  # Load the new model on next use
+    return os.path.abspath(path)
+
+# ✅ Generator of (start, end) character spans of the sentences in a text
+def sentence_spans(text):
+    tokenizer = get_sentence_tokenizer()
+    if tokenizer is not None:
+        yield from tokenizer.span_tokenize(text)
+    else:
+        for match in SENTENCE_PATTERN.finditer(text):
+            yield match.start(), match.end()
+
+
+# ✅ Function to hard-split an oversized sentence into spans of at most `max_tokens`
+def split_long_span(text, start, end, tokens, max_tokens):
+    chars_per_piece = max(1, int((end - start) * max_tokens / tokens))
+    while start < end:
+        cut = min(start + chars_per_piece, end)
+        # Prefer to cut at whitespace near the limit
+        if cut < end:
+            space = text.rfind(" ", start + chars_per_piece // 2, cut)
+            if space > start:
+                cut = space
+        while cut > start + 1 and count_tokens(text[start:cut]) > max_tokens:
+            cut = start + (cut - start) * 9 // 10
+        yield start, cut, count_tokens(text[start:cut])
+        start = cut
+        while start < end and text[start].isspace():
+            start += 1
+
+
+# ✅ Single-pass chunker: yields (start, end) offsets of chunks of at most `max_tokens` tokens,
+# repeating up to `overlap` tokens of trailing sentences at the start of the next chunk
+def chunk_spans(text, max_tokens=300, overlap=0):
+    window = deque()  # (start, end, tokens) of the sentences in the current chunk
+    window_tokens = 0
+
+    def sentences():
+        for start, end in sentence_spans(text):
+            tokens = count_tokens(text[start:end])
+            if tokens > max_tokens:
+                yield from split_long_span(text, start, end, tokens, max_tokens)
+            else:
+                yield start, end, tokens
+
+    for start, end, tokens in sentences():
+        if window and window_tokens + tokens > max_tokens:
+            yield window[0][0], window[-1][1]
+            # Keep trailing sentences as overlap, never the whole chunk
+            kept, kept_tokens = deque(), 0
+            for sentence in reversed(window):
+                if (len(kept) == len(window) - 1 or kept_tokens + sentence[2] > overlap
+                        or kept_tokens + sentence[2] + tokens > max_tokens):
+                    break
+                kept.appendleft(sentence)
+                kept_tokens += sentence[2]
+            window, window_tokens = kept, kept_tokens
+        window.append((start, end, tokens))
+        window_tokens += tokens
+
+    if window:
+        yield window[0][0], window[-1][1]
+
+
+# ✅ Streaming chunker over (text, metadata) segments such as PDF pages;
+# yields (chunk_text, metadata) with the chunk's offsets inside its segment
+def iter_chunks(segments, max_tokens=300, overlap=0):
+    for text, metadata in segments:
+        if not text:
+            continue
+        with metrics.stage("chunk"):
+            spans = list(chunk_spans(text, max_tokens, overlap))
+        for start, end in spans:
+            chunk = text[start:end]
+            if chunk.strip():
+                yield chunk, {**metadata, "start": start, "end": end}
+
+
+# ✅ Streaming chunker over one document that arrives in pieces (e.g. DOCX paragraphs read lazily);
+# yields (chunk_text, metadata) with offsets inside the whole document. The last chunk of each piece
+# is held back and re-chunked with the next one, so boundaries match chunking the joined text
+def iter_stream_chunks(pieces, metadata, max_tokens=300, overlap=0):
+    pending, offset = "", 0  # Held-back text and its offset in the document
+    for piece in pieces:
+        text = pending + piece
+        with metrics.stage("chunk"):
+            spans = list(chunk_spans(text, max_tokens, overlap))
+        for start, end in spans[:-1]:
+            if text[start:end].strip():
+                yield text[start:end], {**metadata, "start": offset + start, "end": offset + end}
+        held = spans[-1][0] if spans else len(text)
+        pending, offset = text[held:], offset + held
+
+    if pending.strip():
+        with metrics.stage("chunk"):
+            spans = list(chunk_spans(pending, max_tokens, overlap))
+        for start, end in spans:
+            if pending[start:end].strip():
+                yield pending[start:end], {**metadata, "start": offset + start, "end": offset + end}
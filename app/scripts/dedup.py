@@ -0,0 +1,196 @@
+import re
+import math
+import zlib
+import hashlib
+import logging
+from collections import defaultdict
+import numpy as np
+from scripts.metrics import metrics
+from scripts.chunking import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# ✅ Deduplication scopes: off, within each document, or across every file of an ingest run
+DEDUP_SCOPES = ["Off", "Document", "Run"]
+
+# Estimated Jaccard similarity of word shingles above which a chunk counts as a near-duplicate
+DEFAULT_THRESHOLD = 0.85
+NUM_PERM = 64
+LSH_BANDS = 8  # 8 bands of 8 rows: pairs around 0.75 similarity and up become candidates
+SHINGLE_WORDS = 5
+# References kept in a chunk's metadata (the total is always recorded)
+MAX_REFERENCES = 50
+# Metadata keys that locate a dropped copy
+REFERENCE_KEYS = ("filename", "page", "table", "row", "start", "end")
+# Stored chunks updated per request when references are written back
+REFERENCE_BATCH = 100
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(text):
+    return WHITESPACE.sub(" ", text).strip().lower()
+
+# ✅ Function to locate a dropped copy: its filename and position (positions as ints)
+def reference(metadata):
+    found = {}
+    for key in REFERENCE_KEYS:
+        if key in metadata:
+            value = metadata[key]
+            found[key] = int(value) if key != "filename" and str(value).isdigit() else value
+    return found
+
+# ✅ Function to add `count` dropped copies and their references to a kept chunk's metadata (in place)
+# References it already lists are skipped and not counted again, so writing the same update twice is harmless
+def add_references(metadata, count, references):
+    kept = metadata.setdefault("duplicates", [])
+    new = [found for found in references if found not in kept]
+    metadata["duplicate_count"] = int(metadata.get("duplicate_count", 0)) + count - (len(references) - len(new))
+    kept.extend(new[:max(MAX_REFERENCES - len(kept), 0)])
+    return metadata
+
+
+# ✅ Exact and near-duplicate chunk filter (SHA-1 of the normalized text, then MinHash with an LSH index)
+# Kept chunks collect references to the copies dropped in their favour under metadata["duplicates"]
+class ChunkDeduplicator:
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=NUM_PERM, bands=LSH_BANDS, shingle_words=SHINGLE_WORDS, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.shingle_words = shingle_words
+        # Hash permutations a * x + b (mod 2^61 - 1); a, b < 2^32 so the product cannot overflow uint64
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+        # Kept chunks are remembered by key only (their chunk_id, or a sequence number without a checkpoint),
+        # so memory grows by a hash or signature per chunk rather than by its metadata
+        self.exact = {}  # normalized text hash -> key of the kept chunk
+        self.buckets = defaultdict(list)  # (band, band signature) -> indices into self.signatures
+        self.signatures = []  # (signature, key of the kept chunk)
+        self.pending = {}  # chunk_id of a chunk handed on by an earlier call -> {"duplicate_count", "duplicates"} to add
+        self.kept = 0
+        self.exact_dropped = 0
+        self.near_dropped = 0
+        self.tokens_saved = 0
+        self.requests_saved = 0
+        self.references_written = 0
+        self.unrecorded = 0  # Copies of earlier chunks without a chunk_id, whose stored rows cannot be found
+
+    def signature(self, text):
+        words = text.split()
+        if len(words) <= self.shingle_words:
+            shingles = [text]
+        else:
+            shingles = {" ".join(words[i:i + self.shingle_words]) for i in range(len(words) - self.shingle_words + 1)}
+        hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+        return (((hashes[:, None] * self.a + self.b) % MERSENNE_PRIME) & MAX_HASH).min(axis=0)
+
+    def _band_keys(self, signature):
+        r = self.rows_per_band
+        return [(band, signature[band * r:(band + 1) * r].tobytes()) for band in range(self.bands)]
+
+    def _near_match(self, signature):
+        seen = set()
+        for key in self._band_keys(signature):
+            for index in self.buckets.get(key, ()):
+                if index in seen:
+                    continue
+                seen.add(index)
+                candidate, key = self.signatures[index]
+                if np.mean(candidate == signature) >= self.threshold:
+                    return key
+        return None
+
+    # Keep the first copy of each chunk; later exact or near copies are dropped and referenced
+    # Table rows differ by a single cell, so only their exact copies are dropped
+    # References to chunks kept by an earlier call are held in `pending` until `write_references`
+    def filter(self, chunks, max_items=None):
+        chunks = list(chunks)
+        kept, current = [], {}  # key -> metadata of the chunks kept by this call
+        for content, metadata in chunks:
+            normalized = normalize(content)
+            digest = hashlib.sha1(normalized.encode("utf-8")).digest()
+            original = self.exact.get(digest)
+            kind = "exact"
+            signature = None
+            if original is None and "row" not in metadata:
+                signature = self.signature(normalized)
+                original = self._near_match(signature)
+                kind = "near"
+
+            if original is None:
+                metadata = dict(metadata)
+                key = metadata.get("chunk_id") or self.kept + len(kept)
+                self.exact[digest] = key
+                if signature is not None:
+                    index = len(self.signatures)
+                    self.signatures.append((signature, key))
+                    for band_key in self._band_keys(signature):
+                        self.buckets[band_key].append(index)
+                current[key] = metadata
+                kept.append((content, metadata))
+                continue
+
+            if kind == "exact":
+                self.exact_dropped += 1
+            else:
+                self.near_dropped += 1
+            self.tokens_saved += count_tokens(content)
+            metrics.inc("dedup_dropped_total", kind=kind)
+            if original in current:
+                add_references(current[original], 1, [reference(metadata)])
+            elif isinstance(original, str):
+                update = self.pending.setdefault(original, {"duplicate_count": 0, "duplicates": []})
+                add_references(update, 1, [reference(metadata)])
+            else:
+                self.unrecorded += 1  # Kept by an earlier call without a checkpoint
+
+        self.kept += len(kept)
+        if max_items:
+            # Provider requests avoided, counting by the per-request item limit
+            self.requests_saved += math.ceil(len(chunks) / max_items) - math.ceil(len(kept) / max_items)
+        return kept
+
+    # Add the references collected for chunks stored by earlier calls to their rows (by chunk_id)
+    # Call it once the writer has flushed; rows that failed to store are simply not found
+    def write_references(self, store):
+        pending, self.pending = self.pending, {}
+        chunk_ids = list(pending)
+
+        def merge(metadata):
+            update = pending[metadata["chunk_id"]]
+            return add_references(dict(metadata), update["duplicate_count"], update["duplicates"])
+
+        try:
+            for start in range(0, len(chunk_ids), REFERENCE_BATCH):
+                self.references_written += store.update_metadata({"chunk_id": chunk_ids[start:start + REFERENCE_BATCH]}, merge)
+        except Exception as e:
+            self.unrecorded += len(chunk_ids)
+            logger.warning("⚠️ Could not record duplicate references on %d stored chunks: %s", len(chunk_ids), e)
+
+    @property
+    def dropped(self):
+        return self.exact_dropped + self.near_dropped
+
+    # Counts for the UI and CLI: chunks kept, copies dropped, and the embedding work saved
+    def report(self):
+        return {
+            "kept": self.kept,
+            "exact_dropped": self.exact_dropped,
+            "near_dropped": self.near_dropped,
+            "rows_saved": self.dropped,
+            "tokens_saved": self.tokens_saved,
+            "requests_saved": self.requests_saved,
+            "references_written": self.references_written,
+            "references_not_recorded": self.unrecorded,
+        }
+
+
+# ✅ Function to create a deduplicator for a scope setting (None when off)
+def make_deduplicator(scope="Off", threshold=DEFAULT_THRESHOLD):
+    return None if scope in (None, "", "Off") else ChunkDeduplicator(threshold)
@@ -0,0 +1,81 @@
+import json
+from scripts.journal import get_journal
+
+# Rows per delete request: small enough to stay well inside statement timeouts on large tables
+DELETE_BATCH_ROWS = 1000
+# Chunk ids per request when deleting an ingest job's rows (they travel in the query string)
+CHUNK_ID_BATCH = 100
+
+# ✅ Ways to select the rows to delete
+DELETE_SCOPES = ["Everything", "Filename", "Content hash", "Ingest job"]
+
+
+# ✅ Function to build a delete scope: {} (every row), {"filename": ...}, {"content_hash": ...} or {"job_id": ...}
+def delete_scope(kind="Everything", value=None):
+    if kind == "Everything":
+        return {}
+    if not value:
+        raise ValueError(f"❌ Error: {kind} to delete is empty.")
+    key = {"Filename": "filename", "Content hash": "content_hash", "Ingest job": "job_id"}[kind]
+    return {key: value}
+
+def describe_scope(scope):
+    if not scope:
+        return "every row"
+    (key, value), = scope.items()
+    return f"rows with {key} {value}"
+
+
+# ✅ Dry run: number of rows a delete would remove
+# A job's rows are the chunks its journal saw sent, so the count is an upper bound for partial jobs
+def count_rows(store, scope, journal=None):
+    if "job_id" in scope:
+        return (journal or get_journal()).count_sent_chunks(scope["job_id"])
+    return store.count(scope or None)
+
+# ✅ Progress of an unfinished delete of this scope ({"cursor", "deleted"}), if one was interrupted
+def pending_deletion(store, scope, journal=None):
+    return (journal or get_journal()).deletion(store.key, json.dumps(scope, sort_keys=True))
+
+
+# ✅ Function to delete rows in bounded batches with progress; resumes after the last finished batch
+# Rows are paged by id (keyset) and each page is removed with one id-range delete, so no statement
+# scans or locks the whole table. `forget` also drops the matching jobs from the ingest journal,
+# so deleted files are uploaded again instead of being skipped as already stored.
+def delete_rows(store, scope, batch_rows=DELETE_BATCH_ROWS, on_progress=None, forget=True, journal=None):
+    journal = journal or get_journal()
+    scope_key = json.dumps(scope, sort_keys=True)
+    progress = journal.deletion(store.key, scope_key) or {"cursor": "", "deleted": 0}
+    cursor, deleted = progress["cursor"], progress["deleted"]
+    total = count_rows(store, scope, journal)
+    if "job_id" not in scope:
+        total += deleted  # The store only counts rows still there
+
+    def report():
+        journal.save_deletion(store.key, scope_key, cursor, deleted)
+        if on_progress:
+            on_progress(min(deleted, total), total, f"Deleted {deleted}/{total} rows")
+
+    if "job_id" in scope:
+        # A job's rows are known by their chunk ids, paged from the journal in id order
+        while True:
+            chunk_ids = journal.sent_chunk_ids(scope["job_id"], after=cursor, limit=CHUNK_ID_BATCH)
+            if not chunk_ids:
+                break
+            deleted += store.delete_by_metadata({"chunk_id": chunk_ids})
+            cursor = chunk_ids[-1]
+            report()
+    else:
+        metadata = scope or None
+        while True:
+            ids = store.id_page(metadata, after_id=int(cursor) if cursor else None, limit=batch_rows)
+            if not ids:
+                break
+            deleted += store.delete_id_range(ids[0], ids[-1], metadata)
+            cursor = str(ids[-1])
+            report()
+
+    journal.finish_deletion(store.key, scope_key)
+    if forget:
+        journal.forget(store.key, **scope)
+    return deleted
@@ -0,0 +1,144 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+# ✅ Default cache location next to the app's config
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "cache", "embeddings.sqlite")
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024  # 1 GB
+
+# SQLite limits the number of bound parameters per statement
+SQLITE_MAX_VARIABLES = 900
+
+
+# ✅ Function to normalize chunk text so whitespace-only edits still hit the cache
+def normalize_text(text):
+    return re.sub(r"\s+", " ", text).strip()
+
+# ✅ Function to build the content-addressed cache key
+def cache_key(text, provider, model, dimension):
+    digest = hashlib.sha256()
+    for part in (normalize_text(text), provider, model, str(dimension)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.digest()
+
+
+# ✅ On-disk embedding cache backed by SQLite with size-bounded LRU eviction
+class EmbeddingCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes": self.total_bytes,
+        }
+
+    # Resolve many keys in as few queries as possible; returns {key: float32 vector}
+    def get_many(self, keys):
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self.lock:
+            for start in range(0, len(unique_keys), SQLITE_MAX_VARIABLES):
+                part = unique_keys[start:start + SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(part))
+                rows = self.conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part)
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+
+            # Touch hits so eviction stays least-recently-used
+            if found:
+                now = time.time()
+                self.conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+                self.conn.commit()
+
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def put_many(self, items):
+        now = time.time()
+        rows = []
+        for key, vector in items:
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            rows.append((key, blob, len(blob) + len(key), now))
+        if not rows:
+            return
+
+        with self.lock:
+            # Replace existing keys without double-counting their size
+            keys = [row[0] for row in rows]
+            replaced = 0
+            for start in range(0, len(keys), SQLITE_MAX_VARIABLES):
+                part = keys[start:start + SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(part))
+                replaced += self.conn.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchone()[0]
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector, size, last_used) VALUES (?, ?, ?, ?)", rows)
+            self.total_bytes += sum(row[2] for row in rows) - replaced
+            self._evict()
+            self.conn.commit()
+
+    # Drop least recently used entries until the cache fits its size budget
+    def _evict(self):
+        while self.total_bytes > self.max_bytes:
+            victims = self.conn.execute(
+                "SELECT key, size FROM embeddings ORDER BY last_used LIMIT ?", (SQLITE_MAX_VARIABLES,)
+            ).fetchall()
+            if not victims:
+                self.total_bytes = 0
+                return
+            evicted = []
+            for key, size in victims:
+                evicted.append(key)
+                self.total_bytes -= size
+                if self.total_bytes <= self.max_bytes:
+                    break
+            placeholders = ",".join("?" * len(evicted))
+            self.conn.execute(f"DELETE FROM embeddings WHERE key IN ({placeholders})", evicted)
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM embeddings")
+            self.conn.commit()
+            self.total_bytes = 0
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+# ✅ Shared cache instance used by the embedding calls
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+def get_embedding_cache(path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+    global _embedding_cache
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache(path, max_bytes)
+    return _embedding_cache
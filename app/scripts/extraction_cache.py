@@ -0,0 +1,226 @@
+import threading
+from array import array
+from collections import OrderedDict
+from scripts.chunking import iter_stream_chunks, count_tokens
+from scripts.streaming import chunk_bytes
+from scripts.utils import (
+    EMBEDDING_PROVIDERS, clean_metadata, iter_pdf_pages, chunk_pdf_pages, iter_docx_blocks,
+    iter_table_frames, table_rows_to_chunks
+)
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 256 MB
+PREVIEW_CHARS = 500
+PREVIEW_ROWS = 5
+PREVIEW_CHUNKS = 5
+
+
+def frame_bytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+# ✅ Extracted and chunked upload: the preview, the chunks ready to embed and their token counts
+# Chunks beyond `max_bytes` are counted but not kept (`chunks` becomes None), so a huge file
+# still gets its estimate while the upload itself streams the file again
+class Extraction:
+    def __init__(self, file_type, max_bytes):
+        self.file_type = file_type
+        self.max_bytes = max_bytes
+        self.preview_text = ""
+        self.preview_frame = None  # First rows of a spreadsheet
+        self.tables = []  # Tables found in a PDF
+        self.chunks = []
+        self.preview = []  # First chunks, kept even when `chunks` is dropped
+        self.token_counts = array("I")
+        self.rows = 0
+        self.bytes = 0
+
+    @property
+    def complete(self):
+        return self.chunks is not None
+
+    @property
+    def chunk_count(self):
+        return len(self.token_counts)
+
+    @property
+    def tokens(self):
+        return sum(self.token_counts)
+
+    def add_chunk(self, content, metadata):
+        self.token_counts.append(count_tokens(content))
+        if len(self.preview) < PREVIEW_CHUNKS:
+            self.preview.append((content, metadata))
+        if self.chunks is None:
+            return
+        self.chunks.append((content, metadata))
+        self.bytes += chunk_bytes(content, metadata)
+        if self.bytes > self.max_bytes:
+            # Keep the preview only; the upload reads the file again
+            self.bytes -= sum(chunk_bytes(*chunk) for chunk in self.chunks[len(self.preview):])
+            self.chunks = None
+
+    def add_table(self, df):
+        self.tables.append(df)
+        self.bytes += frame_bytes(df)
+
+    # Embedding requests, tokens and price for a provider (before embedding cache hits)
+    def estimate(self, model):
+        provider = EMBEDDING_PROVIDERS["Cohere" if model == "Cohere" else "OpenAI"]
+        tokens = self.tokens
+        return {
+            "chunks": self.chunk_count,
+            "tokens": tokens,
+            "requests": count_requests(self.token_counts, provider["max_items"], provider["max_tokens"]),
+            "cost": tokens / 1_000_000 * provider["usd_per_million_tokens"],
+        }
+
+
+# ✅ Function to count provider requests for chunk token counts (same packing as utils.batch_texts)
+def count_requests(token_counts, max_items, max_tokens):
+    requests, items, batch_tokens = 0, 0, 0
+    for tokens in token_counts:
+        if items and (items >= max_items or batch_tokens + tokens > max_tokens):
+            requests += 1
+            items, batch_tokens = 0, 0
+        items += 1
+        batch_tokens += tokens
+    return requests + (1 if items else 0)
+
+
+# ✅ Function to extract and chunk an uploaded PDF, DOCX, CSV or XLSX file in one pass
+def extract_upload(source, file_type, metadata, chunk_size=300, overlap=0, table_batch_rows=1000, max_bytes=DEFAULT_MAX_BYTES):
+    metadata = clean_metadata(metadata)  # Ensure metadata is JSON serializable
+    extraction = Extraction(file_type, max_bytes)
+
+    def add(chunks):
+        for content, chunk_metadata in chunks:
+            extraction.add_chunk(content, chunk_metadata)
+
+    if file_type == "pdf":
+        for page in iter_pdf_pages(source):
+            if len(extraction.preview_text) < PREVIEW_CHARS:
+                extraction.preview_text += page["text"] + "\n"
+            for table in page["tables"]:
+                extraction.add_table(table)
+            add((content, clean_metadata(chunk_metadata)) for content, chunk_metadata in chunk_pdf_pages([page], metadata, chunk_size, overlap))
+            extraction.rows += 1  # Pages
+
+    elif file_type == "docx":
+        def blocks():
+            for block in iter_docx_blocks(source):
+                if len(extraction.preview_text) < PREVIEW_CHARS:
+                    extraction.preview_text += block[:PREVIEW_CHARS]
+                yield block
+        add((content, clean_metadata(chunk_metadata)) for content, chunk_metadata in iter_stream_chunks(blocks(), metadata, chunk_size, overlap))
+
+    elif file_type in ["csv", "xlsx"]:
+        for df in iter_table_frames(source, file_type, table_batch_rows):
+            if extraction.preview_frame is None:
+                extraction.preview_frame = df.head(PREVIEW_ROWS)
+                extraction.bytes += frame_bytes(extraction.preview_frame)
+            add(table_rows_to_chunks(df, metadata, first_row=extraction.rows))
+            extraction.rows += len(df)
+
+    else:
+        raise ValueError(f"Unsupported file type: .{file_type}")
+
+    extraction.preview_text = extraction.preview_text.strip()[:PREVIEW_CHARS]
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return extraction
+
+
+# ✅ Function to build the cache key: the file's content and name (stamped into every chunk's metadata)
+# plus every setting that changes its chunks; spreadsheet rows become one chunk each, so their chunks
+# do not depend on the chunk size
+def extraction_key(content_hash, filename, file_type, chunk_size, overlap):
+    if file_type in ["csv", "xlsx"]:
+        return (content_hash, filename, file_type)
+    return (content_hash, filename, file_type, int(chunk_size), int(overlap))
+
+
+# ✅ In-memory LRU cache of extractions, bounded by their estimated size
+# Streamlit reruns the page script on every widget change; this keeps files from being parsed again
+class ExtractionCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> Extraction, least recently used first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    # A single entry may use half the budget, so one large file cannot push out every other one
+    @property
+    def max_entry_bytes(self):
+        return self.max_bytes // 2
+
+    def get(self, key):
+        with self.lock:
+            extraction = self.entries.get(key)
+            if extraction is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return extraction
+
+    def put(self, key, extraction):
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= previous.bytes
+            self.entries[key] = extraction
+            self.total_bytes += extraction.bytes
+            self._evict()
+
+    # Cached extraction for `key`, or `build()` stored under it
+    def get_or_build(self, key, build):
+        extraction = self.get(key)
+        if extraction is None:
+            extraction = build()
+            self.put(key, extraction)
+        return extraction
+
+    def resize(self, max_bytes):
+        with self.lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    # Drop least recently used entries until the cache fits its size budget (the newest always stays)
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            _, extraction = self.entries.popitem(last=False)
+            self.total_bytes -= extraction.bytes
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+# ✅ Shared cache instance used by the Upload page
+_extraction_cache = None
+_extraction_cache_lock = threading.Lock()
+
+def get_extraction_cache(max_bytes=DEFAULT_MAX_BYTES):
+    global _extraction_cache
+    with _extraction_cache_lock:
+        if _extraction_cache is None:
+            _extraction_cache = ExtractionCache(max_bytes)
+        elif _extraction_cache.max_bytes != max_bytes:
+            _extraction_cache.resize(max_bytes)
+    return _extraction_cache
@@ -0,0 +1,180 @@
+import os
+import time
+from scripts.utils import store_chunks, delete_file_rows, finish_writer, iter_file_chunks
+from scripts.vector_store import BatchWriter, as_vector_store
+from scripts.chunking import count_tokens
+from scripts.scheduler import iter_prepared_files
+from scripts.manifest import hash_file
+from scripts.journal import begin_job
+from scripts.metrics import metrics, profile_job
+from scripts.dedup import make_deduplicator
+from scripts.streaming import ChunkBuffer, MemoryBudget, DEFAULT_MEMORY_BUDGET
+
+# ✅ File types the ingest pipeline can extract
+SUPPORTED_EXTENSIONS = ("pdf", "docx", "csv", "xlsx")
+
+# Extraction workers return whole chunk lists, so files above this share of the memory budget
+# are streamed in the caller instead (a spreadsheet's chunks take several times its file size)
+POOL_FILE_SHARE = 8
+
+
+# ✅ Function to list the supported files under a path (a single file or a directory)
+def collect_files(path, recursive=False):
+    if os.path.isfile(path):
+        return [os.path.abspath(path)]
+
+    files = []
+    for root, dirs, names in os.walk(path):
+        for name in sorted(names):
+            if name.split(".")[-1].lower() in SUPPORTED_EXTENSIONS:
+                files.append(os.path.abspath(os.path.join(root, name)))
+        if not recursive:
+            break
+        dirs.sort()
+    return files
+
+# ✅ Function to build an ingest job for a file
+def make_job(path, chunk_size=300, overlap=0, table_batch_rows=1000, metadata=None, replace=False):
+    return {
+        "path": path,
+        "metadata": {"filename": os.path.basename(path), **(metadata or {})},
+        "chunk_size": chunk_size,
+        "overlap": overlap,
+        "table_batch_rows": table_batch_rows,
+        "replace": replace,  # Delete the file's existing rows first
+    }
+
+
+# ✅ Function to put the file's content hash into a job's metadata (before extraction, so every row carries it
+# and can be deleted by content hash); returns the hash, or None if the file cannot be read
+def stamp_content_hash(job):
+    if not job["metadata"].get("content_hash"):
+        try:
+            job["metadata"]["content_hash"] = hash_file(job["path"])
+        except OSError:
+            return None  # Reported by extraction
+    return job["metadata"]["content_hash"]
+
+
+# ✅ Function to embed and store one extracted file; returns its result record
+# `chunks` is a list, or a ChunkBuffer (scripts.streaming) that extracts while earlier batches are stored
+# `store` is a VectorStore or a Supabase client (with `table_name`)
+# Each file is a checkpointed job: re-running it after a crash or error skips chunks already stored
+# A `deduplicator` drops duplicate chunks before embedding (one per file, or shared by a whole run)
+def store_file(job, chunks, store, table_name, expected_dim, model, cohere_key, openai_key,
+               insert_batch_rows=500, insert_batch_bytes=4_000_000, insert_concurrency=2, embed_concurrency=4, deduplicator=None):
+    result = {"file": os.path.basename(job["path"]), "path": job["path"], "status": "uploaded",
+              "chunks": 0, "tokens": 0,
+              "rows_written": 0, "skipped": 0, "deduplicated": 0, "requests_saved": 0, "extract_seconds": 0.0, "upload_seconds": 0.0, "error": ""}
+    before = deduplicator.report() if deduplicator is not None else None
+    start = time.perf_counter()
+    checkpoint = None
+    try:
+        store = as_vector_store(store, table_name)
+        content_hash = stamp_content_hash(job) or hash_file(job["path"])
+        settings = {key: job.get(key) for key in ("chunk_size", "overlap", "table_batch_rows")}
+        settings.update(model=model, expected_dim=expected_dim)
+        checkpoint = begin_job(store, job["metadata"]["filename"], content_hash, settings)
+
+        if job.get("replace"):
+            checkpoint.replace_once(lambda: delete_file_rows(store, table_name, job["metadata"]["filename"]))
+        writer = BatchWriter(store, max_rows=insert_batch_rows, max_bytes=insert_batch_bytes, max_inflight=insert_concurrency)
+        batches = chunks.batches() if isinstance(chunks, ChunkBuffer) else [chunks]
+        try:
+            with profile_job(f"{result['file']}-store"):
+                for batch in batches:
+                    result["chunks"] += len(batch)
+                    result["tokens"] += sum(count_tokens(content) for content, _ in batch)
+                    if batch:
+                        store_chunks(writer, batch, expected_dim, model, cohere_key, openai_key, embed_concurrency,
+                                     checkpoint=checkpoint, deduplicator=deduplicator)
+        finally:
+            finish_writer(writer)
+        if deduplicator is not None:
+            deduplicator.write_references(store)
+        checkpoint.finish(writer)
+        result.update(rows_written=writer.rows_written, skipped=checkpoint.skipped)
+        if writer.rows_failed:
+            result.update(status="partial", error=writer.errors[-1])
+    except Exception as e:
+        if checkpoint is not None:
+            checkpoint.finish(error=str(e))
+        result.update(status="failed", error=str(e))
+    if deduplicator is not None:
+        after = deduplicator.report()
+        result.update(deduplicated=after["rows_saved"] - before["rows_saved"],
+                      requests_saved=after["requests_saved"] - before["requests_saved"])
+    result["upload_seconds"] = time.perf_counter() - start
+    return result
+
+
+# ✅ Generator running extract → chunk → dedup → embed → store over jobs; yields one result per file
+# With `workers` > 1, files up to 1/POOL_FILE_SHARE of `memory_budget` are extracted in a process pool;
+# all other files stream: a background thread extracts and chunks while earlier batches are embedded
+# and stored, pausing whenever the chunks waiting for embedding fill `memory_budget` bytes
+# `dedup` is a scripts.dedup scope: "Off", "Document" (per file) or "Run" (across every file of this call)
+def ingest_files(jobs, store, table_name, expected_dim, model, cohere_key, openai_key, workers=1, dedup="Off",
+                 memory_budget=DEFAULT_MEMORY_BUDGET, **store_options):
+    jobs = list(jobs)
+    for job in jobs:
+        stamp_content_hash(job)
+    run_deduplicator = make_deduplicator(dedup) if dedup == "Run" else None
+    if workers and workers > 1:
+        pooled = [job for job in jobs if not _streams(job, memory_budget)]
+        streamed = [job for job in jobs if _streams(job, memory_budget)]
+    else:
+        pooled, streamed = [], jobs
+
+    def finish(job, result, extract_seconds):
+        result["extract_seconds"] = extract_seconds
+        # Extraction runs in worker processes or a background thread: record its total here
+        metrics.observe("stage_seconds", extract_seconds, stage="extract")
+        metrics.observe("stage_seconds", result["upload_seconds"], stage="embed_and_store")
+        metrics.inc("files_total", status=result["status"])
+        return job, result
+
+    for job, chunks, error, extract_seconds in (iter_prepared_files(pooled, workers) if pooled else ()):
+        if error is not None:
+            result = {"file": os.path.basename(job["path"]), "path": job["path"], "status": "failed",
+                      "chunks": 0, "tokens": 0, "rows_written": 0, "skipped": 0, "deduplicated": 0, "requests_saved": 0, "upload_seconds": 0.0, "error": str(error)}
+        else:
+            result = store_file(job, chunks, store, table_name, expected_dim, model, cohere_key, openai_key,
+                                deduplicator=run_deduplicator or make_deduplicator(dedup), **store_options)
+        yield finish(job, result, extract_seconds)
+
+    for job in streamed:
+        buffer = ChunkBuffer(_iter_job_chunks(job), MemoryBudget(memory_budget))
+        try:
+            result = store_file(job, buffer, store, table_name, expected_dim, model, cohere_key, openai_key,
+                                deduplicator=run_deduplicator or make_deduplicator(dedup), **store_options)
+        finally:
+            buffer.close()
+        yield finish(job, result, buffer.busy_seconds)
+
+def _streams(job, memory_budget):
+    try:
+        return os.path.getsize(job["path"]) * POOL_FILE_SHARE > memory_budget
+    except OSError:
+        return False  # Let the worker report the missing file
+
+def _iter_job_chunks(job):
+    file_type = os.path.basename(job["path"]).split(".")[-1].lower()
+    return iter_file_chunks(job["path"], file_type, job["metadata"], job["chunk_size"], job.get("overlap", 0), job.get("table_batch_rows", 1000))
+
+
+# ✅ Function to total a batch of results: files, chunks, tokens, seconds and throughput
+def summarize(results, seconds):
+    results = list(results)
+    chunks = sum(result["chunks"] for result in results)
+    return {
+        "files": len(results),
+        "failed": sum(1 for result in results if result["status"] != "uploaded"),
+        "chunks": chunks,
+        "tokens": sum(result["tokens"] for result in results),
+        "rows_written": sum(result["rows_written"] for result in results),
+        "skipped": sum(result.get("skipped", 0) for result in results),
+        "deduplicated": sum(result.get("deduplicated", 0) for result in results),
+        "requests_saved": sum(result.get("requests_saved", 0) for result in results),
+        "seconds": seconds,
+        "chunks_per_second": chunks / seconds if seconds else 0.0,
+    }
@@ -0,0 +1,283 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# ✅ Default journal location, next to the embedding cache and manifest
+DEFAULT_JOURNAL_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "cache", "journal.sqlite")
+
+# SQLite limits the number of bound parameters per statement
+SQLITE_MAX_VARIABLES = 900
+# Chunk ids per delete request when clearing the uncertain window
+DELETE_BATCH = 100
+
+# Chunk states, in order: known, embedded, handed to an insert, confirmed stored
+PENDING, EMBEDDED, SENT, STORED = 0, 1, 2, 3
+
+# Metadata keys that locate a chunk inside its file
+POSITION_KEYS = ("page", "table", "row", "start", "end")
+
+
+# ✅ Function to derive a deterministic chunk id from the file's content hash, the chunk's position and its text
+def chunk_id(content_hash, metadata, content):
+    digest = hashlib.sha256()
+    digest.update(content_hash.encode("utf-8"))
+    digest.update(json.dumps([str(metadata.get(key, "")) for key in POSITION_KEYS]).encode("utf-8"))
+    digest.update(content.encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+# ✅ Function to derive a job id: the same file, settings and target always resume the same job
+def job_key(content_hash, target, settings):
+    digest = hashlib.sha256()
+    digest.update(json.dumps([content_hash, target, settings], sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+# ✅ Durable ingest journal: one row per job, one row per chunk with its checkpoint state
+class IngestJournal:
+    def __init__(self, path=DEFAULT_JOURNAL_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, filename TEXT NOT NULL, target TEXT NOT NULL, status TEXT NOT NULL, "
+            "replaced INTEGER NOT NULL DEFAULT 0, error TEXT NOT NULL DEFAULT '', created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "job_id TEXT NOT NULL, chunk_id TEXT NOT NULL, state INTEGER NOT NULL, PRIMARY KEY (job_id, chunk_id)) WITHOUT ROWID"
+        )
+        # Journals written before jobs recorded their file's content hash
+        if "content_hash" not in [row[1] for row in self.conn.execute("PRAGMA table_info(jobs)")]:
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN content_hash TEXT NOT NULL DEFAULT ''")
+        # Progress of batched deletes, so an interrupted one resumes after its last batch
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS deletions ("
+            "target TEXT NOT NULL, scope TEXT NOT NULL, cursor TEXT NOT NULL, deleted INTEGER NOT NULL, "
+            "updated_at REAL NOT NULL, PRIMARY KEY (target, scope)) WITHOUT ROWID"
+        )
+        self.conn.commit()
+
+    # Start or resume a job; returns True when it already existed
+    def begin(self, job_id, filename, target, content_hash=""):
+        now = time.time()
+        with self.lock:
+            existing = self.conn.execute("SELECT 1 FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if existing:
+                self.conn.execute("UPDATE jobs SET status = 'running', error = '', updated_at = ? WHERE job_id = ?", (now, job_id))
+            else:
+                self.conn.execute(
+                    "INSERT INTO jobs (job_id, filename, target, content_hash, status, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, 'running', ?, ?)",
+                    (job_id, filename, target, content_hash, now, now),
+                )
+            self.conn.commit()
+        return existing is not None
+
+    def finish(self, job_id, status, error=""):
+        with self.lock:
+            self.conn.execute("UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?", (status, error, time.time(), job_id))
+            self.conn.commit()
+
+    def job(self, job_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT job_id, filename, target, content_hash, status, replaced, error, created_at, updated_at FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        keys = ("job_id", "filename", "target", "content_hash", "status", "replaced", "error", "created_at", "updated_at")
+        return None if row is None else dict(zip(keys, row))
+
+    # Jobs with their chunk counts per state, newest first
+    def jobs(self, status=None, limit=100, target=None):
+        query = (
+            "SELECT j.job_id, j.filename, j.target, j.content_hash, j.status, j.error, j.updated_at, "
+            "COUNT(c.chunk_id), COALESCE(SUM(c.state = 3), 0) "
+            "FROM jobs j LEFT JOIN chunks c ON c.job_id = j.job_id"
+        )
+        clauses, params = [], []
+        if status:
+            clauses.append("j.status = ?")
+            params.append(status)
+        if target:
+            clauses.append("j.target = ?")
+            params.append(target)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " GROUP BY j.job_id ORDER BY j.updated_at DESC LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        keys = ("job_id", "filename", "target", "content_hash", "status", "error", "updated_at", "chunks", "stored")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def is_replaced(self, job_id):
+        with self.lock:
+            row = self.conn.execute("SELECT replaced FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def mark_replaced(self, job_id):
+        with self.lock:
+            self.conn.execute("UPDATE jobs SET replaced = 1 WHERE job_id = ?", (job_id,))
+            self.conn.commit()
+
+    # Current state of each known chunk: {chunk_id: state}
+    def states(self, job_id, chunk_ids):
+        found = {}
+        chunk_ids = list(chunk_ids)
+        with self.lock:
+            for start in range(0, len(chunk_ids), SQLITE_MAX_VARIABLES - 1):
+                part = chunk_ids[start:start + SQLITE_MAX_VARIABLES - 1]
+                placeholders = ",".join("?" * len(part))
+                for chunk, state in self.conn.execute(
+                    f"SELECT chunk_id, state FROM chunks WHERE job_id = ? AND chunk_id IN ({placeholders})", [job_id, *part]
+                ):
+                    found[chunk] = state
+        return found
+
+    # Move chunks to `state` (a stored chunk never moves back)
+    def record(self, job_id, chunk_ids, state):
+        rows = [(job_id, chunk, state) for chunk in chunk_ids]
+        if not rows:
+            return
+        with self.lock:
+            self.conn.executemany(
+                "INSERT INTO chunks (job_id, chunk_id, state) VALUES (?, ?, ?) "
+                "ON CONFLICT (job_id, chunk_id) DO UPDATE SET state = excluded.state WHERE chunks.state < 3",
+                rows,
+            )
+            self.conn.commit()
+
+    # Chunk ids of a job that may have reached the target (sent or stored), ascending, after `after`
+    def sent_chunk_ids(self, job_id, after="", limit=1000):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT chunk_id FROM chunks WHERE job_id = ? AND state >= ? AND chunk_id > ? ORDER BY chunk_id LIMIT ?",
+                (job_id, SENT, after, limit),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def count_sent_chunks(self, job_id):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM chunks WHERE job_id = ? AND state >= ?", (job_id, SENT)).fetchone()[0]
+
+    # Drop jobs whose rows were deleted from the target (all of them, one file's, one content hash's or one job)
+    def forget(self, target, filename=None, content_hash=None, job_id=None):
+        clause, params = "target = ?", [target]
+        for column, value in (("filename", filename), ("content_hash", content_hash), ("job_id", job_id)):
+            if value is not None:
+                clause += f" AND {column} = ?"
+                params.append(value)
+        with self.lock:
+            self.conn.execute(f"DELETE FROM chunks WHERE job_id IN (SELECT job_id FROM jobs WHERE {clause})", params)
+            self.conn.execute(f"DELETE FROM jobs WHERE {clause}", params)
+            self.conn.commit()
+
+    # Cursor and rows deleted so far of an unfinished batched delete, or None
+    def deletion(self, target, scope):
+        with self.lock:
+            row = self.conn.execute("SELECT cursor, deleted FROM deletions WHERE target = ? AND scope = ?", (target, scope)).fetchone()
+        return None if row is None else {"cursor": row[0], "deleted": row[1]}
+
+    def save_deletion(self, target, scope, cursor, deleted):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO deletions (target, scope, cursor, deleted, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (target, scope) DO UPDATE SET cursor = excluded.cursor, deleted = excluded.deleted, updated_at = excluded.updated_at",
+                (target, scope, str(cursor), deleted, time.time()),
+            )
+            self.conn.commit()
+
+    def finish_deletion(self, target, scope):
+        with self.lock:
+            self.conn.execute("DELETE FROM deletions WHERE target = ? AND scope = ?", (target, scope))
+            self.conn.commit()
+
+
+# ✅ Checkpoints of one job: assigns chunk ids, skips stored chunks and records progress from the writer
+class JobCheckpoint:
+    def __init__(self, journal, store, job_id, content_hash, filename):
+        self.journal = journal
+        self.store = store
+        self.job_id = job_id
+        self.content_hash = content_hash
+        self.resumed = journal.begin(job_id, filename, store.key, content_hash)
+        self.skipped = 0  # Chunks already stored by an earlier run
+
+    # Run a destructive step (e.g. deleting a changed file's old rows) only once per job
+    def replace_once(self, delete):
+        if not self.journal.is_replaced(self.job_id):
+            delete()
+            self.journal.mark_replaced(self.job_id)
+
+    # Tag chunks with their deterministic ids (chunks already tagged are kept as they are)
+    def tag(self, chunks):
+        return [
+            (content, metadata if "chunk_id" in metadata else {**metadata, "chunk_id": chunk_id(self.content_hash, metadata, content)})
+            for content, metadata in chunks
+        ]
+
+    # Tag chunks with their ids and return the ones still to store
+    def prepare(self, chunks):
+        tagged = self.tag(chunks)
+        ids = [metadata["chunk_id"] for _, metadata in tagged]
+        states = self.journal.states(self.job_id, ids) if self.resumed else {}
+
+        # Inserts in flight when the last run stopped may or may not have landed: delete them before re-inserting
+        uncertain = [chunk for chunk in ids if states.get(chunk) == SENT]
+        for start in range(0, len(uncertain), DELETE_BATCH):
+            self.store.delete_by_metadata({"chunk_id": uncertain[start:start + DELETE_BATCH]})
+
+        remaining = [chunk for chunk in tagged if states.get(chunk[1]["chunk_id"]) != STORED]
+        self.skipped += len(tagged) - len(remaining)
+        self.journal.record(self.job_id, [chunk for chunk in ids if chunk not in states], PENDING)
+        return remaining
+
+    # Duplicates dropped before embedding count as stored: their content is in the row that references them,
+    # so a re-run skips them instead of referencing them again
+    def dropped(self, chunk_ids):
+        self.journal.record(self.job_id, chunk_ids, STORED)
+
+    def embedded(self, chunk_ids):
+        self.journal.record(self.job_id, chunk_ids, EMBEDDED)
+
+    # Follow a writer's inserts: rows are SENT when a batch leaves and STORED once it is confirmed
+    def attach(self, writer):
+        writer.on_sending = lambda rows: self.journal.record(self.job_id, self._ids(rows), SENT)
+        writer.on_written = lambda rows: self.journal.record(self.job_id, self._ids(rows), STORED)
+
+    @staticmethod
+    def _ids(rows):
+        return [row["metadata"]["chunk_id"] for row in rows if "chunk_id" in row.get("metadata", {})]
+
+    def finish(self, writer=None, error=""):
+        if error:
+            status = "failed"
+        elif writer is not None and writer.rows_failed:
+            status, error = "partial", writer.errors[-1]
+        else:
+            status = "done"
+        self.journal.finish(self.job_id, status, error)
+
+
+# ✅ Shared journal instance
+_journal = None
+_journal_lock = threading.Lock()
+
+def get_journal(path=DEFAULT_JOURNAL_PATH):
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = IngestJournal(path)
+    return _journal
+
+# ✅ Function to start or resume the checkpointed job for a file
+# `settings` are whatever changes the chunks (chunk size, overlap, model, dimension...)
+def begin_job(store, filename, content_hash, settings):
+    job_id = job_key(content_hash, store.key, settings)
+    return JobCheckpoint(get_journal(), store, job_id, content_hash, filename)
@@ -0,0 +1,127 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+# ✅ Default manifest location, next to the embedding cache
+DEFAULT_MANIFEST_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "cache", "manifest.sqlite")
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+# ✅ Function to hash a file's contents without loading it fully into memory
+def hash_file(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# ✅ Persistent manifest of file fingerprints (path, size, mtime, content hash)
+class FileManifest:
+    def __init__(self, path=DEFAULT_MANIFEST_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "content_hash TEXT NOT NULL, synced_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def get(self, file_path):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, content_hash FROM files WHERE path = ?", (os.path.abspath(file_path),)
+            ).fetchone()
+        return None if row is None else {"size": row[0], "mtime_ns": row[1], "content_hash": row[2]}
+
+    # Compare the directory against the manifest; only files whose size/mtime moved get hashed
+    def scan(self, base_dir):
+        with self.lock:
+            known = {
+                path: (size, mtime_ns, content_hash)
+                for path, size, mtime_ns, content_hash in self.conn.execute("SELECT path, size, mtime_ns, content_hash FROM files")
+            }
+
+        changes = []
+        touched = []  # Same content, new mtime: refresh the fingerprint only
+        for entry in os.scandir(base_dir):
+            if not entry.is_file():
+                continue
+            path = os.path.abspath(entry.path)
+            change = self._compare(path, entry.stat(), known.get(path), touched)
+            if change:
+                changes.append(change)
+
+        self._touch(touched)
+        return sorted(changes, key=lambda change: change["name"])
+
+    # Compare a single file against the manifest; returns its change dict or None if it is in sync
+    def check(self, file_path):
+        path = os.path.abspath(file_path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        previous = self.get(path)
+        touched = []
+        change = self._compare(path, stat, previous and (previous["size"], previous["mtime_ns"], previous["content_hash"]), touched)
+        self._touch(touched)
+        return change
+
+    # Only files whose size/mtime moved get hashed
+    @staticmethod
+    def _compare(path, stat, previous, touched):
+        if previous and previous[0] == stat.st_size and previous[1] == stat.st_mtime_ns:
+            return None
+
+        content_hash = hash_file(path)
+        fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "content_hash": content_hash}
+        if previous and previous[2] == content_hash:
+            touched.append((stat.st_size, stat.st_mtime_ns, path))
+            return None
+        return {
+            "name": os.path.basename(path),
+            "path": path,
+            "status": "changed" if previous else "added",
+            "previous_hash": previous[2] if previous else None,
+            **fingerprint,
+        }
+
+    def _touch(self, touched):
+        if touched:
+            with self.lock:
+                self.conn.executemany("UPDATE files SET size = ?, mtime_ns = ? WHERE path = ?", touched)
+                self.conn.commit()
+
+    # Record a file as synced once all its rows are stored
+    def mark_synced(self, change):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, content_hash, synced_at) VALUES (?, ?, ?, ?, ?)",
+                (change["path"], change["size"], change["mtime_ns"], change["content_hash"], time.time()),
+            )
+            self.conn.commit()
+
+    def forget(self, file_path):
+        with self.lock:
+            self.conn.execute("DELETE FROM files WHERE path = ?", (os.path.abspath(file_path),))
+            self.conn.commit()
+
+
+# ✅ Shared manifest instance
+_manifest = None
+_manifest_lock = threading.Lock()
+
+def get_manifest(path=DEFAULT_MANIFEST_PATH):
+    global _manifest
+    with _manifest_lock:
+        if _manifest is None:
+            _manifest = FileManifest(path)
+    return _manifest
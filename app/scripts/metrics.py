@@ -0,0 +1,210 @@
+import os
+import time
+import cProfile
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Latency buckets (seconds) shared by every histogram
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_PREFIX = "file2vector_"
+
+HELP = {
+    "stage_seconds": "Time spent per pipeline stage call.",
+    "provider_request_seconds": "Embedding provider request latency.",
+    "chunks_total": "Chunks embedded and buffered for storage.",
+    "tokens_total": "Tokens sent to the embedding provider.",
+    "embed_requests_total": "Embedding provider requests.",
+    "cache_hits_total": "Chunks served from the embedding cache.",
+    "cache_misses_total": "Chunks not found in the embedding cache.",
+    "bytes_sent_total": "Approximate insert payload bytes sent to the vector store.",
+    "rows_written_total": "Rows stored in the vector store.",
+    "rows_failed_total": "Rows that failed to store.",
+    "retries_total": "Retried provider calls and split insert batches.",
+    "files_total": "Files ingested, by result status.",
+    "dedup_dropped_total": "Duplicate chunks dropped before embedding.",
+    "backpressure_waits_total": "Times extraction paused because the memory budget was full.",
+}
+
+
+# ✅ Fixed-bucket histogram (Prometheus style) with approximate quantiles
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # Quantile interpolated inside its bucket
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+NULL_TIMER = _NullTimer()
+
+
+# ✅ Process-wide counters and histograms; every call is a cheap no-op while disabled
+class Metrics:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.counters = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.started = time.time()
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    # Context manager recording the block's duration into a histogram
+    def timer(self, name, **labels):
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self, name, labels)
+
+    # Duration of a pipeline stage (pdf_page, chunk, embed, store_insert, ...)
+    def stage(self, stage):
+        return self.timer("stage_seconds", stage=stage)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    # Plain data for the UI: counters and per-histogram count, total, mean, p50, p99
+    def snapshot(self):
+        with self.lock:
+            counters = [{"metric": name, **dict(labels), "value": value} for (name, labels), value in sorted(self.counters.items())]
+            histograms = [
+                {
+                    "metric": name, **dict(labels), "count": histogram.count, "total (s)": round(histogram.sum, 3),
+                    "mean (ms)": round(histogram.sum / histogram.count * 1000, 2) if histogram.count else 0.0,
+                    "p50 (ms)": round(histogram.quantile(0.5) * 1000, 2), "p99 (ms)": round(histogram.quantile(0.99) * 1000, 2),
+                }
+                for (name, labels), histogram in sorted(self.histograms.items())
+            ]
+        return {"since": self.started, "counters": counters, "histograms": histograms}
+
+    # Prometheus text exposition format
+    def to_prometheus(self):
+        lines = []
+
+        def label_text(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items:
+                return ""
+            return "{" + ",".join(f'{key}="{str(value)}"' for key, value in items) + "}"
+
+        with self.lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = METRIC_PREFIX + name
+                if metric not in typed:
+                    typed.add(metric)
+                    lines += [f"# HELP {metric} {HELP.get(name, name)}", f"# TYPE {metric} counter"]
+                lines.append(f"{metric}{label_text(labels)} {value}")
+
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                metric = METRIC_PREFIX + name
+                if metric not in typed:
+                    typed.add(metric)
+                    lines += [f"# HELP {metric} {HELP.get(name, name)}", f"# TYPE {metric} histogram"]
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{label_text(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{metric}_sum{label_text(labels)} {histogram.sum}")
+                lines.append(f"{metric}_count{label_text(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    # Write the Prometheus text atomically (e.g. for node_exporter's textfile collector)
+    def write_prometheus(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(temporary, path)
+        return path
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "labels", "start")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+# ✅ Shared instance used by the pipeline (FILE2VECTOR_METRICS=0 disables it)
+metrics = Metrics(enabled=os.environ.get("FILE2VECTOR_METRICS", "1") != "0")
+
+# ✅ Directory for per-job cProfile dumps (None: profiling off)
+profile_dir = os.environ.get("FILE2VECTOR_PROFILE_DIR") or None
+
+def set_profile_dir(directory):
+    global profile_dir
+    profile_dir = directory or None
+
+
+# ✅ Context manager profiling one job with cProfile when a profile directory is set
+# cProfile follows the calling thread only; embedding and insert threads show up as waits
+@contextmanager
+def profile_job(name):
+    if not profile_dir:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        os.makedirs(profile_dir, exist_ok=True)
+        safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+        profiler.dump_stats(os.path.join(profile_dir, f"{safe_name}-{time.strftime('%Y%m%d-%H%M%S')}.prof"))
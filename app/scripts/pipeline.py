@@ -0,0 +1,175 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from scripts.metrics import metrics
+
+
+# ✅ Token bucket refilled continuously at `per_minute` units per minute
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        # Requests larger than the bucket only wait for a full bucket
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                delay = (amount - self.tokens) / self.rate
+            time.sleep(min(delay, 1.0))
+
+
+# ✅ Rate limiter for provider requests-per-minute and tokens-per-minute quotas
+class RateLimiter:
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.backoff = 0.0  # Current adaptive delay in seconds
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=0):
+        # Honor a pause requested by a recent 429/5xx before spending quota
+        delay = self.blocked_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        if self.requests:
+            self.requests.acquire(1)
+        if self.tokens and tokens:
+            self.tokens.acquire(tokens)
+
+    # Slow every caller down after a throttling or server error
+    def penalize(self, retry_after=None):
+        with self.lock:
+            self.backoff = min(max(self.backoff * 2, 1.0), 60.0)
+            delay = retry_after if retry_after else self.backoff * (1 + random.random() * 0.25)
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+        return delay
+
+    # Speed back up once requests succeed again
+    def reward(self):
+        with self.lock:
+            self.backoff /= 2
+            if self.backoff < 0.5:
+                self.backoff = 0.0
+
+
+# ✅ Pooled rate limiters, one per provider/API key so concurrent uploads share a quota
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+def get_rate_limiter(model, api_key, requests_per_minute=None, tokens_per_minute=None):
+    limiter_key = (model, api_key)
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(limiter_key)
+        if limiter is None:
+            limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+            _rate_limiters[limiter_key] = limiter
+    return limiter
+
+
+# ✅ HTTP status code of a provider/client error, if it carries one
+def error_status(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+# ✅ Function to decide whether a failed call is worth retrying
+def is_retryable(error):
+    status = error_status(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    # Connection resets and timeouts carry no status code
+    name = type(error).__name__
+    return "Timeout" in name or "Connection" in name
+
+# ✅ Retry-After header (seconds) of a throttled response, if any
+def retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+# ✅ Function to call `fn` under a rate limiter, backing off adaptively on 429/5xx
+def call_with_backoff(fn, limiter=None, tokens=0, max_retries=5):
+    attempt = 0
+    while True:
+        if limiter:
+            limiter.acquire(tokens)
+        try:
+            result = fn()
+        except Exception as e:
+            attempt += 1
+            if attempt > max_retries or not is_retryable(e):
+                raise
+            metrics.inc("retries_total", reason=str(error_status(e) or type(e).__name__))
+            delay = limiter.penalize(retry_after(e)) if limiter else (retry_after(e) or min(2 ** attempt, 60))
+            if not limiter:
+                time.sleep(delay)
+            continue
+        if limiter:
+            limiter.reward()
+        return result
+
+
+# ✅ Run `fn` over items with at most `max_inflight` calls at once, yielding results in input order
+# `on_complete(result)` fires in the caller's thread as soon as each call finishes
+def ordered_map(fn, items, max_inflight=4, on_complete=None):
+    if max_inflight <= 1:
+        for item in items:
+            result = fn(item)
+            if on_complete:
+                on_complete(result)
+            yield result
+        return
+
+    items = iter(items)
+    exhausted = object()
+    pending = deque()  # Futures in submission order
+    reported = set()  # Futures whose completion event was already emitted
+    with ThreadPoolExecutor(max_workers=max_inflight) as executor:
+        try:
+            while True:
+                # Keep the pool full without reading the whole input up front
+                while len(pending) < max_inflight:
+                    item = next(items, exhausted)
+                    if item is exhausted:
+                        break
+                    pending.append(executor.submit(fn, item))
+                if not pending:
+                    return
+
+                # Report completion events as they happen, in any order
+                not_done = [future for future in pending if not future.done()]
+                if not_done and pending[0] in not_done:
+                    wait(not_done, return_when=FIRST_COMPLETED)
+                for future in pending:
+                    if future.done() and future not in reported:
+                        reported.add(future)
+                        if on_complete and not future.exception():
+                            on_complete(future.result())
+
+                # Release finished results in order
+                while pending and pending[0].done():
+                    future = pending.popleft()
+                    reported.discard(future)
+                    yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,51 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+
+# ✅ Default number of extraction processes
+def default_workers():
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+# ✅ Worker: extract and chunk one file (runs in a child process)
+def prepare_file(job):
+    from scripts.utils import extract_chunks
+
+    start = time.perf_counter()
+    chunks = extract_chunks(job["path"], job["metadata"], job["chunk_size"], job.get("overlap", 0), job.get("table_batch_rows", 1000))
+    return chunks, time.perf_counter() - start
+
+
+# ✅ Generator running `prepare_file` over jobs in a process pool; yields
+# (job, chunks, error, seconds) as files finish, so one corrupt file never aborts the batch
+def iter_prepared_files(jobs, max_workers=None):
+    max_workers = max_workers or default_workers()
+    jobs = iter(jobs)
+    exhausted = object()
+
+    # Spawned workers do not inherit the Streamlit server's threads and sockets
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+        pending = {}
+
+        # Only a couple of finished files wait for the upload stage at once
+        def submit_more():
+            while len(pending) < max_workers * 2:
+                job = next(jobs, exhausted)
+                if job is exhausted:
+                    return
+                pending[pool.submit(prepare_file, job)] = (job, time.perf_counter())
+
+        submit_more()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                job, submitted = pending.pop(future)
+                try:
+                    chunks, seconds = future.result()
+                    yield job, chunks, None, seconds
+                except Exception as e:
+                    yield job, None, e, time.perf_counter() - submitted
+            submit_more()
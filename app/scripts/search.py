@@ -0,0 +1,202 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from scripts.utils import EMBEDDING_PROVIDERS, embed_batch, fit_dimensions
+from scripts.pipeline import get_rate_limiter, call_with_backoff
+from scripts.chunking import count_tokens
+
+# ✅ Supported in-memory encodings of the stored vectors
+QUANTIZATIONS = ["None", "float16", "int8"]
+
+# Rows scored per matrix product; large enough to amortize overhead, small enough to stay in cache-friendly chunks
+DEFAULT_BLOCK_ROWS = 65536
+
+
+# ✅ Function to embed a search query once (Cohere embeds queries differently from documents)
+def embed_query(text, model, cohere_key, openai_key):
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("❌ Error: Search query is empty.")
+    provider = EMBEDDING_PROVIDERS["Cohere" if model == "Cohere" else "OpenAI"]
+    limiter = get_rate_limiter(
+        model, cohere_key if model == "Cohere" else openai_key,
+        provider["requests_per_minute"], provider["tokens_per_minute"],
+    )
+    vectors = call_with_backoff(
+        lambda: embed_batch([text], model, cohere_key, openai_key, input_type="search_query"),
+        limiter, count_tokens(text),
+    )
+    return vectors[0]
+
+# ✅ Function to keep the `k` best (score, id) pairs without sorting everything
+def top_k(scores, ids, k):
+    if len(scores) <= k:
+        return scores, ids
+    best = np.argpartition(scores, -k)[-k:]
+    return scores[best], ids[best]
+
+
+# ✅ Cosine top-k index over a LocalVectorStore's memory-mapped vectors
+# Keeps per-row inverse norms, the tombstone mask and (optionally) a quantized copy in memory;
+# all of them are extended incrementally as the append-only store grows, and rebuilt when a failed
+# insert rolled rows back (the store's generation changed)
+class LocalSearchIndex:
+    def __init__(self, store, quantization="None", block_rows=DEFAULT_BLOCK_ROWS, workers=None):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unsupported quantization: {quantization}")
+        self.store = store
+        self.quantization = quantization
+        self.block_rows = block_rows
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.generation = None
+        self.lock = threading.Lock()
+        self.executor = None
+        self._reset()
+
+    def _reset(self):
+        self.rows = 0  # Rows indexed so far
+        self.dim = None
+        self.inv_norms = np.zeros(0, dtype=np.float32)
+        self.codes = None  # Quantized vectors (int8 or float16), None when searching float32 directly
+        self.factors = np.zeros(0, dtype=np.float32)  # Per-row multiplier turning code dot products into cosines
+        self.deleted = np.zeros(0, dtype=bool)
+        self.deletions = None
+
+    # Bring the index up to date with rows appended or deleted since the last query
+    def refresh(self):
+        with self.lock:
+            # Read before the vectors, so a rollback racing with this refresh is caught by the next one
+            generation = self.store.generation()
+            vectors = self.store.vectors()
+            rows = len(vectors)
+            if generation != self.generation or rows < self.rows:
+                self._reset()
+                self.generation = generation
+            if rows > self.rows:
+                self.dim = vectors.shape[1]
+                self._index_rows(vectors, self.rows, rows)
+                self.deleted = np.concatenate([self.deleted, np.zeros(rows - self.rows, dtype=bool)])
+                self.rows = rows
+
+            deletions = self.store.deletions()
+            if deletions != self.deletions:
+                deleted = np.zeros(self.rows, dtype=bool)
+                deleted_ids = self.store.deleted_ids()
+                deleted[deleted_ids[deleted_ids < self.rows]] = True
+                self.deleted, self.deletions = deleted, deletions
+        return self
+
+    def _index_rows(self, vectors, start, stop):
+        inv_norms, codes, factors = [self.inv_norms], [], [self.factors]
+        if self.codes is not None:
+            codes.append(self.codes)
+        for block_start in range(start, stop, self.block_rows):
+            block = np.asarray(vectors[block_start:min(block_start + self.block_rows, stop)], dtype=np.float32)
+            norms = np.linalg.norm(block, axis=1)
+            inv_norm = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+            inv_norms.append(inv_norm)
+
+            if self.quantization == "int8":
+                # Symmetric per-row scale: the largest component maps to ±127
+                scale = np.abs(block).max(axis=1) / 127.0
+                scale[scale == 0] = 1.0
+                codes.append(np.rint(block / scale[:, None]).astype(np.int8))
+                factors.append((scale * inv_norm).astype(np.float32))
+            elif self.quantization == "float16":
+                codes.append(block.astype(np.float16))
+                factors.append(inv_norm)
+
+        self.inv_norms = np.concatenate(inv_norms)
+        if self.quantization != "None":
+            self.codes = np.concatenate(codes)
+            self.factors = np.concatenate(factors)
+
+    # Score one block (a slice of rows or an array of row ids) and keep its best `k`
+    def _score_block(self, vectors, query, block, k):
+        if self.codes is not None:
+            scores = (self.codes[block].astype(np.float32) @ query) * self.factors[block]
+        else:
+            scores = (np.asarray(vectors[block], dtype=np.float32) @ query) * self.inv_norms[block]
+        scores[self.deleted[block]] = -np.inf
+        ids = np.arange(block.start, block.stop) if isinstance(block, slice) else block
+        return top_k(scores, ids, k)
+
+    # Top-k (ids, cosine scores) for a query vector, best first
+    # `ids` restricts the search to those rows (metadata prefilter); quantized scores are re-ranked exactly
+    def search(self, query_vector, k=10, ids=None, rerank_factor=4):
+        self.refresh()
+        if self.rows == 0 or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        vectors = self.store.vectors()
+        query = fit_dimensions(query_vector, self.dim)  # Unit length, so scores are cosines
+        candidates = k * rerank_factor if self.codes is not None else k
+
+        if ids is None:
+            blocks = [slice(start, min(start + self.block_rows, self.rows)) for start in range(0, self.rows, self.block_rows)]
+        else:
+            ids = np.asarray(ids, dtype=np.int64)
+            ids = ids[ids < self.rows]
+            blocks = [ids[start:start + self.block_rows] for start in range(0, len(ids), self.block_rows)]
+
+        # NumPy releases the GIL in matrix products, so blocks can be scored in parallel threads
+        if len(blocks) > 1 and self.workers > 1:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers)
+            parts = list(self.executor.map(lambda block: self._score_block(vectors, query, block, candidates), blocks))
+        else:
+            parts = [self._score_block(vectors, query, block, candidates) for block in blocks]
+        if not parts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        scores, found = top_k(np.concatenate([part[0] for part in parts]), np.concatenate([part[1] for part in parts]), candidates)
+        live = np.isfinite(scores)
+        scores, found = scores[live], found[live]
+
+        if self.codes is not None and len(found):
+            # Exact float32 re-ranking of the quantized candidates (sorted ids read the memory map sequentially)
+            found = np.sort(found)
+            scores = (np.asarray(vectors[found], dtype=np.float32) @ query) * self.inv_norms[found]
+            scores, found = top_k(scores, found, k)
+
+        order = np.argsort(-scores)[:k]
+        return found[order], scores[order]
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+# ✅ Shared indexes, one per local store and quantization, so they survive Streamlit reruns
+_search_indexes = {}
+_search_indexes_lock = threading.Lock()
+
+def get_search_index(store, quantization="None"):
+    index_key = (os.path.abspath(store.directory), quantization)
+    with _search_indexes_lock:
+        index = _search_indexes.get(index_key)
+        if index is None or index.store is not store:
+            index = LocalSearchIndex(store, quantization)
+            _search_indexes[index_key] = index
+    return index
+
+
+# ✅ Function to search a local store: embeds the query once and returns the best chunks with timings
+# `filters` are metadata prefilters, e.g. {"filename": ["a.pdf", "b.pdf"]}
+def search_local_store(store, query, model, cohere_key, openai_key, k=10, filters=None, quantization="None", rerank_factor=4):
+    timings = {}
+    start = time.perf_counter()
+    query_vector = embed_query(query, model, cohere_key, openai_key)
+    timings["embed_seconds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = get_search_index(store, quantization)
+    ids = store.ids(filters) if filters else None
+    found, scores = index.search(query_vector, k, ids, rerank_factor)
+    timings["search_seconds"] = time.perf_counter() - start
+
+    rows = {row["id"]: row for row in store.get(found)}
+    results = [{**rows[row_id], "score": float(score)} for row_id, score in zip(found.tolist(), scores) if row_id in rows]
+    return results, timings
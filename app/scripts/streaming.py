@@ -0,0 +1,135 @@
+import sys
+import time
+import queue
+import threading
+from scripts.metrics import metrics
+
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024  # 256 MB of extracted chunks in flight per file
+QUEUE_ITEMS = 1024  # Chunks waiting between extraction and embedding
+BATCH_CHUNKS = 512  # Chunks embedded and stored per step
+
+
+# ✅ Function to estimate the memory a (content, metadata) chunk holds
+def chunk_bytes(content, metadata):
+    return sys.getsizeof(content) + sys.getsizeof(metadata) + sum(
+        sys.getsizeof(key) + sys.getsizeof(value) for key, value in metadata.items()
+    )
+
+
+# ✅ Byte budget shared by the stages of a pipeline: producers block in `acquire` until consumers `release`
+# An item larger than what is left is still admitted once usage falls below `floor`, so one
+# oversized chunk cannot stall the pipeline
+class MemoryBudget:
+    def __init__(self, max_bytes=DEFAULT_MEMORY_BUDGET, floor=None):
+        self.max_bytes = max_bytes
+        self.floor = max_bytes // 4 if floor is None else floor
+        self.used = 0
+        self.peak = 0
+        self.waits = 0  # Times a producer was held back
+        self.condition = threading.Condition()
+
+    def acquire(self, size, stop=None):
+        with self.condition:
+            if self.used + size > self.max_bytes and self.used >= self.floor:
+                self.waits += 1
+                metrics.inc("backpressure_waits_total")
+                while self.used + size > self.max_bytes and self.used >= self.floor:
+                    if stop is not None and stop.is_set():
+                        return False
+                    self.condition.wait(0.1)
+            self.used += size
+            self.peak = max(self.peak, self.used)
+            return True
+
+    def release(self, size):
+        with self.condition:
+            self.used -= size
+            self.condition.notify_all()
+
+    def stats(self):
+        return {"max_bytes": self.max_bytes, "used": self.used, "peak": self.peak, "waits": self.waits}
+
+
+_DONE = object()
+
+
+# ✅ Stage buffer: runs a chunk generator in a background thread, handing chunks over through a
+# bounded queue whose contents count against a MemoryBudget. Iterate it with `batches()`:
+# a batch's bytes are released only when the next batch is requested, i.e. once it was stored.
+class ChunkBuffer:
+    def __init__(self, chunks, budget=None, max_items=QUEUE_ITEMS, name="extract"):
+        self.budget = budget or MemoryBudget()
+        self.queue = queue.Queue(maxsize=max_items)
+        self.stop = threading.Event()
+        self.busy_seconds = 0.0  # Time the producer spent extracting and chunking
+        self.chunks = iter(chunks)
+        self.thread = threading.Thread(target=self._produce, args=(self.chunks,), name=f"file2vector-{name}", daemon=True)
+        self.thread.start()
+
+    def _put(self, item):
+        while not self.stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, chunks):
+        try:
+            while not self.stop.is_set():
+                start = time.perf_counter()
+                chunk = next(chunks, _DONE)
+                self.busy_seconds += time.perf_counter() - start
+                if chunk is _DONE:
+                    break
+                size = chunk_bytes(*chunk)
+                if not self.budget.acquire(size, self.stop):
+                    return
+                if not self._put((chunk, size)):
+                    self.budget.release(size)
+                    return
+            self._put((_DONE, 0))
+        except BaseException as e:
+            self._put((e, 0))
+
+    # Generator of chunk lists of at most `max_chunks` chunks and `max_bytes` (a quarter of the budget)
+    def batches(self, max_chunks=BATCH_CHUNKS, max_bytes=None):
+        max_bytes = max_bytes or self.budget.floor
+        batch, batch_bytes = [], 0
+        try:
+            while True:
+                item, size = self.queue.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                batch.append(item)
+                batch_bytes += size
+                if len(batch) >= max_chunks or batch_bytes >= max_bytes:
+                    yield batch
+                    self.budget.release(batch_bytes)
+                    batch, batch_bytes = [], 0
+            if batch:
+                yield batch
+        finally:
+            self.budget.release(batch_bytes)
+            self.close()
+
+    # Stop the producer (e.g. when storing failed), drop what it buffered and close its generator,
+    # so the files and memory maps the extraction opened are released now rather than at garbage collection
+    def close(self):
+        self.stop.set()
+        self._drain()  # Unblocks a producer waiting on a full queue
+        self.thread.join(timeout=5)
+        self._drain()
+        if not self.thread.is_alive() and hasattr(self.chunks, "close"):
+            self.chunks.close()  # Runs the generators' `finally` and `with` exits
+
+    def _drain(self):
+        while True:
+            try:
+                item, size = self.queue.get_nowait()
+            except queue.Empty:
+                return
+            self.budget.release(size)
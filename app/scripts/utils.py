@@ -1,113 +1,464 @@
+import io
 import os
+import sys
 import json
-import pandas as pd
+import mmap
 import numpy as np
-import pdfplumber
-import pymupdf
-import docx
-import cohere
-import openai
-import time
-from nltk.tokenize import sent_tokenize
-import streamlit as st
-from supabase import create_client
-
-# ✅ Load custom settings
-def load_custom_settings(): 
+import logging
+import threading
+from contextlib import contextmanager
+from scripts.metrics import metrics
+from scripts.pipeline import get_rate_limiter, call_with_backoff, ordered_map
+from scripts.embedding_cache import get_embedding_cache, cache_key
+from scripts.vector_store import SupabaseBatchWriter, as_vector_store
+from scripts.deletion import delete_rows
+from scripts.streaming import ChunkBuffer, MemoryBudget, DEFAULT_MEMORY_BUDGET
+from scripts.chunking import chunk_spans, iter_chunks, iter_stream_chunks, count_tokens, truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+# ✅ Default location of the custom settings file
+CUSTOM_SETTINGS_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "config", "custom_settings.json")
+
+# ✅ Load custom settings (errors go to `on_error`, e.g. st.error, or the log)
+def load_custom_settings(config_path=CUSTOM_SETTINGS_PATH, on_error=None):
+    on_error = on_error or logger.warning
     try:
-        config_path = os.path.join(os.path.dirname(__file__), "..", "..", "config", "custom_settings.json")
         with open(config_path, "r") as f:
             return json.load(f)
     except FileNotFoundError:
-        st.error("⚠️ Custom settings file not found.")
+        on_error("⚠️ Custom settings file not found.")
         return {}
     except json.JSONDecodeError:
-        st.error("⚠️ Error reading custom settings file.")
+        on_error("⚠️ Error reading custom settings file.")
         return {}
 
+# Heavy clients and file parsers (pandas, PyMuPDF, python-docx, cohere, openai, supabase) are imported
+# where they are first needed, so pages and file types that do not use them start faster
+
 # ✅ Supabase Client Initialization
 def create_supabase_client(url, key):
+    from supabase import create_client
     return create_client(url, key)
 
-def check_new_files(base_dir, known_files):
-    # Ensure `current_files` is a set
-    current_files = set(os.listdir(base_dir))
+# ✅ Function to find added or changed files using the persistent manifest
+def check_new_files(base_dir, manifest):
+    changes = manifest.scan(base_dir)
+    return changes  # Return as a list for Streamlit compatibility
 
-    # Ensure `known_files` is a set to avoid TypeError
-    known_files = set(known_files)
+# ✅ Function to delete every stored row of a file (by metadata.filename) in resumable batches
+# `supabase` may be a Supabase client or any VectorStore; the file's journal jobs are kept (it is being re-synced)
+def delete_file_rows(supabase, table_name, filename):
+    return delete_rows(as_vector_store(supabase, table_name), {"filename": filename}, forget=False)
 
-    # Now the set subtraction works correctly
-    new_files = current_files - known_files
 
-    return list(new_files), known_files  # Return as a list for Streamlit compatibility
+# ✅ Read-only file object over a memory map (mmap objects lack seekable(), which zipfile needs)
+class MappedFile(io.RawIOBase):
+    def __init__(self, mapped):
+        self.mapped = mapped
 
+    def readable(self):
+        return True
 
-# ✅ Function to split text into chunks
-def split_text(text, chunk_size=300):
-    sentences = sent_tokenize(text)
-    chunks, temp_chunk = [], ""
-    for sentence in sentences:
-        if len(temp_chunk) + len(sentence) <= chunk_size:
-            temp_chunk += " " + sentence
-        else:
-            chunks.append(temp_chunk.strip())
-            temp_chunk = sentence
-    if temp_chunk:
-        chunks.append(temp_chunk.strip())
-    return chunks
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.mapped.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self.mapped.seek(offset, whence)
+        return self.mapped.tell()
+
+    def tell(self):
+        return self.mapped.tell()
+
+# ✅ Context manager opening a path as a memory-mapped file (pages are read on demand and can be
+# dropped by the OS under pressure); file objects such as Streamlit uploads are passed through
+@contextmanager
+def open_mapped(source):
+    if not isinstance(source, (str, os.PathLike)):
+        yield source
+        return
+    with open(source, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty files cannot be mapped
+            yield f
+            return
+        with mapped, MappedFile(mapped) as mapped_file:
+            yield mapped_file
+
+# ✅ Function to tell whether a path or file object has no content (it cannot be mapped or unzipped)
+def is_empty_source(source):
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source) == 0
+    if hasattr(source, "size"):  # Streamlit's UploadedFile
+        return source.size == 0
+    position = source.tell()
+    source.seek(0, io.SEEK_END)
+    empty = source.tell() == 0
+    source.seek(position)
+    return empty
+
+# ✅ Function to split text into chunks of at most `chunk_size` tokens
+def split_text(text, chunk_size=300, overlap=0):
+    return [text[start:end] for start, end in chunk_spans(text, chunk_size, overlap)]
+
+# ✅ Function to open a PDF once, from a path (read lazily from disk) or an uploaded file
+def open_pdf(source):
+    import pymupdf
+    if isinstance(source, (str, os.PathLike)):
+        return pymupdf.open(source)
+    # Streamlit's UploadedFile is already in memory; getvalue() avoids another copy
+    data = source.getvalue() if hasattr(source, "getvalue") else source.read()
+    return pymupdf.open(stream=data, filetype="pdf")
+
+# ✅ Generator yielding one record per PDF page: {"page", "text", "tables"}
+# `on_page_count(pages)` is called once the document is open, before the first page is parsed
+def iter_pdf_pages(source, extract_tables=True, on_page_count=None):
+    with open_pdf(source) as doc:
+        if on_page_count:
+            on_page_count(doc.page_count)
+        for page_number in range(doc.page_count):
+            with metrics.stage("pdf_page"):
+                page = doc.load_page(page_number)
+                tables = []
+                if extract_tables:
+                    for table in page.find_tables().tables:
+                        rows = table.extract()
+                        if rows:
+                            import pandas as pd
+                            tables.append(pd.DataFrame(rows[1:], columns=rows[0]))
+                text = page.get_text("text")
+            yield {"page": page_number + 1, "text": text, "tables": tables}
+            del page  # Keep at most one parsed page alive
 
 # ✅ Function to extract text from PDFs
 def extract_text_from_pdf(uploaded_file):
-    text = ""
-    doc = pymupdf.open(stream=uploaded_file.read(), filetype="pdf")
-    for page in doc:
-        text += page.get_text("text") + "\n"
-    return text.strip()
-
-# ✅ Function to extract tables from PDFs
-def extract_tables_from_pdf(uploaded_file):
-    tables = []
-    with pdfplumber.open(uploaded_file) as pdf:
-        for page in pdf.pages:
-            extracted_table = page.extract_table()
-            if extracted_table:
-                df = pd.DataFrame(extracted_table[1:], columns=extracted_table[0])
-                tables.append(df)
-    return tables
+    return "\n".join(page["text"] for page in iter_pdf_pages(uploaded_file, extract_tables=False)).strip()
+
+# ✅ Function to turn PDF page records into (content, metadata) chunks
+def chunk_pdf_pages(pages, metadata, chunk_size, overlap=0):
+    for page in pages:
+        page_metadata = {**metadata, "page": page["page"]}
+        yield from iter_chunks([(page["text"], page_metadata)], chunk_size, overlap)
+        for i, table in enumerate(page["tables"]):
+            yield str(table.to_dict()), {**page_metadata, "table": i + 1}
+
+# ✅ WordprocessingML namespace of document.xml elements
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+# Characters of DOCX text handed to the chunker at a time
+DOCX_BLOCK_CHARS = 64 * 1024
+
+# ✅ Function to get a paragraph's text from its runs (text, tabs and line breaks)
+def docx_paragraph_text(paragraph):
+    parts = []
+    for run in paragraph.iter(WORD_NAMESPACE + "r"):
+        for node in run:
+            if node.tag == WORD_NAMESPACE + "t":
+                parts.append(node.text or "")
+            elif node.tag == WORD_NAMESPACE + "tab":
+                parts.append("\t")
+            elif node.tag in (WORD_NAMESPACE + "br", WORD_NAMESPACE + "cr"):
+                parts.append("\n")
+    return "".join(parts)
+
+# ✅ Generator of a DOCX file's body paragraphs, parsed incrementally from the zipped XML
+# python-docx builds the whole document tree first; here each paragraph is freed once read
+def iter_docx_paragraphs(source):
+    import zipfile
+    from xml.etree.ElementTree import iterparse
+    if is_empty_source(source):
+        return  # An empty document has no paragraphs
+    with open_mapped(source) as data, zipfile.ZipFile(data) as archive, archive.open("word/document.xml") as xml:
+        body, body_depth, depth = None, None, 0
+        for event, element in iterparse(xml, events=("start", "end")):
+            if event == "start":
+                depth += 1
+                if element.tag == WORD_NAMESPACE + "body":
+                    body, body_depth = element, depth
+                continue
+            depth -= 1
+            if depth == body_depth:  # A direct child of the body ended: paragraph, table or section
+                if element.tag == WORD_NAMESPACE + "p":
+                    yield docx_paragraph_text(element)
+                body.remove(element)
+
+# ✅ Generator of the DOCX text in blocks of about `block_chars`; the blocks joined are the full text
+def iter_docx_blocks(source, block_chars=DOCX_BLOCK_CHARS):
+    paragraphs = iter_docx_paragraphs(source)
+    separator = ""
+    while True:
+        block, size = [], 0
+        with metrics.stage("docx_extract"):
+            for paragraph in paragraphs:
+                block.append(separator + paragraph)
+                separator = "\n"
+                size += len(paragraph) + 1
+                if size >= block_chars:
+                    break
+        if not block:
+            return
+        yield "".join(block)
 
 # ✅ Function to extract text from DOCX files
 def extract_text_from_docx(uploaded_file):
-    doc = docx.Document(uploaded_file)
-    return "\n".join([para.text for para in doc.paragraphs]).strip()
+    return "".join(iter_docx_blocks(uploaded_file)).strip()
+
+# ✅ Generator of bounded DataFrames from a CSV (chunked reader) or XLSX (read-only streaming) file
+def iter_table_frames(source, file_type, batch_rows=1000):
+    import pandas as pd
+    if is_empty_source(source):
+        return  # No header and no rows
+    if file_type == "csv":
+        # Files on disk are memory-mapped instead of read through a buffer
+        try:
+            reader = pd.read_csv(source, chunksize=batch_rows, memory_map=isinstance(source, (str, os.PathLike)))
+        except pd.errors.EmptyDataError:  # Blank lines only
+            return
+        while True:
+            with metrics.stage("table_read"):
+                df = next(reader, None)
+            if df is None:
+                return
+            yield df
+
+    # openpyxl's read-only mode streams rows instead of loading the whole sheet
+    import openpyxl
+    with open_mapped(source) as data:
+        yield from _iter_sheet_frames(openpyxl.load_workbook(data, read_only=True, data_only=True), batch_rows)
+
+def _iter_sheet_frames(workbook, batch_rows):
+    import pandas as pd
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(column) if column is not None else f"column_{i}" for i, column in enumerate(header)]
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_rows:
+                yield pd.DataFrame(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
+
+# ✅ Function to build row texts and metadata column-wise: one (content, metadata) chunk per row
+def table_rows_to_chunks(df, metadata, first_row=0):
+    with metrics.stage("table_chunk"):
+        return _table_rows_to_chunks(df, metadata, first_row)
+
+def _table_rows_to_chunks(df, metadata, first_row):
+    strings = df.fillna("").astype(str)
+    strings.columns = [str(column) for column in strings.columns]
+
+    # "column: value, column: value" built with vectorized string concatenation
+    texts = None
+    for column in strings.columns:
+        part = column + ": " + strings[column]
+        texts = part if texts is None else texts + ", " + part
+
+    records = strings.to_dict("records")
+    chunks = []
+    for row_number, (text, record) in enumerate(zip(texts.tolist(), records), start=first_row + 1):
+        if text.strip():
+            chunks.append((text, {**record, **metadata, "row": str(row_number)}))
+    return chunks
+
+# ✅ Generator extracting and chunking a file lazily into (content, metadata) chunks ready to embed
+# `source` is a path (memory-mapped where the parser allows it) or a file object; only a page,
+# a block of DOCX text or a batch of rows is parsed at a time
+def iter_file_chunks(source, file_type, metadata, chunk_size=300, overlap=0, table_batch_rows=1000, on_page_count=None):
+    metadata = clean_metadata(metadata)  # Ensure metadata is JSON serializable
+
+    if file_type == "pdf":
+        for content, chunk_metadata in chunk_pdf_pages(iter_pdf_pages(source, on_page_count=on_page_count), metadata, chunk_size, overlap):
+            yield content, clean_metadata(chunk_metadata)
+
+    elif file_type == "docx":
+        for content, chunk_metadata in iter_stream_chunks(iter_docx_blocks(source), metadata, chunk_size, overlap):
+            yield content, clean_metadata(chunk_metadata)
+
+    elif file_type in ["csv", "xlsx"]:
+        total_rows = 0
+        for df in iter_table_frames(source, file_type, table_batch_rows):
+            yield from table_rows_to_chunks(df, metadata, first_row=total_rows)
+            total_rows += len(df)
 
-# ✅ Function to generate embeddings
-def generate_embedding(text, model, cohere_key, openai_key):
-    if not isinstance(text, str) or not text.strip():
-        raise ValueError("❌ Error: Input text for embedding is empty or not a valid string.")
+    else:
+        raise ValueError(f"Unsupported file type: .{file_type}")
+
+# ✅ Function to extract and chunk a file on disk into a list of (content, metadata) chunks
+def extract_chunks(file_path, metadata, chunk_size=300, overlap=0, table_batch_rows=1000):
+    file_extension = os.path.basename(file_path).split(".")[-1].lower()
+    return list(iter_file_chunks(file_path, file_extension, metadata, chunk_size, overlap, table_batch_rows))
+
+# ✅ Provider settings for embedding requests
+EMBEDDING_PROVIDERS = {
+    "Cohere": {
+        "model": "embed-english-v3.0",
+        "dimension": 1024,
+        "max_items": 96,  # Cohere accepts at most 96 texts per embed call
+        "max_input_tokens": 512,
+        "max_tokens": 96 * 512,
+        "requests_per_minute": 2000,
+        "tokens_per_minute": None,
+        "usd_per_million_tokens": 0.10,  # List price, for upload estimates
+    },
+    "OpenAI": {
+        "model": "text-embedding-3-small",
+        "dimension": 1536,
+        "max_items": 2048,  # OpenAI accepts at most 2048 inputs per request
+        "max_input_tokens": 8191,
+        "max_tokens": 300000,  # ...and at most 300k tokens summed over all inputs
+        "requests_per_minute": 3000,
+        "tokens_per_minute": 1000000,
+        "usd_per_million_tokens": 0.02,
+    },
+}
+
+# ✅ Function to cap a chunk size (tokens) at the provider's per-input limit, so no chunk is cut off when embedded
+def fit_chunk_size(chunk_size, model):
+    return min(int(chunk_size), EMBEDDING_PROVIDERS["Cohere" if model == "Cohere" else "OpenAI"]["max_input_tokens"])
+
+# ✅ Pooled embedding clients, one per provider/API key
+_embedding_clients = {}
+_embedding_clients_lock = threading.Lock()
+
+def get_embedding_client(model, api_key):
+    client_key = (model, api_key)
+    with _embedding_clients_lock:
+        client = _embedding_clients.get(client_key)
+        if client is None:
+            if model == "Cohere":
+                import cohere
+                client = cohere.Client(api_key)
+            else:  # OpenAI
+                import openai
+                client = openai.OpenAI(api_key=api_key)
+            _embedding_clients[client_key] = client
+    return client
+
+# ✅ Function to install a client for a provider/API key, e.g. an offline stand-in for benchmarks
+def register_embedding_client(model, api_key, client):
+    with _embedding_clients_lock:
+        _embedding_clients[(model, api_key)] = client
+
+# ✅ Function to pack texts into provider-sized requests (yields lists of indices)
+def batch_texts(texts, max_items, max_tokens):
+    batch, batch_tokens = [], 0
+    for i, text in enumerate(texts):
+        tokens = count_tokens(text)
+        if batch and (len(batch) >= max_items or batch_tokens + tokens > max_tokens):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(i)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+# ✅ Function to embed a single provider-sized batch
+# `input_type` tells Cohere whether the texts are stored documents or search queries
+def embed_batch(texts, model, cohere_key, openai_key, input_type="search_document"):
+    provider_name = "Cohere" if model == "Cohere" else "OpenAI"
+    provider = EMBEDDING_PROVIDERS[provider_name]
+    metrics.inc("embed_requests_total", provider=provider_name)
+    # Ensure every text is within the provider's per-input token limit
+    truncated_texts = [truncate_tokens(text, provider["max_input_tokens"]) for text in texts]
 
     if model == "Cohere":
-        co = cohere.Client(cohere_key)
-        response = co.embed(texts=[text], model="embed-english-v3.0", input_type="search_document")
-        return response.embeddings[0]
-    
+        co = get_embedding_client("Cohere", cohere_key)
+        with metrics.timer("provider_request_seconds", provider=provider_name):
+            response = co.embed(texts=truncated_texts, model=provider["model"], input_type=input_type)
+        return list(response.embeddings)
+
     else:  # OpenAI
-        openai_client = openai.OpenAI(api_key=openai_key)
-        
-        # Ensure text is within OpenAI's token limit
-        max_token_limit = 8192  # Adjust based on OpenAI model constraints
-        truncated_text = text[:max_token_limit]
+        openai_client = get_embedding_client("OpenAI", openai_key)
+        with metrics.timer("provider_request_seconds", provider=provider_name):
+            response = openai_client.embeddings.create(input=truncated_texts, model=provider["model"])
+        # OpenAI tags every embedding with the index of its input
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
 
-        response = openai_client.embeddings.create(input=truncated_text, model="text-embedding-3-small")
-        return response.data[0].embedding
+# ✅ Function to embed many texts, yielding (indices, float32 matrix) pairs: first one pair with every embedding
+# cache hit, then one per provider request in input order. Rows follow `indices`, not the input; use
+# `generate_embeddings` for vectors in input order. `cache` replaces the shared embedding cache
+def embed_batches(texts, model, cohere_key, openai_key, max_inflight=4, on_complete=None,
+                  requests_per_minute=None, tokens_per_minute=None, use_cache=True, cache=None):
+    for i, text in enumerate(texts):
+        if not isinstance(text, str) or not text.strip():
+            raise ValueError(f"❌ Error: Input text {i} for embedding is empty or not a valid string.")
+
+    provider_name = "Cohere" if model == "Cohere" else "OpenAI"
+    provider = EMBEDDING_PROVIDERS[provider_name]
+
+    # Resolve every chunk against the embedding cache in one lookup before calling the API
+    if not use_cache:
+        cache = None
+    elif cache is None:
+        cache = get_embedding_cache()
+    missing = list(range(len(texts)))
+    if cache is not None:
+        keys = [cache_key(text, provider_name, provider["model"], provider["dimension"]) for text in texts]
+        cached = cache.get_many(keys)
+        hits = [i for i, key in enumerate(keys) if key in cached]
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        metrics.inc("cache_hits_total", len(hits))
+        metrics.inc("cache_misses_total", len(missing))
+        if hits:
+            result = (hits, np.stack([cached[keys[i]] for i in hits]))
+            if on_complete:
+                on_complete(result)
+            yield result
+        if not missing:
+            return
+
+    limiter = get_rate_limiter(
+        model, cohere_key if model == "Cohere" else openai_key,
+        requests_per_minute or provider["requests_per_minute"],
+        tokens_per_minute or provider["tokens_per_minute"],
+    )
+
+    def embed(positions):
+        indices = [missing[position] for position in positions]
+        batch = [texts[i] for i in indices]
+        tokens = sum(count_tokens(text) for text in batch)
+        metrics.inc("tokens_total", tokens, provider=provider_name)
+        # The stage includes rate limiter waits and retries; provider_request_seconds is the bare request
+        with metrics.stage("embed"):
+            vectors = call_with_backoff(lambda: embed_batch(batch, model, cohere_key, openai_key), limiter, tokens)
+        vectors = np.asarray(vectors, dtype=np.float32)  # One contiguous array per batch from here on
+        if cache is not None:
+            cache.put_many((keys[i], vector) for i, vector in zip(indices, vectors))
+        return indices, vectors
+
+    # Keep several provider requests in flight while results are consumed in order
+    batches = batch_texts([texts[i] for i in missing], provider["max_items"], provider["max_tokens"])
+    yield from ordered_map(embed, batches, max_inflight=max_inflight, on_complete=on_complete)
+
+# ✅ Function to generate embeddings for a list of texts (float32 vectors, returned in input order)
+def generate_embeddings(texts, model, cohere_key, openai_key, max_inflight=4):
+    embeddings = [None] * len(texts)
+    for indices, vectors in embed_batches(texts, model, cohere_key, openai_key, max_inflight=max_inflight):
+        for i, vector in zip(indices, vectors):
+            embeddings[i] = vector
+    return embeddings
 
 # ✅ Function to clean metadata before storing in Supabase
 def clean_metadata(metadata):
     if not isinstance(metadata, dict):
         return {}
 
+    pd = sys.modules.get("pandas")  # Only a loaded pandas can have produced a Timestamp
     cleaned_metadata = {}
     for key, value in metadata.items():
-        if isinstance(value, pd.Timestamp):
+        if pd is not None and isinstance(value, pd.Timestamp):
             cleaned_metadata[key] = value.isoformat()  # Convert to ISO string
         elif isinstance(value, dict):
             cleaned_metadata[key] = clean_metadata(value)  # Recursively clean
@@ -119,49 +470,130 @@ def clean_metadata(metadata):
     return cleaned_metadata
 
 
-# ✅ Function to upload extracted text to Supabase
-def upload_to_supabase(supabase, table_name, content, metadata, expected_dim, model, cohere_key, openai_key, chunk_size):
-    text_chunks = split_text(content, chunk_size=chunk_size)
+# ✅ Function to fit a batch of vectors to `dim` columns in one step: truncate or zero-pad, then L2-renormalize
+# Renormalizing keeps cosine scores meaningful for truncated Matryoshka-style embeddings
+def fit_dimensions(vectors, dim):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        return fit_dimensions(vectors[None, :], dim)[0]
 
-    if not text_chunks:
-        st.error("⚠️ No valid text extracted for embedding. Skipping upload.")
-        return
+    fitted = np.zeros((len(vectors), dim), dtype=np.float32)
+    width = min(dim, vectors.shape[1])
+    fitted[:, :width] = vectors[:, :width]
+    norms = np.linalg.norm(fitted, axis=1, keepdims=True)
+    np.divide(fitted, norms, out=fitted, where=norms > 0)
+    return fitted
 
-    metadata = clean_metadata(metadata)  # Ensure metadata is JSON serializable
-    
-    progress_placeholder = st.empty()  # Placeholder for the progress bar
-    progress_bar = progress_placeholder.progress(0)  # Initialize single progress bar
-    
-    total_chunks = len(text_chunks)
-    
-    for i, chunk in enumerate(text_chunks):
-        if not chunk.strip():  # Skip empty chunks
-            continue
 
-        try:
-            vector = generate_embedding(chunk, model, cohere_key, openai_key)
+# ✅ Function to pick the chunks still to embed: with a job `checkpoint`, chunks get deterministic ids and
+# chunks stored by an earlier run are skipped; a `deduplicator` (scripts.dedup) then drops exact and
+# near-duplicate chunks, so a re-run never references the same copy twice
+def select_chunks(chunks, model, checkpoint=None, deduplicator=None):
+    if checkpoint is not None:
+        chunks = checkpoint.prepare(chunks)
+    if deduplicator is not None:
+        kept = deduplicator.filter(chunks, EMBEDDING_PROVIDERS["Cohere" if model == "Cohere" else "OpenAI"]["max_items"])
+        if checkpoint is not None and len(kept) < len(chunks):
+            kept_ids = {metadata["chunk_id"] for _, metadata in kept}
+            checkpoint.dropped([metadata["chunk_id"] for _, metadata in chunks if metadata["chunk_id"] not in kept_ids])
+        chunks = kept
+    return chunks
+
+# ✅ Function to embed (content, metadata) chunks and buffer them as rows in the writer
+# Chunks go through `select_chunks` first (call the deduplicator's `write_references` once the writer flushed)
+def store_chunks(writer, chunks, expected_dim, model, cohere_key, openai_key, max_inflight=4, on_complete=None, checkpoint=None, deduplicator=None, cache=None):
+    chunks = select_chunks(chunks, model, checkpoint, deduplicator)
+    return _embed_to_writer(writer, chunks, expected_dim, model, cohere_key, openai_key, max_inflight, on_complete, checkpoint, cache)
 
-            # Ensure vector matches expected dimension
-            if len(vector) > expected_dim:
-                vector = vector[:expected_dim]
-            elif len(vector) < expected_dim:
-                vector = np.pad(vector, (0, expected_dim - len(vector)), 'constant').tolist()
+def _embed_to_writer(writer, chunks, expected_dim, model, cohere_key, openai_key, max_inflight, on_complete, checkpoint, cache=None):
+    if not chunks:
+        return 0
+    if checkpoint is not None:
+        checkpoint.attach(writer)
+    texts = [content for content, _ in chunks]
 
-            # Upload to Supabase
-            supabase.table(table_name).insert({
-                "content": chunk,
+    # Embed chunks in provider-sized batches, several requests in flight, consumed in input order
+    for indices, vectors in embed_batches(texts, model, cohere_key, openai_key, max_inflight=max_inflight, on_complete=on_complete, cache=cache):
+        # Ensure vectors match the expected dimension (rows stay float32 views of the batch)
+        vectors = fit_dimensions(vectors, expected_dim)
+        if checkpoint is not None:
+            checkpoint.embedded([chunks[i][1]["chunk_id"] for i in indices])
+        for i, vector in zip(indices, vectors):
+            # Buffer the row for a multi-row insert; the store serializes the embedding
+            writer.add({
+                "content": texts[i],
                 "embedding": vector,
-                "metadata": metadata  # Ensure cleaned metadata is used
-            }).execute()
-        except ValueError as e:
-            st.error(f"⚠️ Skipping invalid text chunk: {e}")
-            continue
-        
-        progress_bar.progress((i + 1) / total_chunks)  # Update single progress bar
-
-    # ✅ Display fading success message
-    success_message = st.empty()
-    success_message.success(f"✅ Uploaded {total_chunks} chunks successfully!")
-    time.sleep(3)  # Wait 3 seconds
-    success_message.empty()  # Clear success message
-    progress_placeholder.empty()  # Remove progress bar after upload
+                "metadata": chunks[i][1]  # Ensure cleaned metadata is used
+            })
+        metrics.inc("chunks_total", len(indices))
+    return len(chunks)
+
+
+# ✅ Function to close a writer this module created and log rows that failed
+def finish_writer(writer):
+    writer.close()
+    if writer.rows_failed:
+        logger.warning("⚠️ %d rows failed to upload: %s", writer.rows_failed, writer.errors[-1])
+
+
+# ✅ Function to upload (content, metadata) chunks that were already extracted; returns the number of chunks
+def upload_chunks(supabase, table_name, chunks, expected_dim, model, cohere_key, openai_key, writer=None, max_inflight=4, on_progress=None, checkpoint=None, deduplicator=None):
+    chunks = select_chunks(chunks, model, checkpoint, deduplicator)
+
+    if not chunks:
+        logger.warning("⚠️ No valid text extracted for embedding. Skipping upload.")
+        return 0
+
+    total_chunks = len(chunks)
+    embedded_chunks = 0
+
+    # Report progress whenever an embedding request completes
+    def on_complete(result):
+        nonlocal embedded_chunks
+        embedded_chunks += len(result[0])
+        if on_progress:
+            on_progress(embedded_chunks, total_chunks, f"Embedded {embedded_chunks}/{total_chunks} chunks")
+
+    # Use the caller's writer so rows of several calls share batches
+    owns_writer = writer is None
+    if owns_writer:
+        writer = SupabaseBatchWriter(supabase, table_name, max_inflight=2)
+
+    _embed_to_writer(writer, chunks, expected_dim, model, cohere_key, openai_key, max_inflight, on_complete, checkpoint)
+
+    if owns_writer:
+        finish_writer(writer)
+    return total_chunks
+
+
+# ✅ Function to stream any supported file into Supabase with bounded memory; returns the number of chunks
+# Extraction and chunking run in a background thread ahead of embedding. The chunks waiting between
+# the two count against `memory_budget` bytes, and extraction pauses when it is full (backpressure).
+# Embedding requests and inserts in flight are bounded by `max_inflight` and the writer.
+def upload_file_chunks(supabase, table_name, source, file_type, metadata, expected_dim, model, cohere_key, openai_key, chunk_size=300, writer=None, max_inflight=4, overlap=0, table_batch_rows=1000, on_progress=None, checkpoint=None, deduplicator=None, memory_budget=DEFAULT_MEMORY_BUDGET, cache=None):
+    owns_writer = writer is None
+    if owns_writer:
+        writer = SupabaseBatchWriter(supabase, table_name, max_inflight=2)
+
+    total_chunks = 0
+    pdf = {}  # Page count, reported by the extraction's single open of the PDF
+    chunks = iter_file_chunks(source, file_type, metadata, chunk_size, overlap, table_batch_rows, on_page_count=lambda pages: pdf.update(pages=pages))
+    buffer = ChunkBuffer(chunks, MemoryBudget(memory_budget))
+    try:
+        for batch in buffer.batches():
+            store_chunks(writer, batch, expected_dim, model, cohere_key, openai_key, max_inflight, checkpoint=checkpoint, deduplicator=deduplicator, cache=cache)
+            total_chunks += len(batch)
+            total_pages = pdf.get("pages")
+            if on_progress and total_pages:
+                page = int(batch[-1][1].get("page", 0))
+                on_progress(page, total_pages, f"Uploaded {total_chunks} chunks, page {page}/{total_pages}")
+            elif on_progress:
+                on_progress(total_chunks, None, f"Uploaded {total_chunks} chunks...")
+    finally:
+        buffer.close()
+        if owns_writer:
+            finish_writer(writer)
+
+    if not total_chunks:
+        logger.warning("⚠️ No valid text extracted for embedding. Skipping upload.")
+    return total_chunks
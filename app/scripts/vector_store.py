@@ -0,0 +1,478 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from scripts.metrics import metrics
+from scripts.pipeline import call_with_backoff, is_retryable
+
+# Backends selectable in the UI and CLI
+VECTOR_STORE_BACKENDS = ["Supabase", "Local"]
+
+# SQLite limits the number of bound parameters per statement
+SQLITE_MAX_VARIABLES = 900
+
+# Significant digits kept when embeddings are sent as pgvector text literals
+PGVECTOR_PRECISION = 6
+
+# Metadata keys are inlined into SQL (so expression indexes apply); only plain names are allowed
+METADATA_KEY_PATTERN = re.compile(r"^\w+$")
+
+
+# ✅ Function to format float32 vectors as pgvector text literals ("[0.0123,-0.456,...]")
+# Fixed precision is about half the bytes of JSON float lists and formats in C via `%`
+def to_pgvector_literals(vectors, precision=PGVECTOR_PRECISION):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if not len(vectors):
+        return []
+    row_format = "[" + ",".join([f"%.{precision}g"] * vectors.shape[1]) + "]"
+    return [row_format % tuple(row) for row in vectors.tolist()]
+
+
+# ✅ Interface every vector store backend implements
+# Rows are dicts with "content", "embedding" and "metadata" keys
+class VectorStore:
+    name = "vector store"
+    key = None  # Stable identifier of the target (backend and table/directory)
+
+    # Bulk add rows; returns the number of rows added
+    def add(self, rows):
+        raise NotImplementedError
+
+    # Delete rows whose metadata matches every key/value in `metadata` (a list value matches any of its items);
+    # returns rows deleted if known
+    def delete_by_metadata(self, metadata):
+        raise NotImplementedError
+
+    # Replace the metadata of rows matching `metadata` with `update(row_metadata)`; returns rows updated
+    def update_metadata(self, metadata, update):
+        raise NotImplementedError
+
+    # Count rows, optionally only those whose metadata matches `metadata`
+    def count(self, metadata=None):
+        raise NotImplementedError
+
+    # Keyset page for batched deletes: ascending ids of matching rows above `after_id`, at most `limit`
+    def id_page(self, metadata=None, after_id=None, limit=1000):
+        raise NotImplementedError
+
+    # Delete matching rows with first_id <= id <= last_id; returns rows deleted
+    def delete_id_range(self, first_id, last_id, metadata=None):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# ✅ Supabase (PostgREST) backend
+class SupabaseVectorStore(VectorStore):
+    name = "Supabase"
+
+    def __init__(self, supabase, table_name):
+        self.supabase = supabase
+        self.table_name = table_name
+        self.key = f"supabase:{table_name}"  # Identifies the target in the ingest journal
+
+    def add(self, rows):
+        literals = to_pgvector_literals([row["embedding"] for row in rows])
+        payload = [{**row, "embedding": literal} for row, literal in zip(rows, literals)]
+        self.supabase.table(self.table_name).insert(payload).execute()
+        return len(rows)
+
+    @staticmethod
+    def _filter(query, metadata):
+        for key, value in (metadata or {}).items():
+            if isinstance(value, (list, tuple)):
+                query = query.in_(f"metadata->>{key}", [str(item) for item in value])
+            else:
+                query = query.eq(f"metadata->>{key}", str(value))
+        return query
+
+    # Deleted rows are counted by PostgREST instead of being sent back
+    def _delete(self):
+        return self.supabase.table(self.table_name).delete(count="exact", returning="minimal")
+
+    def delete_by_metadata(self, metadata):
+        if not metadata:
+            raise ValueError("Refusing to delete without a metadata filter.")
+        return self._filter(self._delete(), metadata).execute().count or 0
+
+    # PostgREST cannot merge JSON in place: read the matching rows, then write each one back
+    def update_metadata(self, metadata, update):
+        if not metadata:
+            raise ValueError("Refusing to update without a metadata filter.")
+        rows = self._filter(self.supabase.table(self.table_name).select("id, metadata"), metadata).execute().data or []
+        for row in rows:
+            self.supabase.table(self.table_name).update({"metadata": update(row["metadata"])}).eq("id", row["id"]).execute()
+        return len(rows)
+
+    def count(self, metadata=None):
+        query = self.supabase.table(self.table_name).select("id", count="exact", head=True)
+        return self._filter(query, metadata).execute().count or 0
+
+    def id_page(self, metadata=None, after_id=None, limit=1000):
+        query = self._filter(self.supabase.table(self.table_name).select("id"), metadata)
+        if after_id is not None:
+            query = query.gt("id", after_id)
+        return [row["id"] for row in query.order("id").limit(limit).execute().data or []]
+
+    def delete_id_range(self, first_id, last_id, metadata=None):
+        query = self._delete().gte("id", first_id).lte("id", last_id)
+        return self._filter(query, metadata).execute().count or 0
+
+
+# ✅ Local backend: float32 vectors in an append-only memory-mapped file, contents and metadata in SQLite
+class LocalVectorStore(VectorStore):
+    name = "Local"
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.key = f"local:{os.path.abspath(directory)}"
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.db_path = os.path.join(directory, "store.sqlite")
+        self.lock = threading.Lock()
+        self.conn = None
+        self.dim = None
+        self._vectors = None  # Lazily opened memory map
+        self._vectors_rows = 0
+
+    # Open SQLite and reconcile the vector file on first use
+    def _connect(self):
+        if self.conn is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "id INTEGER PRIMARY KEY, content TEXT NOT NULL, metadata TEXT NOT NULL, deleted INTEGER NOT NULL DEFAULT 0)"
+        )
+        # Filename is the usual prefilter and delete key
+        self.conn.execute("CREATE INDEX IF NOT EXISTS chunks_filename ON chunks (json_extract(metadata, '$.filename'))")
+        self.conn.commit()
+        row = self.conn.execute("SELECT value FROM settings WHERE key = 'dim'").fetchone()
+        self.dim = int(row[0]) if row else None
+
+        # Vectors are appended before their rows commit; drop any tail left by a crash in between
+        if self.dim and os.path.exists(self.vectors_path):
+            rows = self.conn.execute("SELECT COALESCE(MAX(id) + 1, 0) FROM chunks").fetchone()[0]
+            if os.path.getsize(self.vectors_path) > rows * self.dim * 4:
+                with open(self.vectors_path, "r+b") as f:
+                    f.truncate(rows * self.dim * 4)
+                self._bump_setting("generation")
+                self.conn.commit()
+
+    def size(self):
+        with self.lock:
+            self._connect()
+            if not self.dim or not os.path.exists(self.vectors_path):
+                return 0
+            return os.path.getsize(self.vectors_path) // (self.dim * 4)
+
+    # Memory-mapped (rows, dim) float32 view of every stored vector, deleted rows included
+    def vectors(self):
+        rows = self.size()
+        if rows == 0:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        if self._vectors is None or self._vectors_rows != rows:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+            self._vectors_rows = rows
+        return self._vectors
+
+    def add(self, rows):
+        if not rows:
+            return 0
+        matrix = np.stack([np.asarray(row["embedding"], dtype=np.float32) for row in rows])
+        with self.lock:
+            self._connect()
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+                self.conn.execute("INSERT INTO settings (key, value) VALUES ('dim', ?)", (str(self.dim),))
+            if matrix.shape[1] != self.dim:
+                raise ValueError(f"Vector dimension {matrix.shape[1]} does not match the store's {self.dim}.")
+
+            # Append only: existing vectors are never rewritten
+            start = os.path.getsize(self.vectors_path) // (self.dim * 4) if os.path.exists(self.vectors_path) else 0
+            try:
+                with open(self.vectors_path, "ab") as f:
+                    f.write(matrix.tobytes())
+                self.conn.executemany(
+                    "INSERT INTO chunks (id, content, metadata) VALUES (?, ?, ?)",
+                    [(start + i, row["content"], json.dumps(row.get("metadata") or {})) for i, row in enumerate(rows)],
+                )
+                self.conn.commit()
+            except BaseException:
+                # Drop any vectors written, or the next batch's ids would be offset from its vectors
+                self.conn.rollback()
+                with open(self.vectors_path, "r+b") as f:
+                    f.truncate(start * self.dim * 4)
+                self._vectors = None
+                self._bump_setting("generation")
+                self.conn.commit()
+                raise
+        return len(rows)
+
+    @staticmethod
+    def _where(metadata):
+        clauses, params = ["deleted = 0"], []
+        for key, value in (metadata or {}).items():
+            if not METADATA_KEY_PATTERN.match(key):
+                raise ValueError(f"Invalid metadata key: {key!r}")
+            values = [str(item) for item in value] if isinstance(value, (list, tuple)) else [str(value)]
+            clauses.append(f"json_extract(metadata, '$.{key}') IN ({','.join('?' * len(values))})")
+            params.extend(values)
+        return " AND ".join(clauses), params
+
+    # Deletes are tombstones so the vector file stays append-only
+    def delete_by_metadata(self, metadata):
+        if not metadata:
+            raise ValueError("Refusing to delete without a metadata filter.")
+        return self._tombstone(*self._where(metadata))
+
+    def delete_id_range(self, first_id, last_id, metadata=None):
+        where, params = self._where(metadata)
+        return self._tombstone(f"{where} AND id BETWEEN ? AND ?", params + [int(first_id), int(last_id)])
+
+    def update_metadata(self, metadata, update):
+        if not metadata:
+            raise ValueError("Refusing to update without a metadata filter.")
+        where, params = self._where(metadata)
+        with self.lock:
+            self._connect()
+            rows = self.conn.execute(f"SELECT id, metadata FROM chunks WHERE {where}", params).fetchall()
+            self.conn.executemany(
+                "UPDATE chunks SET metadata = ? WHERE id = ?",
+                [(json.dumps(update(json.loads(row_metadata))), row_id) for row_id, row_metadata in rows],
+            )
+            self.conn.commit()
+        return len(rows)
+
+    def _tombstone(self, where, params):
+        with self.lock:
+            self._connect()
+            deleted = self.conn.execute(f"UPDATE chunks SET deleted = 1 WHERE {where}", params).rowcount
+            if deleted:
+                # Bumped on every delete so search indexes know to reload their tombstones
+                self._bump_setting("deletions")
+            self.conn.commit()
+        return deleted
+
+    # Increment a counter in the settings table (the caller commits)
+    def _bump_setting(self, key):
+        self.conn.execute(
+            "INSERT INTO settings (key, value) VALUES (?, '1') "
+            "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1",
+            (key,),
+        )
+
+    def _setting_count(self, key):
+        with self.lock:
+            self._connect()
+            row = self.conn.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return int(row[0]) if row else 0
+
+    # Number of delete operations so far (changes whenever rows are tombstoned)
+    def deletions(self):
+        return self._setting_count("deletions")
+
+    # Number of times vectors were rolled back off the end of the file; the ids past the cut
+    # are reused by the next insert, so anything cached about them is stale
+    def generation(self):
+        return self._setting_count("generation")
+
+    # Sorted int64 array of tombstoned row ids
+    def deleted_ids(self):
+        with self.lock:
+            self._connect()
+            rows = self.conn.execute("SELECT id FROM chunks WHERE deleted = 1 ORDER BY id").fetchall()
+        return np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+
+    # Sorted int64 array of live row ids whose metadata matches `metadata`
+    def ids(self, metadata=None):
+        where, params = self._where(metadata)
+        with self.lock:
+            self._connect()
+            rows = self.conn.execute(f"SELECT id FROM chunks WHERE {where} ORDER BY id", params).fetchall()
+        return np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+
+    def id_page(self, metadata=None, after_id=None, limit=1000):
+        where, params = self._where(metadata)
+        if after_id is not None:
+            where += " AND id > ?"
+            params.append(int(after_id))
+        with self.lock:
+            self._connect()
+            rows = self.conn.execute(f"SELECT id FROM chunks WHERE {where} ORDER BY id LIMIT ?", params + [limit]).fetchall()
+        return [row[0] for row in rows]
+
+    # Distinct values of a metadata key over live rows, e.g. every stored filename
+    def distinct(self, key):
+        if not METADATA_KEY_PATTERN.match(key):
+            raise ValueError(f"Invalid metadata key: {key!r}")
+        with self.lock:
+            self._connect()
+            rows = self.conn.execute(
+                f"SELECT DISTINCT json_extract(metadata, '$.{key}') AS value FROM chunks "
+                "WHERE deleted = 0 AND value IS NOT NULL ORDER BY value"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def count(self, metadata=None):
+        where, params = self._where(metadata)
+        with self.lock:
+            self._connect()
+            return self.conn.execute(f"SELECT COUNT(*) FROM chunks WHERE {where}", params).fetchone()[0]
+
+    # Fetch (id, content, metadata) rows by id
+    def get(self, ids):
+        ids = [int(i) for i in ids]
+        found = {}
+        with self.lock:
+            self._connect()
+            for start in range(0, len(ids), SQLITE_MAX_VARIABLES):
+                part = ids[start:start + SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(part))
+                for row_id, content, metadata in self.conn.execute(
+                    f"SELECT id, content, metadata FROM chunks WHERE deleted = 0 AND id IN ({placeholders})", part
+                ):
+                    found[row_id] = {"id": row_id, "content": content, "metadata": json.loads(metadata)}
+        return [found[i] for i in ids if i in found]
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+            self._vectors = None
+
+
+# ✅ Default location of the local store, next to the app's data directory
+DEFAULT_LOCAL_STORE_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "vector_store")
+
+# ✅ Shared local stores, one per directory, so the memory map is reused across Streamlit reruns
+_local_stores = {}
+_local_stores_lock = threading.Lock()
+
+def get_local_store(directory=DEFAULT_LOCAL_STORE_PATH):
+    directory = os.path.abspath(directory)
+    with _local_stores_lock:
+        store = _local_stores.get(directory)
+        if store is None:
+            store = LocalVectorStore(directory)
+            _local_stores[directory] = store
+    return store
+
+
+# ✅ Function to wrap a Supabase client as a vector store (stores pass through unchanged)
+def as_vector_store(target, table_name=None):
+    if isinstance(target, VectorStore):
+        return target
+    return SupabaseVectorStore(target, table_name)
+
+# ✅ Function to build the configured backend
+def create_vector_store(backend, supabase=None, table_name=None, local_path=None):
+    if backend == "Local":
+        return get_local_store(local_path or DEFAULT_LOCAL_STORE_PATH)
+    return SupabaseVectorStore(supabase, table_name)
+
+
+# ✅ Buffered writer that adds rows to a vector store as multi-row batches
+class BatchWriter:
+    def __init__(self, store, max_rows=500, max_bytes=4_000_000, max_inflight=1):
+        self.store = store
+        self.max_rows = max_rows  # Flush once this many rows are buffered
+        self.max_bytes = max_bytes  # ...or once the buffered payload reaches this size
+        self.max_inflight = max_inflight  # Inserts allowed to run concurrently
+        self.rows = []
+        self.buffered_bytes = 0
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.errors = []
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pending = deque()
+        self.on_sending = None  # Called with each batch before it is inserted
+        self.on_written = None  # ...and with every part of it that was stored
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # Approximate request size of a row without serializing the embedding (~12 bytes per pgvector component)
+    @staticmethod
+    def row_size(row):
+        embedding = row.get("embedding")
+        embedding_size = 0 if embedding is None else len(embedding)
+        return len(row.get("content", "")) + len(json.dumps(row.get("metadata", {}))) + 12 * embedding_size + 64
+
+    def add(self, row):
+        self.rows.append(row)
+        self.buffered_bytes += self.row_size(row)
+        if len(self.rows) >= self.max_rows or self.buffered_bytes >= self.max_bytes:
+            self.flush(wait=False)
+
+    def add_many(self, rows):
+        for row in rows:
+            self.add(row)
+
+    # Send buffered rows; with wait=False the insert may run in the background
+    def flush(self, wait=True):
+        if self.rows:
+            metrics.inc("bytes_sent_total", self.buffered_bytes)
+            rows, self.rows, self.buffered_bytes = self.rows, [], 0
+            if self.on_sending:
+                self.on_sending(rows)
+            if self.max_inflight > 1:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(max_workers=self.max_inflight)
+                # Bound the number of inserts in flight
+                while len(self.pending) >= self.max_inflight:
+                    self.pending.popleft().result()
+                self.pending.append(self.executor.submit(self._insert, rows))
+            else:
+                self._insert(rows)
+        if wait:
+            while self.pending:
+                self.pending.popleft().result()
+        return self.rows_written
+
+    def close(self):
+        self.flush()
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    # Insert a batch, retrying it whole with backoff on throttling, 5xx and timeouts
+    # Other errors (bad rows, payload too large) split it in halves to isolate the rows at fault
+    def _insert(self, rows):
+        try:
+            with metrics.stage("store_insert"):
+                call_with_backoff(lambda: self.store.add(rows))
+        except Exception as e:
+            if len(rows) == 1 or is_retryable(e):
+                with self.lock:
+                    self.rows_failed += len(rows)
+                    self.errors.append(str(e))
+                metrics.inc("rows_failed_total", len(rows))
+                return 0
+            metrics.inc("retries_total", reason="insert_split")
+            middle = len(rows) // 2
+            return self._insert(rows[:middle]) + self._insert(rows[middle:])
+        with self.lock:
+            self.rows_written += len(rows)
+        metrics.inc("rows_written_total", len(rows))
+        if self.on_written:
+            self.on_written(rows)
+        return len(rows)
+
+
+# ✅ Buffered writer that inserts rows into Supabase as multi-row batches
+class SupabaseBatchWriter(BatchWriter):
+    def __init__(self, supabase, table_name, max_rows=500, max_bytes=4_000_000, max_inflight=1):
+        super().__init__(as_vector_store(supabase, table_name), max_rows, max_bytes, max_inflight)
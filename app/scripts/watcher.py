@@ -0,0 +1,280 @@
+import os
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from scripts.ingest import SUPPORTED_EXTENSIONS, make_job, ingest_files
+
+logger = logging.getLogger(__name__)
+
+# A file must stay unchanged this long before it is ingested (skips partially written files)
+DEFAULT_DEBOUNCE_SECONDS = 2.0
+# Full rescans of the folder when inotify (watchdog) is unavailable
+DEFAULT_POLL_SECONDS = 5.0
+RECENT_RESULTS = 50
+
+
+def is_supported(path):
+    return os.path.basename(path).split(".")[-1].lower() in SUPPORTED_EXTENSIONS
+
+
+# ✅ Background watcher: file system events (or polling) → debounce → queue → ingest worker threads
+# Runs outside the Streamlit rerun cycle; the manifest makes it durable, since anything not marked
+# synced is found again by the initial scan after a restart
+class FolderWatcher:
+    def __init__(self, base_dir, manifest, store, table_name, expected_dim, model, cohere_key, openai_key,
+                 chunk_size=300, overlap=0, table_batch_rows=1000, workers=2,
+                 debounce_seconds=DEFAULT_DEBOUNCE_SECONDS, poll_seconds=DEFAULT_POLL_SECONDS, **store_options):
+        self.base_dir = os.path.abspath(base_dir)
+        self.manifest = manifest
+        self.store = store
+        self.table_name = table_name
+        self.expected_dim = expected_dim
+        self.model = model
+        self.cohere_key = cohere_key
+        self.openai_key = openai_key
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.table_batch_rows = table_batch_rows
+        self.workers = max(1, workers)
+        self.debounce_seconds = debounce_seconds
+        self.poll_seconds = poll_seconds
+        self.store_options = store_options
+
+        self.mode = None  # "inotify" (watchdog) or "polling"
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.pending = {}  # path -> (last event time, (size, mtime_ns) at that time)
+        self.queued = set()
+        self.in_flight = {}  # path -> start time
+        self.recent = deque(maxlen=RECENT_RESULTS)
+        self.failed = {}  # path -> fingerprint of the version that failed, so polling does not retry it forever
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.observer = None
+
+    @property
+    def running(self):
+        return bool(self.threads) and not self.stop_event.is_set()
+
+    def start(self):
+        if self.running:
+            return self
+        self.stop_event.clear()
+        self._start_observer()
+
+        # Files added or changed while nothing was watching; debounced like live events, so a file
+        # still being written at startup is not ingested half-written
+        self._scan(time.monotonic())
+
+        self.threads = [threading.Thread(target=self._debounce_loop, name="watcher-debounce", daemon=True)]
+        self.threads += [threading.Thread(target=self._worker_loop, name=f"watcher-worker-{i}", daemon=True) for i in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        self.stop_event.set()
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join(timeout)
+            self.observer = None
+        for _ in range(self.workers):
+            self.queue.put(None)  # Wake idle workers
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    # inotify/FSEvents/ReadDirectoryChanges through watchdog; polling if it is missing or fails to start
+    def _start_observer(self):
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+
+            watcher = self
+
+            class Handler(FileSystemEventHandler):
+                def on_any_event(self, event):
+                    if event.is_directory:
+                        return
+                    for path in (getattr(event, "dest_path", None), event.src_path):
+                        if path:
+                            watcher.touch(path)
+
+            observer = Observer()
+            observer.schedule(Handler(), self.base_dir, recursive=False)
+            observer.start()
+            self.observer, self.mode = observer, "inotify"
+        except Exception as e:
+            logger.info("File system events unavailable (%s); polling %s every %.0fs", e, self.base_dir, self.poll_seconds)
+            self.observer, self.mode = None, "polling"
+
+    # Note activity on a file; it is ingested once it has been quiet for `debounce_seconds`
+    def touch(self, path):
+        path = os.path.abspath(path)
+        if os.path.dirname(path) != self.base_dir or not is_supported(path):
+            return
+        with self.lock:
+            self.pending[path] = (time.monotonic(), self._fingerprint(path))
+
+    @staticmethod
+    def _fingerprint(path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def _debounce_loop(self):
+        last_poll = time.monotonic()
+        while not self.stop_event.wait(min(0.5, self.debounce_seconds)):
+            now = time.monotonic()
+            if self.mode == "polling" and now - last_poll >= self.poll_seconds:
+                last_poll = now
+                self._scan(now)
+
+            with self.lock:
+                due = [path for path, (seen, _) in self.pending.items() if now - seen >= self.debounce_seconds]
+            for path in due:
+                self._settle(path, now)
+
+    # Mark files whose size or mtime differ from the manifest as pending (versions that failed are skipped)
+    def _scan(self, now):
+        for entry in os.scandir(self.base_dir):
+            if entry.is_file() and is_supported(entry.path):
+                path = os.path.abspath(entry.path)
+                previous = self.manifest.get(path)
+                fingerprint = self._fingerprint(path)
+                with self.lock:
+                    if self.failed.get(path) == fingerprint:
+                        continue
+                    if not previous or (previous["size"], previous["mtime_ns"]) != fingerprint:
+                        self.pending.setdefault(path, (now, fingerprint))
+
+    # Queue a quiet file if it really differs from the manifest
+    def _settle(self, path, now):
+        fingerprint = self._fingerprint(path)
+        with self.lock:
+            seen, previous = self.pending.get(path, (now, None))
+            if fingerprint is None:
+                self.pending.pop(path, None)  # Deleted or moved away
+                return
+            if fingerprint != previous:
+                self.pending[path] = (now, fingerprint)  # Still being written
+                return
+            if path in self.queued or path in self.in_flight:
+                return  # Re-checked after the current run finishes
+            del self.pending[path]
+
+        try:
+            change = self.manifest.check(path)
+        except OSError as e:
+            logger.warning("⚠️ Could not read %s: %s", path, e)
+            return
+        if change:
+            self._enqueue(change)
+
+    def _enqueue(self, change):
+        with self.lock:
+            if change["path"] in self.queued:
+                return
+            self.queued.add(change["path"])
+        self.queue.put(change)
+
+    def _worker_loop(self):
+        while not self.stop_event.is_set():
+            change = self.queue.get()
+            if change is None or self.stop_event.is_set():
+                return
+            path = change["path"]
+            with self.lock:
+                self.queued.discard(path)
+                self.in_flight[path] = time.time()
+            try:
+                with ingest_lock(path) as waited:
+                    # A stopped watcher may still have been ingesting this file: skip it if that run synced it
+                    if waited:
+                        change = self.manifest.check(path)
+                    result = self._ingest(change) if change else None
+            except Exception as e:
+                result = {"file": change["name"], "path": path, "status": "failed", "chunks": 0, "rows_written": 0,
+                          "extract_seconds": 0.0, "upload_seconds": 0.0, "error": str(e)}
+            if result is None:
+                with self.lock:
+                    self.in_flight.pop(path, None)
+                continue
+            result["finished_at"] = time.time()
+            with self.lock:
+                self.in_flight.pop(path, None)
+                self.recent.appendleft(result)
+                if result["status"] == "uploaded":
+                    self.failed.pop(path, None)
+                else:
+                    self.failed[path] = (change["size"], change["mtime_ns"])
+
+    def _ingest(self, change):
+        job = make_job(change["path"], self.chunk_size, self.overlap, self.table_batch_rows,
+                       metadata={"content_hash": change["content_hash"]}, replace=change["status"] == "changed")
+        for _, result in ingest_files([job], self.store, self.table_name, self.expected_dim, self.model,
+                                      self.cohere_key, self.openai_key, workers=1, **self.store_options):
+            if result["status"] == "uploaded":
+                self.manifest.mark_synced(change)
+            return result
+
+    # Snapshot for the UI: queue depth, files in flight and recent completions
+    def status(self):
+        with self.lock:
+            return {
+                "running": self.running,
+                "mode": self.mode,
+                "base_dir": self.base_dir,
+                "waiting": len(self.pending),
+                "queued": len(self.queued),
+                "in_flight": [{"file": os.path.basename(path), "seconds": time.time() - started}
+                              for path, started in self.in_flight.items()],
+                "recent": list(self.recent),
+            }
+
+
+# ✅ Per-file ingest locks shared by every watcher of the process: restarting the watcher (new settings)
+# stops the old one without waiting for a long ingest, so the new one must not ingest the same file alongside it
+_ingest_locks = {}
+_ingest_locks_lock = threading.Lock()
+
+@contextmanager
+def ingest_lock(path):
+    with _ingest_locks_lock:
+        lock = _ingest_locks.setdefault(path, threading.Lock())
+    waited = not lock.acquire(blocking=False)
+    if waited:
+        lock.acquire()
+    try:
+        yield waited
+    finally:
+        lock.release()
+
+
+# ✅ One watcher per process, shared by every Streamlit session
+_watcher = None
+_watcher_lock = threading.Lock()
+
+def get_watcher():
+    return _watcher
+
+# ✅ Function to (re)start the shared watcher with new settings
+def start_watcher(*args, **kwargs):
+    global _watcher
+    with _watcher_lock:
+        if _watcher is not None:
+            _watcher.stop()
+        _watcher = FolderWatcher(*args, **kwargs).start()
+    return _watcher
+
+def stop_watcher():
+    global _watcher
+    with _watcher_lock:
+        if _watcher is not None:
+            _watcher.stop()
+            _watcher = None
@@ -0,0 +1,64 @@
+import streamlit as st
+
+# ✅ Streamlit progress bar + status text that pipeline `on_progress(done, total, message)` callbacks can drive
+class ProgressDisplay:
+    def __init__(self):
+        self.text = st.empty()
+        self.placeholder = st.empty()
+        self.bar = self.placeholder.progress(0)
+
+    def __call__(self, done, total, message=None):
+        if total:
+            self.bar.progress(min(done / total, 1.0))
+        if message:
+            self.text.text(message)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.clear()
+
+    def clear(self):
+        self.text.empty()
+        self.placeholder.empty()
+
+
+# ✅ Show the outcome of a buffered writer
+def show_writer_result(writer, label="rows"):
+    if writer.rows_failed:
+        st.error(f"⚠️ {writer.rows_failed} {label} failed to upload: {writer.errors[-1]}")
+    st.success(f"✅ {writer.rows_written} {label} written to Supabase.")
+
+
+# ✅ Tell the user when a resumed job skipped work an earlier attempt already stored
+def show_checkpoint_result(checkpoint):
+    if checkpoint.skipped:
+        st.info(f"↩️ Resumed: {checkpoint.skipped} chunks were already stored by an earlier attempt and were skipped.")
+
+
+# ✅ Report what chunk deduplication saved
+def show_dedup_result(deduplicator):
+    if deduplicator is not None and deduplicator.dropped:
+        report = deduplicator.report()
+        st.info(f"♻️ {report['rows_saved']} duplicate chunks dropped before embedding ({report['exact_dropped']} exact, "
+                f"{report['near_dropped']} near): {report['tokens_saved']} tokens, ~{report['requests_saved']} embedding requests "
+                f"and {report['rows_saved']} rows saved.")
+
+
+# ✅ Show what uploading an extraction will cost, and its first chunks, before anything is embedded
+def show_upload_estimate(extraction, model):
+    estimate = extraction.estimate(model)
+    columns = st.columns(4)
+    columns[0].metric("Chunks", f"{estimate['chunks']:,}")
+    columns[1].metric("Tokens", f"{estimate['tokens']:,}")
+    columns[2].metric("Embedding requests", f"{estimate['requests']:,}")
+    columns[3].metric("Estimated cost", f"${estimate['cost']:.4f}")
+    st.caption(f"{model} list price, before embedding cache hits and deduplication.")
+    if extraction.preview:
+        with st.expander(f"Chunk preview (first {len(extraction.preview)} of {estimate['chunks']})"):
+            for content, metadata in extraction.preview:
+                st.caption(", ".join(f"{key}: {value}" for key, value in metadata.items() if key in ("page", "table", "row")) or metadata.get("filename", ""))
+                st.text(content[:1000])
+    if not extraction.complete:
+        st.caption("ℹ️ This file's chunks are too large to keep in memory; uploading reads it again.")
@@ -1,25 +1,77 @@
 import streamlit as st
 from scripts.utils import load_custom_settings, create_supabase_client
+from scripts.vector_store import create_vector_store, DEFAULT_LOCAL_STORE_PATH, VECTOR_STORE_BACKENDS
+from scripts.journal import get_journal
+from scripts.deletion import DELETE_SCOPES, DELETE_BATCH_ROWS, delete_scope, describe_scope, count_rows, pending_deletion, delete_rows
+from st_pages.components import ProgressDisplay
 
 def show():
     # Load custom settings if button is pressed
-    custom_settings = load_custom_settings() if st.sidebar.checkbox("Custom Settings") else {}
+    custom_settings = load_custom_settings(on_error=st.error) if st.sidebar.checkbox("Custom Settings") else {}
 
     # User input for API credential
     SUPABASE_URL = st.sidebar.text_input("Supabase URL", custom_settings.get("SUPABASE_URL", "https://your-supabase-url.supabase.co"))
     SUPABASE_KEY = st.sidebar.text_input("Supabase Key", custom_settings.get("SUPABASE_KEY", "your-service-role-key"), type="password")
     TABLE_NAME = st.sidebar.text_input("Table Name", custom_settings.get("TABLE_NAME", "your_vector_table"))
-  
+    VECTOR_STORE = st.sidebar.radio("Vector Store", VECTOR_STORE_BACKENDS, index=VECTOR_STORE_BACKENDS.index(custom_settings.get("VECTOR_STORE", "Supabase")))
+    LOCAL_STORE_PATH = st.sidebar.text_input("Local Store Path", custom_settings.get("LOCAL_STORE_PATH", DEFAULT_LOCAL_STORE_PATH)) if VECTOR_STORE == "Local" else None
+    DELETE_BATCH = int(custom_settings.get("DELETE_BATCH_ROWS", DELETE_BATCH_ROWS))
+
     st.title("Database Management")
-    st.write("This will permanently delete all rows from the vector store in Supabase.")
-    
-    if st.button("Delete Vectors"):
-        if SUPABASE_KEY == "your-service-role-key" or not TABLE_NAME:
-            st.error("⚠️ Please provide valid Supabase credentials and table name!")
-        else:
-            try:
-                supabase = create_supabase_client(SUPABASE_URL, SUPABASE_KEY)
-                response = supabase.table(TABLE_NAME).delete().neq("id", 0).execute()
-                st.success("✅ All rows have been deleted successfully!")
-            except Exception as e:
-                st.error(f"❌ Failed to delete data: {e}")
\ No newline at end of file
+    st.write("Permanently delete rows from the vector store: everything, one document, one content hash or one ingest job. "
+             "Rows are removed in small batches, and an interrupted delete continues where it stopped.")
+
+    if VECTOR_STORE == "Supabase" and (SUPABASE_KEY == "your-service-role-key" or not TABLE_NAME):
+        st.error("⚠️ Please provide valid Supabase credentials and table name!")
+        return
+
+    supabase = create_supabase_client(SUPABASE_URL, SUPABASE_KEY) if VECTOR_STORE == "Supabase" else None
+    store = create_vector_store(VECTOR_STORE, supabase, TABLE_NAME, LOCAL_STORE_PATH)
+
+    # ✅ What to delete
+    kind = st.radio("Delete", DELETE_SCOPES, horizontal=True)
+    value = None
+    if kind == "Filename":
+        filenames = store.distinct("filename") if hasattr(store, "distinct") else []
+        value = st.selectbox("File", filenames) if filenames else st.text_input("Filename (metadata.filename)")
+    elif kind == "Content hash":
+        value = st.text_input("Content hash (metadata.content_hash)")
+    elif kind == "Ingest job":
+        jobs = get_journal().jobs(limit=200, target=store.key)
+        if not jobs:
+            st.info("No ingest jobs recorded for this vector store.")
+            return
+        labels = {job["job_id"]: f"{job['filename']} — {job['status']}, {job['stored']}/{job['chunks']} chunks stored ({job['job_id'][:8]})" for job in jobs}
+        value = st.selectbox("Job", list(labels), format_func=labels.get)
+
+    try:
+        scope = delete_scope(kind, value)
+    except ValueError:
+        st.info(f"Enter a {kind.lower()} to delete.")
+        return
+
+    # ✅ An earlier delete of the same rows that did not finish
+    pending = pending_deletion(store, scope)
+    if pending:
+        st.warning(f"⏸️ A delete of {describe_scope(scope)} was interrupted after {pending['deleted']} rows; deleting again resumes it.")
+
+    # ✅ Dry run first: the delete button only appears once the rows were counted
+    if st.button("Count rows (dry run)"):
+        try:
+            st.session_state.delete_preview = {"key": store.key, "scope": scope, "rows": count_rows(store, scope)}
+        except Exception as e:
+            st.error(f"❌ Failed to count rows: {e}")
+
+    preview = st.session_state.get("delete_preview")
+    if not preview or preview["key"] != store.key or preview["scope"] != scope:
+        return
+    st.write(f"**{preview['rows']}** {describe_scope(scope)} would be deleted.")
+
+    if st.button("Delete Vectors", type="primary", disabled=not preview["rows"] and not pending):
+        try:
+            with ProgressDisplay() as progress:
+                deleted = delete_rows(store, scope, DELETE_BATCH, on_progress=progress)  # Deleted files must not be skipped when re-uploaded
+            del st.session_state.delete_preview
+            st.success(f"✅ Deleted {deleted} {describe_scope(scope)}.")
+        except Exception as e:
+            st.error(f"❌ Failed to delete data: {e}. Deleting again resumes after the last finished batch.")
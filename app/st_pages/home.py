@@ -1,9 +1,6 @@
 import streamlit as st
 from streamlit_extras.let_it_rain import rain
 
-# Page confi
-st.set_page_config(page_title="File2Vector", page_icon="📂", layout="wide")
-
 rain(
     emoji="🎉",
     font_size=20,
@@ -1,11 +1,18 @@
 import streamlit as st
 import os
-import pandas as pd
-from scripts.utils import (
-    load_custom_settings, create_supabase_client, check_new_files,
-    extract_text_from_pdf, extract_tables_from_pdf, extract_text_from_docx,
-    upload_to_supabase
-)
+import time
+from scripts.utils import load_custom_settings, create_supabase_client, check_new_files, upload_file_chunks, delete_file_rows, fit_chunk_size
+from scripts.manifest import get_manifest
+from scripts.journal import begin_job
+from scripts.vector_store import BatchWriter, as_vector_store, create_vector_store, DEFAULT_LOCAL_STORE_PATH, VECTOR_STORE_BACKENDS
+from scripts.scheduler import default_workers
+from scripts.ingest import make_job, ingest_files
+from st_pages.components import ProgressDisplay, show_checkpoint_result, show_dedup_result
+from scripts.embedding_cache import get_embedding_cache
+from scripts.watcher import get_watcher, start_watcher, stop_watcher
+from scripts.metrics import metrics, profile_job, set_profile_dir
+from scripts.dedup import DEDUP_SCOPES, make_deduplicator
+from scripts.streaming import DEFAULT_MEMORY_BUDGET
 from streamlit_extras.let_it_rain import rain
 
 rain_length = 0
@@ -24,71 +31,159 @@ BASE_DIR = os.path.join(os.getcwd(), "..", "data")
 if not os.path.exists(BASE_DIR):
     os.makedirs(BASE_DIR)
 
-# ✅ Store known files in session state
-if "known_files" not in st.session_state:
-    st.session_state.known_files = set()
+# ✅ Persistent manifest of synced files (survives restarts)
+manifest = get_manifest()
+
+# ✅ Labels for per-file ingest results
+STATUS_LABELS = {"uploaded": "✅ uploaded", "partial": "⚠️ partially uploaded", "failed": "❌ failed"}
+
+# ✅ Seconds between refreshes of the live metrics panel
+METRICS_REFRESH_SECONDS = 2
 
 # ✅ Function to process and upload a file
-def upload_file(file_path, supabase, table_name, expected_dim, model, cohere_key, openai_key, CHUNK_SIZE):
+def upload_file(change, store, table_name, expected_dim, model, cohere_key, openai_key, CHUNK_SIZE, insert_batch_rows=500, insert_batch_bytes=4_000_000, insert_concurrency=2, embed_concurrency=4, chunk_overlap=0, table_batch_rows=1000, dedup="Off", memory_budget=DEFAULT_MEMORY_BUDGET):
+    file_path = change["path"]
     file_name = os.path.basename(file_path)
-    metadata = {"filename": file_name}
-    file_extension = file_name.split(".")[-1]
-
-    # ✅ Streamlit progress bar
-    progress_text = st.empty()
-    progress_bar = st.progress(0)
-
-    with open(file_path, "rb") as uploaded_file:
-        if file_extension == "pdf":
-            text = extract_text_from_pdf(uploaded_file)
-            tables = extract_tables_from_pdf(uploaded_file)
-
-            if text:
-                upload_to_supabase(supabase, table_name, text, metadata, expected_dim, model, cohere_key, openai_key, CHUNK_SIZE)
-                progress_text.text("Uploading extracted text from PDF...")
-                progress_bar.progress(50)
-
-            if tables:
-                total_tables = len(tables)
-                for i, table in enumerate(tables):
-                    upload_to_supabase(supabase, table_name, str(table.to_dict()), metadata, expected_dim, model, cohere_key, openai_key, CHUNK_SIZE)
-                    progress_text.text(f"Uploading table {i+1}/{total_tables}...")
-                    progress_bar.progress(50 + int(50 * (i + 1) / total_tables))
-
-        elif file_extension == "docx":
-            text = extract_text_from_docx(uploaded_file)
-            if text:
-                upload_to_supabase(supabase, table_name, text, metadata, expected_dim, model, cohere_key, openai_key, CHUNK_SIZE)
-                progress_text.text("Uploading extracted text from Word document...")
-                progress_bar.progress(100)
-
-        elif file_extension in ["csv", "xlsx"]:
-            df = pd.read_csv(uploaded_file) if file_extension == "csv" else pd.read_excel(uploaded_file)
-            total_rows = len(df)
-
-            for i, (_, row) in enumerate(df.iterrows()):
-                upload_to_supabase(supabase, table_name, str(row.to_dict()), row.to_dict(), expected_dim, model, cohere_key, openai_key, CHUNK_SIZE)
-                progress_text.text(f"Uploading row {i+1}/{total_rows}...")
-                progress_bar.progress(int((i + 1) / total_rows * 100))
-
-    progress_text.text("Upload complete!")
-    progress_bar.progress(100)
-    st.success(f"✅ {file_name} uploaded successfully!")
+    metadata = {"filename": file_name, "content_hash": change["content_hash"]}
+    file_extension = file_name.split(".")[-1].lower()
+
+    store = as_vector_store(store, table_name)
+
+    # ✅ Checkpointed job: a retry after an error or restart skips chunks already stored
+    settings = {"chunk_size": CHUNK_SIZE, "overlap": chunk_overlap, "table_batch_rows": table_batch_rows, "model": model, "expected_dim": expected_dim}
+    checkpoint = begin_job(store, file_name, change["content_hash"], settings)
+
+    # ✅ Replace stale rows of an edited file instead of duplicating them (once per job)
+    if change["status"] == "changed":
+        checkpoint.replace_once(lambda: delete_file_rows(store, table_name, file_name))
+
+    # ✅ Duplicate chunks of this file are dropped before embedding (a single file: "Run" is the same as "Document")
+    deduplicator = make_deduplicator(dedup)
+
+    # ✅ One buffered writer for every chunk of this file
+    writer = BatchWriter(store, max_rows=insert_batch_rows, max_bytes=insert_batch_bytes, max_inflight=insert_concurrency)
+
+    # ✅ Streamlit progress bar driven by the pipeline's progress callbacks
+    # The file is read from disk (memory-mapped) a page, text block or row batch at a time; extraction pauses
+    # whenever the chunks waiting to be embedded fill the memory budget
+    try:
+        with ProgressDisplay() as progress, writer, profile_job(file_name):
+            upload_file_chunks(store, table_name, file_path, file_extension, metadata, expected_dim, model, cohere_key, openai_key, CHUNK_SIZE, writer, embed_concurrency, overlap=chunk_overlap, table_batch_rows=table_batch_rows, on_progress=progress, checkpoint=checkpoint, deduplicator=deduplicator, memory_budget=memory_budget)
+    except Exception as e:
+        # Record the failure so the job shows as failed and a retry resumes it
+        checkpoint.finish(error=str(e))
+        st.error(f"⚠️ Upload of {file_name} failed: {e}")
+        return False
+
+    if deduplicator is not None:
+        deduplicator.write_references(store)  # Copies of chunks stored by earlier batches
+    checkpoint.finish(writer)
+    show_checkpoint_result(checkpoint)
+    show_dedup_result(deduplicator)
+    if writer.rows_failed:
+        st.error(f"⚠️ {writer.rows_failed} rows of {file_name} failed to upload: {writer.errors[-1]}")
+        return False
+    manifest.mark_synced(change)
+    st.success(f"✅ {file_name} uploaded successfully! {writer.rows_written} rows written.")
+    return True
+
+
+# ✅ Function to upload many files: extraction runs in a process pool, embedding/upload in this thread
+def upload_files_in_bulk(changes, store, table_name, expected_dim, model, cohere_key, openai_key, CHUNK_SIZE, insert_batch_rows=500, insert_batch_bytes=4_000_000, insert_concurrency=2, embed_concurrency=4, chunk_overlap=0, table_batch_rows=1000, workers=None, dedup="Off", memory_budget=DEFAULT_MEMORY_BUDGET):
+    jobs = []
+    for change in changes:
+        job = make_job(change["path"], CHUNK_SIZE, chunk_overlap, table_batch_rows,
+                       metadata={"content_hash": change["content_hash"]}, replace=change["status"] == "changed")
+        job["change"] = change
+        jobs.append(job)
+
+    results = []
+    with ProgressDisplay() as progress:
+        for job, result in ingest_files(
+            jobs, store, table_name, expected_dim, model, cohere_key, openai_key, workers=workers, dedup=dedup, memory_budget=memory_budget,
+            insert_batch_rows=insert_batch_rows, insert_batch_bytes=insert_batch_bytes,
+            insert_concurrency=insert_concurrency, embed_concurrency=embed_concurrency,
+        ):
+            if result["status"] == "uploaded":
+                manifest.mark_synced(job["change"])
+            results.append({
+                "file": result["file"],
+                "status": STATUS_LABELS[result["status"]],
+                "chunks": result["chunks"],
+                "rows written": result["rows_written"],
+                "skipped (stored earlier)": result["skipped"],
+                "duplicates dropped": result["deduplicated"],
+                "extract (s)": round(result["extract_seconds"], 2),
+                "upload (s)": round(result["upload_seconds"], 2),
+                "error": result["error"],
+            })
+            progress(len(results), len(jobs), f"Uploaded {result['file']} ({len(results)}/{len(jobs)})")
+    return results
+
+
+# ✅ Live pipeline metrics: throughput, stage timings, provider latency and counters
+@st.fragment(run_every=METRICS_REFRESH_SECONDS)
+def show_metrics_panel():
+    snapshot = metrics.snapshot()
+    totals = {}
+    for row in snapshot["counters"]:
+        totals[row["metric"]] = totals.get(row["metric"], 0) + row["value"]
+    elapsed = max(time.time() - snapshot["since"], 1e-9)
+
+    chunks, tokens, sent, retries = st.columns(4)
+    chunks.metric("Chunks", totals.get("chunks_total", 0), f"{totals.get('chunks_total', 0) / elapsed:.1f}/s", delta_color="off")
+    tokens.metric("Tokens", totals.get("tokens_total", 0), f"{totals.get('tokens_total', 0) / elapsed:.0f}/s", delta_color="off")
+    sent.metric("Sent (MB)", f"{totals.get('bytes_sent_total', 0) / 1e6:.1f}", f"{totals.get('bytes_sent_total', 0) / 1e6 / elapsed:.2f} MB/s", delta_color="off")
+    retries.metric("Retries", totals.get("retries_total", 0))
+
+    stages = [row for row in snapshot["histograms"] if row["metric"] == "stage_seconds"]
+    latency = [row for row in snapshot["histograms"] if row["metric"] == "provider_request_seconds"]
+    if stages:
+        st.write("**Stages**")
+        st.dataframe([{key: value for key, value in row.items() if key != "metric"} for row in stages], use_container_width=True)
+    if latency:
+        st.write("**Embedding provider latency**")
+        st.dataframe([{key: value for key, value in row.items() if key != "metric"} for row in latency], use_container_width=True)
+    if snapshot["counters"]:
+        with st.expander("Counters"):
+            st.dataframe(snapshot["counters"], use_container_width=True)
+    if not (stages or latency or snapshot["counters"]):
+        st.caption("No pipeline activity recorded yet.")
 
 
 # ✅ Main function with proper button handling
 def show():
     st.title("Check `/data` for New Files")
-    st.write("Press the refresh button to detect new files and store them individually or in bulk.")
+    st.write("Turn on auto-ingest to store new files as they arrive, or press the refresh button to detect new files and store them individually or in bulk.")
+
+    # ✅ Embedding cache statistics
+    cache_stats = get_embedding_cache().stats()
+    st.caption(f"Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+               f"({cache_stats['hit_rate']:.0%} hit rate, {cache_stats['bytes'] / 1e6:.1f} MB on disk)")
 
     # ✅ Credentials Input
-    custom_settings = load_custom_settings() if st.sidebar.checkbox("Custom Settings") else {}
+    custom_settings = load_custom_settings(on_error=st.error) if st.sidebar.checkbox("Custom Settings") else {}
 
     SUPABASE_URL = st.sidebar.text_input("Supabase URL", custom_settings.get("SUPABASE_URL", "https://your-supabase-url.supabase.co"))
     SUPABASE_KEY = st.sidebar.text_input("Supabase Key", custom_settings.get("SUPABASE_KEY", "your-service-role-key"), type="password")
     TABLE_NAME = st.sidebar.text_input("Table Name", custom_settings.get("TABLE_NAME", "your_vector_table"))
+    VECTOR_STORE = st.sidebar.radio("Vector Store", VECTOR_STORE_BACKENDS, index=VECTOR_STORE_BACKENDS.index(custom_settings.get("VECTOR_STORE", "Supabase")))
+    LOCAL_STORE_PATH = st.sidebar.text_input("Local Store Path", custom_settings.get("LOCAL_STORE_PATH", DEFAULT_LOCAL_STORE_PATH)) if VECTOR_STORE == "Local" else None
     EXPECTED_DIM = st.select_slider("Expected Dimensions", options=[384, 786, 1024, 4096], value=int(custom_settings.get("EXPECTED_DIM", 1024)))
-    CHUNK_SIZE = st.number_input("Chunk Size", min_value=100, max_value=1000, value=int(custom_settings.get("CHUNK_SIZE", 300)), step=50)
+    CHUNK_SIZE = st.number_input("Chunk Size (tokens)", min_value=100, max_value=1000, value=int(custom_settings.get("CHUNK_SIZE", 300)), step=50)
+    CHUNK_OVERLAP = st.number_input("Chunk Overlap (tokens)", min_value=0, max_value=200, value=int(custom_settings.get("CHUNK_OVERLAP", 0)), step=10)
+    INSERT_BATCH_ROWS = int(custom_settings.get("INSERT_BATCH_ROWS", 500))
+    INSERT_BATCH_BYTES = int(custom_settings.get("INSERT_BATCH_BYTES", 4_000_000))
+    TABLE_BATCH_ROWS = int(custom_settings.get("TABLE_BATCH_ROWS", 1000))
+    EXTRACT_WORKERS = st.number_input("Extraction Workers", min_value=1, max_value=os.cpu_count() or 1, value=min(int(custom_settings.get("EXTRACT_WORKERS", default_workers())), os.cpu_count() or 1))
+    INSERT_CONCURRENCY = int(custom_settings.get("INSERT_CONCURRENCY", 2))
+    EMBED_CONCURRENCY = int(custom_settings.get("EMBED_CONCURRENCY", 4))
+    WATCH_WORKERS = int(custom_settings.get("WATCH_WORKERS", 2))  # Files ingested at once by the watcher
+    WATCH_DEBOUNCE_SECONDS = float(custom_settings.get("WATCH_DEBOUNCE_SECONDS", 2.0))  # Quiet time before a file is ingested
+    DEDUP = st.radio("Deduplicate Chunks", DEDUP_SCOPES, index=DEDUP_SCOPES.index(custom_settings.get("DEDUP", "Off")), horizontal=True,
+                     help="Drop duplicate chunks before embedding, within each file or across every file of a bulk upload.")
+    PROFILE_DIR = custom_settings.get("PROFILE_DIR", "")  # cProfile dump per uploaded file when set
+    MEMORY_BUDGET = int(custom_settings.get("MEMORY_BUDGET_MB", DEFAULT_MEMORY_BUDGET // (1024 * 1024))) * 1024 * 1024  # Extracted chunks in flight per file
 
     embedding_model = st.radio("Embedding Model", ["OpenAI", "Cohere"])
     if embedding_model == "OpenAI":
@@ -98,20 +193,78 @@ def show():
         COHERE_API_KEY = st.sidebar.text_input("Cohere API Key", custom_settings.get("COHERE_API_KEY", "your-cohere-api-key"), type="password")
         OPENAI_API_KEY = None
 
-    if SUPABASE_KEY == "your-service-role-key":
+    # ✅ Chunks must fit the provider's input limit (Cohere: 512 tokens), or the provider cuts them off
+    if fit_chunk_size(CHUNK_SIZE, embedding_model) < CHUNK_SIZE:
+        CHUNK_SIZE = fit_chunk_size(CHUNK_SIZE, embedding_model)
+        st.info(f"ℹ️ Chunk size capped at {CHUNK_SIZE} tokens, the {embedding_model} input limit.")
+
+    if VECTOR_STORE == "Supabase" and SUPABASE_KEY == "your-service-role-key":
         st.error("⚠️ Please provide your dataset and API credentials to start your upload!")
         return
 
-    # ✅ Initialize Supabase Client
-    supabase = create_supabase_client(SUPABASE_URL, SUPABASE_KEY)
+    # ✅ Initialize the vector store (Supabase client or local store)
+    supabase = create_supabase_client(SUPABASE_URL, SUPABASE_KEY) if VECTOR_STORE == "Supabase" else None
+    store = create_vector_store(VECTOR_STORE, supabase, TABLE_NAME, LOCAL_STORE_PATH)
+
+    # ✅ Background auto-ingest: new and changed files are picked up without pressing anything
+    st.write("### **Auto-Ingest**")
+    watcher = get_watcher()
+    auto_ingest = st.toggle("Watch `/data` and ingest new files automatically", value=watcher is not None and watcher.running)
+    if auto_ingest and (watcher is None or not watcher.running):
+        watcher = start_watcher(
+            BASE_DIR, manifest, store, TABLE_NAME, EXPECTED_DIM, embedding_model, COHERE_API_KEY, OPENAI_API_KEY,
+            CHUNK_SIZE, CHUNK_OVERLAP, TABLE_BATCH_ROWS, WATCH_WORKERS, WATCH_DEBOUNCE_SECONDS,
+            insert_batch_rows=INSERT_BATCH_ROWS, insert_batch_bytes=INSERT_BATCH_BYTES,
+            insert_concurrency=INSERT_CONCURRENCY, embed_concurrency=EMBED_CONCURRENCY, dedup=DEDUP, memory_budget=MEMORY_BUDGET,
+        )
+    elif not auto_ingest and watcher is not None:
+        stop_watcher()
+        watcher = None
+
+    if watcher is not None:
+        status = watcher.status()
+        mode = "file system events" if status["mode"] == "inotify" else "polling"
+        st.caption(f"Watching {status['base_dir']} ({mode}); settings are captured when watching starts.")
+        waiting, queued, in_flight = st.columns(3)
+        waiting.metric("Settling", status["waiting"])
+        queued.metric("Queued", status["queued"])
+        in_flight.metric("In flight", len(status["in_flight"]))
+        for item in status["in_flight"]:
+            st.write(f"⏳ {item['file']} ({item['seconds']:.0f}s)")
+        if status["recent"]:
+            st.dataframe([{
+                "file": result["file"],
+                "status": STATUS_LABELS[result["status"]],
+                "chunks": result["chunks"],
+                "rows written": result["rows_written"],
+                "finished": time.strftime("%H:%M:%S", time.localtime(result["finished_at"])),
+                "error": result["error"],
+            } for result in status["recent"]], use_container_width=True)
+        st.button("Refresh status")
 
-    # ✅ Refresh button to check for new files
+    # ✅ Pipeline metrics (collection is close to free when switched off)
+    st.write("### **Pipeline Metrics**")
+    metrics.enabled = st.toggle("Collect pipeline metrics", value=bool(custom_settings.get("METRICS_ENABLED", metrics.enabled)))
+    set_profile_dir(PROFILE_DIR)
+    if PROFILE_DIR:
+        st.caption(f"cProfile dumps of each upload are written to {PROFILE_DIR}")
+    if metrics.enabled:
+        show_metrics_panel()
+        reset, export = st.columns(2)
+        if reset.button("Reset metrics"):
+            metrics.reset()
+        export.download_button("Download Prometheus metrics", metrics.to_prometheus(), file_name="file2vector.prom", mime="text/plain")
+
+    st.write("### **Manual Upload**")
+
+    # ✅ Refresh button to check for added or changed files
     if st.button("Refresh"):
-        new_files, st.session_state.known_files = check_new_files(BASE_DIR, st.session_state.known_files)
+        new_files = check_new_files(BASE_DIR, manifest)
 
         if new_files:
-            st.session_state.new_files = new_files  # Store detected new files
-            st.success("📂 New files detected!")
+            st.session_state.new_files = new_files  # Store detected changes
+            added = sum(1 for change in new_files if change["status"] == "added")
+            st.success(f"📂 {added} new and {len(new_files) - added} changed files detected!")
         else:
             st.session_state.new_files = []
             st.info("✅ No new files detected.")
@@ -122,21 +275,30 @@ def show():
     if new_files:
         st.write("### **Upload Individual Files**")
 
-        for file in new_files:
-            file_path = os.path.join(BASE_DIR, file)
+        for change in new_files:
+            file = change["name"]
+            label = f"Upload {file}" if change["status"] == "added" else f"Re-sync {file} (changed)"
 
             # ✅ Track button states to prevent rerun issues
-            if st.button(f"Upload {file}", key=f"upload_{file}"):
-                upload_file(file_path, supabase, TABLE_NAME, EXPECTED_DIM, embedding_model, COHERE_API_KEY, OPENAI_API_KEY, CHUNK_SIZE)
-                st.session_state.new_files.remove(file)  # Remove uploaded file from list
-                st.experimental_rerun()  # Refresh UI
+            if st.button(label, key=f"upload_{file}"):
+                if upload_file(change, store, TABLE_NAME, EXPECTED_DIM, embedding_model, COHERE_API_KEY, OPENAI_API_KEY, CHUNK_SIZE, INSERT_BATCH_ROWS, INSERT_BATCH_BYTES, INSERT_CONCURRENCY, EMBED_CONCURRENCY, CHUNK_OVERLAP, TABLE_BATCH_ROWS, DEDUP, MEMORY_BUDGET):
+                    st.session_state.new_files.remove(change)  # Remove uploaded file from list
+                    st.experimental_rerun()  # Refresh UI
+                # A failed file stays listed (with its error) so it can be retried
 
         # ✅ Upload all new files in bulk
         if st.button("Upload All New Files"):
-            for file in new_files:
-                file_path = os.path.join(BASE_DIR, file)
-                upload_file(file_path, supabase, TABLE_NAME, EXPECTED_DIM, embedding_model, COHERE_API_KEY, OPENAI_API_KEY, CHUNK_SIZE)
+            results = upload_files_in_bulk(new_files, store, TABLE_NAME, EXPECTED_DIM, embedding_model, COHERE_API_KEY, OPENAI_API_KEY, CHUNK_SIZE, INSERT_BATCH_ROWS, INSERT_BATCH_BYTES, INSERT_CONCURRENCY, EMBED_CONCURRENCY, CHUNK_OVERLAP, TABLE_BATCH_ROWS, EXTRACT_WORKERS, DEDUP, MEMORY_BUDGET)
 
-            st.session_state.new_files = []  # Clear new files after upload
-            st.success(f"✅ All {len(new_files)} files uploaded successfully!")
+            # Keep failed files listed so they can be retried
+            failed = {result["file"] for result in results if not result["status"].startswith("✅")}
+            st.session_state.new_files = [change for change in new_files if change["name"] in failed]
+            st.session_state.bulk_results = results
             st.experimental_rerun()  # Refresh UI
+
+    # ✅ Per-file report of the last bulk upload
+    bulk_results = st.session_state.get("bulk_results")
+    if bulk_results:
+        uploaded = sum(1 for result in bulk_results if result["status"].startswith("✅"))
+        st.write(f"### **Last Bulk Upload** ({uploaded} of {len(bulk_results)} files uploaded)")
+        st.dataframe(bulk_results, use_container_width=True)
@@ -0,0 +1,57 @@
+import streamlit as st
+from scripts.utils import load_custom_settings
+from scripts.vector_store import get_local_store, DEFAULT_LOCAL_STORE_PATH
+from scripts.search import search_local_store, QUANTIZATIONS
+
+def show():
+    st.title("Search")
+    st.write("Run a similarity search over the chunks stored in your local vector store.")
+
+    # Load custom settings if button is pressed
+    custom_settings = load_custom_settings(on_error=st.error) if st.sidebar.checkbox("Custom Settings") else {}
+
+    LOCAL_STORE_PATH = st.sidebar.text_input("Local Store Path", custom_settings.get("LOCAL_STORE_PATH", DEFAULT_LOCAL_STORE_PATH))
+
+    # ✅ Embedding Model Selection (must match the model used for upload)
+    OPENAI_API_KEY = None
+    COHERE_API_KEY = None
+    embedding_model = st.radio("Embedding Model", ["OpenAI", "Cohere"])
+    if embedding_model == "OpenAI":
+        OPENAI_API_KEY = st.sidebar.text_input("OpenAI API Key", custom_settings.get("OPENAI_API_KEY", "your-openai-api-key"), type="password")
+    else:
+        COHERE_API_KEY = st.sidebar.text_input("Cohere API Key", custom_settings.get("COHERE_API_KEY", "your-cohere-api-key"), type="password")
+
+    store = get_local_store(LOCAL_STORE_PATH)
+    total_rows = store.count()
+    if not total_rows:
+        st.info("The local vector store is empty. Upload files with the Local vector store selected first.")
+        return
+    st.caption(f"{total_rows} chunks in {store.directory}")
+
+    # ✅ Search options
+    query = st.text_input("Query")
+    TOP_K = st.slider("Results", min_value=1, max_value=50, value=10)
+    filenames = st.multiselect("Only these files", store.distinct("filename"))
+    QUANTIZATION = st.radio("Quantization", QUANTIZATIONS, horizontal=True,
+                            help="int8/float16 scan a compact in-memory copy of the vectors, then re-rank the best candidates exactly.")
+
+    if st.button("Search") and query.strip():
+        try:
+            results, timings = search_local_store(
+                store, query, embedding_model, COHERE_API_KEY, OPENAI_API_KEY, TOP_K,
+                {"filename": filenames} if filenames else None, QUANTIZATION,
+            )
+        except Exception as e:
+            st.error(f"❌ Search failed: {e}")
+            return
+
+        st.caption(f"Embedded the query in {timings['embed_seconds'] * 1000:.0f} ms, "
+                   f"searched in {timings['search_seconds'] * 1000:.1f} ms")
+        if not results:
+            st.write("No matching chunks.")
+        for result in results:
+            metadata = result["metadata"]
+            location = f", page {metadata['page']}" if "page" in metadata else f", row {metadata['row']}" if "row" in metadata else ""
+            with st.expander(f"{result['score']:.3f} · {metadata.get('filename', 'unknown')}{location}"):
+                st.write(result["content"])
+                st.json(metadata, expanded=False)
@@ -1,8 +1,13 @@
 import streamlit as st
-import pandas as pd
+import hashlib
 from scripts.utils import (
-    load_custom_settings, create_supabase_client, extract_text_from_pdf, extract_tables_from_pdf, extract_text_from_docx, upload_to_supabase
+    load_custom_settings, create_supabase_client, upload_chunks, upload_file_chunks, fit_chunk_size
 )
+from scripts.vector_store import BatchWriter, create_vector_store, DEFAULT_LOCAL_STORE_PATH, VECTOR_STORE_BACKENDS
+from scripts.journal import begin_job
+from scripts.dedup import make_deduplicator
+from scripts.extraction_cache import get_extraction_cache, extraction_key, extract_upload
+from st_pages.components import ProgressDisplay, show_writer_result, show_checkpoint_result, show_dedup_result, show_upload_estimate
 
 # Streamlit UI Setup
 def show():
@@ -10,21 +15,33 @@ def show():
     st.write("This tool allows users to upload and store various file types into their own Supabase vector database. It extracts text from DOCX, PDFs, and structured data from spreadsheets, generating embeddings while storing them efficiently.")
 
     # Load custom settings if button is pressed
-    custom_settings = load_custom_settings() if st.sidebar.checkbox("Custom Settings") else {}
+    custom_settings = load_custom_settings(on_error=st.error) if st.sidebar.checkbox("Custom Settings") else {}
     
     # User input for API credentials
     SUPABASE_URL = st.sidebar.text_input("Supabase URL", custom_settings.get("SUPABASE_URL", "https://your-supabase-url.supabase.co"))
     SUPABASE_KEY = st.sidebar.text_input("Supabase Key", custom_settings.get("SUPABASE_KEY", "your-service-role-key"), type="password")
     TABLE_NAME = st.sidebar.text_input("Table Name", custom_settings.get("TABLE_NAME", "your_vector_table"))
+    VECTOR_STORE = st.sidebar.radio("Vector Store", VECTOR_STORE_BACKENDS, index=VECTOR_STORE_BACKENDS.index(custom_settings.get("VECTOR_STORE", "Supabase")))
+    LOCAL_STORE_PATH = st.sidebar.text_input("Local Store Path", custom_settings.get("LOCAL_STORE_PATH", DEFAULT_LOCAL_STORE_PATH)) if VECTOR_STORE == "Local" else None
     
     # User Input for embedding configuration
     EXPECTED_DIM = st.select_slider("Expected Dimensions", options=[384, 786, 1024, 4096], value=int(custom_settings.get("EXPECTED_DIM", 1024)))
-    CHUNK_SIZE = st.number_input("Chunk Size", 
+    CHUNK_SIZE = st.number_input("Chunk Size (tokens)", 
     min_value=100,  # Prevents too-small chunks
     max_value=1000,  # Reasonable upper limit
     value=int(custom_settings.get("CHUNK_SIZE", 300)),  # Default value
     step=50  # Adjust step size
     )
+    CHUNK_OVERLAP = st.number_input("Chunk Overlap (tokens)", min_value=0, max_value=200, value=int(custom_settings.get("CHUNK_OVERLAP", 0)), step=10)
+    INSERT_BATCH_ROWS = int(custom_settings.get("INSERT_BATCH_ROWS", 500))  # Rows per multi-row insert
+    INSERT_BATCH_BYTES = int(custom_settings.get("INSERT_BATCH_BYTES", 4_000_000))  # Payload bytes per multi-row insert
+    TABLE_BATCH_ROWS = int(custom_settings.get("TABLE_BATCH_ROWS", 1000))  # Spreadsheet rows read per batch
+    INSERT_CONCURRENCY = int(custom_settings.get("INSERT_CONCURRENCY", 2))  # Multi-row inserts in flight
+    EMBED_CONCURRENCY = int(custom_settings.get("EMBED_CONCURRENCY", 4))  # Embedding requests in flight
+    EXTRACTION_CACHE_MB = int(custom_settings.get("EXTRACTION_CACHE_MB", 256))  # Memory for extracted files kept across reruns
+    MEMORY_BUDGET = int(custom_settings.get("MEMORY_BUDGET_MB", 256)) * 1024 * 1024  # Extracted chunks in flight while streaming a file
+    DEDUP = st.radio("Deduplicate Chunks", ["Off", "Document"], index=0 if custom_settings.get("DEDUP", "Off") == "Off" else 1, horizontal=True,
+                     help="Drop repeated headers, disclaimers and identical rows before embedding; the kept chunk lists where its copies were.")
     
     # ✅ Initialize both variables with None before conditional assignment
     OPENAI_API_KEY = None
@@ -38,52 +55,87 @@ def show():
     else:
         COHERE_API_KEY = st.sidebar.text_input("Cohere API Key", custom_settings.get("COHERE_API_KEY", "your-cohere-api-key"), type="password")
 
+    # ✅ Chunks must fit the provider's input limit (Cohere: 512 tokens), or the provider cuts them off
+    if fit_chunk_size(CHUNK_SIZE, embedding_model) < CHUNK_SIZE:
+        CHUNK_SIZE = fit_chunk_size(CHUNK_SIZE, embedding_model)
+        st.info(f"ℹ️ Chunk size capped at {CHUNK_SIZE} tokens, the {embedding_model} input limit.")
+
     # Ensure Supabase API Key is provided
-    if SUPABASE_KEY == "your-service-role-key":
+    if VECTOR_STORE == "Supabase" and SUPABASE_KEY == "your-service-role-key":
         st.write("⚠️ Please provide your dataset and API credentials to start your upload!")
         st.stop()
     
-    # Initialize Supabase Client
-    supabase = create_supabase_client(SUPABASE_URL, SUPABASE_KEY)
+    # Initialize the vector store (Supabase client or local store)
+    supabase = create_supabase_client(SUPABASE_URL, SUPABASE_KEY) if VECTOR_STORE == "Supabase" else None
+    store = create_vector_store(VECTOR_STORE, supabase, TABLE_NAME, LOCAL_STORE_PATH)
     
     uploaded_file = st.file_uploader("Choose a file", type=["csv", "pdf", "docx", "xlsx"])
 
     if uploaded_file is not None:
         file_type = uploaded_file.name.split('.')[-1]
-        metadata = {"filename": uploaded_file.name}
-        
+        writer = BatchWriter(store, max_rows=INSERT_BATCH_ROWS, max_bytes=INSERT_BATCH_BYTES, max_inflight=INSERT_CONCURRENCY)
+
+        # ✅ Hash each uploaded file once per session; every rerun looks its extraction up by this hash
+        hashes = st.session_state.setdefault("upload_hashes", {})
+        content_hash = hashes.get(uploaded_file.file_id)
+        if content_hash is None:
+            content_hash = hashes[uploaded_file.file_id] = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+        # The content hash lets the Database page delete exactly this version of the file
+        metadata = {"filename": uploaded_file.name, "content_hash": content_hash}
+
+        # ✅ Extract and chunk once per content, filename and chunk settings; widget changes rerun the page without re-parsing
+        cache = get_extraction_cache(EXTRACTION_CACHE_MB * 1024 * 1024)
+
+        def extract():
+            with st.spinner(f"Extracting {uploaded_file.name}..."):
+                return extract_upload(uploaded_file, file_type, metadata, CHUNK_SIZE, CHUNK_OVERLAP, TABLE_BATCH_ROWS, cache.max_entry_bytes)
+
+        extraction = cache.get_or_build(extraction_key(content_hash, uploaded_file.name, file_type, CHUNK_SIZE, CHUNK_OVERLAP), extract)
+
+        # ✅ Checkpointed job per file: uploading the same file again resumes where the last attempt stopped
+        def begin_upload_job():
+            settings = {"chunk_size": CHUNK_SIZE, "overlap": CHUNK_OVERLAP, "table_batch_rows": TABLE_BATCH_ROWS,
+                        "model": embedding_model, "expected_dim": EXPECTED_DIM}
+            return begin_job(store, uploaded_file.name, content_hash, settings)
+
         if file_type == "pdf":
-            text = extract_text_from_pdf(uploaded_file)
-            st.write("Extracted text from PDF:", text[:500])
-            if st.button("Upload to Supabase"):
-                upload_to_supabase(supabase, TABLE_NAME, text, metadata, EXPECTED_DIM, embedding_model, COHERE_API_KEY, OPENAI_API_KEY, CHUNK_SIZE)
-            
-            tables = extract_tables_from_pdf(uploaded_file)
-            if tables:
-                st.write("Extracted tables from PDF:")
-                for table in tables:
-                    st.dataframe(table)
-        
+            st.write("Extracted text from PDF:", extraction.preview_text)
         elif file_type == "docx":
-            text = extract_text_from_docx(uploaded_file)
-            st.write("Extracted text from Word document:", text[:500])
-            if st.button("Upload to Supabase"):
-                upload_to_supabase(supabase, TABLE_NAME, text, metadata, EXPECTED_DIM, embedding_model, COHERE_API_KEY, OPENAI_API_KEY, CHUNK_SIZE)
-        
-        elif file_type == "csv":
-            df = pd.read_csv(uploaded_file)
-            st.write("Preview of uploaded CSV:")
-            st.dataframe(df.head())
-            if st.button("Upload to Supabase"):
-                for _, row in df.iterrows():
-                    upload_to_supabase(supabase, TABLE_NAME, str(row.to_dict()), row.to_dict(), EXPECTED_DIM, embedding_model, COHERE_API_KEY, OPENAI_API_KEY, CHUNK_SIZE)
-                st.success("CSV uploaded successfully!")
-        
-        elif file_type == "xlsx":
-            df = pd.read_excel(uploaded_file)
-            st.write("Preview of uploaded Excel file:")
-            st.dataframe(df.head())
-            if st.button("Upload to Supabase"):
-                for _, row in df.iterrows():
-                    upload_to_supabase(supabase, TABLE_NAME, str(row.to_dict()), row.to_dict(), EXPECTED_DIM, embedding_model, COHERE_API_KEY, OPENAI_API_KEY, CHUNK_SIZE)
-                st.success("Excel uploaded successfully!")
+            st.write("Extracted text from Word document:", extraction.preview_text)
+        else:
+            st.write(f"Preview of uploaded {'CSV' if file_type == 'csv' else 'Excel file'}:")
+            st.dataframe(extraction.preview_frame)
+        show_upload_estimate(extraction, embedding_model)
+
+        if st.button("Upload to Supabase"):
+            checkpoint = begin_upload_job()
+            deduplicator = make_deduplicator(DEDUP)
+            try:
+                with ProgressDisplay() as progress, writer:
+                    if extraction.complete:
+                        # Embed the cached chunks; the file is not parsed again
+                        upload_chunks(store, TABLE_NAME, extraction.chunks, EXPECTED_DIM, embedding_model, COHERE_API_KEY, OPENAI_API_KEY, writer, EMBED_CONCURRENCY, on_progress=progress, checkpoint=checkpoint, deduplicator=deduplicator)
+                    else:
+                        # Too large to keep: stream it again with bounded memory
+                        upload_file_chunks(store, TABLE_NAME, uploaded_file, file_type, metadata, EXPECTED_DIM, embedding_model, COHERE_API_KEY, OPENAI_API_KEY, CHUNK_SIZE, writer, EMBED_CONCURRENCY, overlap=CHUNK_OVERLAP, table_batch_rows=TABLE_BATCH_ROWS, on_progress=progress, checkpoint=checkpoint, deduplicator=deduplicator, memory_budget=MEMORY_BUDGET)
+            except Exception as e:
+                # Record the failure so the job shows as failed and uploading again resumes it
+                checkpoint.finish(error=str(e))
+                st.error(f"⚠️ Upload failed: {e}")
+                st.stop()
+            if deduplicator is not None:
+                deduplicator.write_references(store)  # Copies of chunks stored by earlier batches
+            checkpoint.finish(writer)
+            show_checkpoint_result(checkpoint)
+            show_dedup_result(deduplicator)
+            if file_type in ["csv", "xlsx"]:
+                if writer.rows_failed:
+                    st.error(f"⚠️ {writer.rows_failed} rows failed to upload: {writer.errors[-1]}")
+                st.success(f"{'CSV' if file_type == 'csv' else 'Excel'} uploaded successfully! {writer.rows_written} of {extraction.rows} rows written.")
+            else:
+                show_writer_result(writer, "chunks")
+
+        if extraction.tables:
+            st.write("Extracted tables from PDF:")
+            for table in extraction.tables:
+                st.dataframe(table)
@@ -0,0 +1,17 @@
+import os
+import sys
+import pytest
+
+# The app's modules are imported as `scripts.*` and `st_pages.*`, as when running from app/
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app"))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+
+# ✅ Journal and embedding cache under the test's temporary directory instead of the repo's cache/
+@pytest.fixture
+def isolated_caches(tmp_path, monkeypatch):
+    from scripts import journal, embedding_cache
+    monkeypatch.setattr(journal, "_journal", journal.IngestJournal(str(tmp_path / "journal.sqlite")))
+    monkeypatch.setattr(embedding_cache, "_embedding_cache", embedding_cache.EmbeddingCache(str(tmp_path / "embeddings.sqlite")))
+    return tmp_path
@@ -0,0 +1,83 @@
+import json
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from scripts.benchmark import FakeEmbeddingClient, FakeHTTPError, FakeSupabase, compare_results, run_benchmark
+from scripts.vector_store import SupabaseVectorStore
+
+
+def test_fake_embeddings_are_deterministic_unit_vectors():
+    client = FakeEmbeddingClient(dimension=16)
+    first = client.embed(["alpha", "beta"]).embeddings
+    again = FakeEmbeddingClient(dimension=16, seed=7).embed(["alpha"]).embeddings
+    assert len(first) == 2 and len(first[0]) == 16
+    assert first[0] == again[0]  # Depends on the text only
+    assert first[0] != first[1]
+    assert np.isclose(np.linalg.norm(first[0]), 1.0)
+    assert client.requests == 1
+
+
+def test_fake_embedding_errors_carry_retry_after():
+    client = FakeEmbeddingClient(dimension=4, error_rate=1.0)
+    with pytest.raises(FakeHTTPError) as error:
+        client.embed(["alpha"])
+    assert error.value.status_code in (429, 503)
+    assert float(error.value.response.headers["retry-after"]) > 0
+    assert client.errors == 1
+
+
+def test_fake_supabase_filters_counts_and_deletes():
+    client = FakeSupabase()
+    store = SupabaseVectorStore(client, "vectors")
+    rows = [{"content": f"row {i}", "embedding": [0.5, 0.5], "metadata": {"filename": f"{i % 2}.csv", "row": i}} for i in range(6)]
+    assert store.add(rows) == 6
+    assert store.count() == 6
+    assert store.count({"filename": "0.csv"}) == 3
+    assert store.id_page({"filename": "1.csv"}, after_id=1, limit=1) == [3]
+    assert store.delete_by_metadata({"row": [0, 1]}) == 2
+    assert store.count() == 4
+    assert client.requests == 6
+    assert client.request_bytes > 0  # The insert payload is measured as sent
+
+
+@pytest.mark.parametrize("store_backend", ["Supabase", "Local"])
+def test_small_run_ingests_every_file_type(tmp_path, store_backend):
+    pytest.importorskip("pandas")
+    pytest.importorskip("pymupdf")
+    pytest.importorskip("docx")
+    pytest.importorskip("openpyxl")
+    results = run_benchmark(str(tmp_path), pages=2, paragraphs=20, rows=50, repeat=1, store_backend=store_backend,
+                            embed_latency=0, insert_latency=0)
+
+    assert set(results["files"]) == {"pdf", "docx", "csv", "xlsx"}
+    for file_type, result in results["files"].items():
+        assert result["chunks"] > 0, file_type
+        assert result["rows_failed"] == 0, file_type
+    assert results["files"]["csv"]["chunks"] == 50  # One chunk per spreadsheet row
+    assert results["embedding_requests"] > 0
+    assert "embed_request" in results["stages"]
+    json.dumps(results)  # Saved as JSON
+
+
+def test_run_leaves_the_shared_embedding_cache_alone(isolated_caches):
+    pytest.importorskip("pandas")
+    pytest.importorskip("pymupdf")
+    pytest.importorskip("docx")
+    pytest.importorskip("openpyxl")
+    from scripts.embedding_cache import get_embedding_cache
+    shared = get_embedding_cache()
+    shared.put_many([(b"user-key", np.ones(4, dtype=np.float32))])
+
+    run_benchmark(str(isolated_caches / "bench"), pages=1, paragraphs=5, rows=10, repeat=2,
+                  embed_latency=0, insert_latency=0)
+
+    assert list(shared.get_many([b"user-key"])) == [b"user-key"]  # Not cleared between repeats
+    assert shared.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] == 1  # Nothing added
+    assert (isolated_caches / "bench" / "embeddings.sqlite").exists()
+
+
+def test_compare_results_reports_throughput_ratio():
+    current = {"files": {"pdf": {"chunks_per_second": 150.0}, "csv": {"chunks_per_second": 80.0}}}
+    previous = {"files": {"pdf": {"chunks_per_second": 100.0}}}
+    assert compare_results(current, previous) == {"pdf": 1.5}
@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+
+import file2vector
+from scripts.benchmark import FakeEmbeddingClient
+from scripts.deletion import count_rows
+from scripts.manifest import hash_file
+from scripts.utils import EMBEDDING_PROVIDERS, register_embedding_client
+from scripts.vector_store import LocalVectorStore
+
+API_KEY = "test-cli"
+
+
+def test_ingested_rows_can_be_found_by_content_hash(isolated_caches, monkeypatch):
+    register_embedding_client("Cohere", API_KEY, FakeEmbeddingClient(EMBEDDING_PROVIDERS["Cohere"]["dimension"]))
+    monkeypatch.setenv("COHERE_API_KEY", API_KEY)
+    path = isolated_caches / "scores.csv"
+    path.write_text("name,score\nada,1\ngrace,2\n")
+    store_path = str(isolated_caches / "store")
+
+    code = file2vector.main(["ingest", str(path), "--model", "Cohere", "--store", "Local", "--store-path", store_path,
+                             "--settings", str(isolated_caches / "missing.json")])
+    assert code == 0
+
+    store = LocalVectorStore(store_path)
+    assert count_rows(store, {"filename": "scores.csv"}) == 2
+    assert count_rows(store, {"content_hash": hash_file(str(path))}) == 2
+    store.close()
@@ -0,0 +1,64 @@
+import sys
+import json
+import subprocess
+import importlib.util
+import pytest
+
+pytest.importorskip("numpy")
+
+from scripts.benchmark import APP_DIR, COLD_START_MODULES, measure_cold_start
+
+
+# Pages need Streamlit itself; the scripts modules must import without it
+def cold_start_modules():
+    missing = importlib.util.find_spec("streamlit") is None
+    return [
+        pytest.param(module, marks=pytest.mark.skip(reason="streamlit is not installed"))
+        if missing and module.startswith("st_pages.") else module
+        for module in COLD_START_MODULES
+    ]
+
+def run_fresh(script):
+    process = subprocess.run([sys.executable, "-c", script], cwd=APP_DIR, capture_output=True, text=True, timeout=120)
+    assert process.returncode == 0, process.stderr
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+# Import time depends on the machine, so only what gets loaded is asserted; `bench` reports the seconds
+@pytest.mark.parametrize("module", cold_start_modules())
+def test_entry_module_imports_no_heavy_modules(module):
+    result = measure_cold_start([module])[module]
+    assert result["error"] == ""
+    assert result["heavy_modules"] == []
+    assert result["seconds"] is not None
+
+
+def test_budget_check_flags_heavy_modules(tmp_path, monkeypatch):
+    # A module that loads a heavy dependency is reported, whatever its import time
+    pytest.importorskip("pandas")
+    (tmp_path / "eager_report.py").write_text("import pandas\n")
+    monkeypatch.setenv("PYTHONPATH", str(tmp_path))
+    result = measure_cold_start(["eager_report"], budget=3600)["eager_report"]
+    assert result["error"] == ""
+    assert result["heavy_modules"] == ["pandas"]
+    assert not result["within_budget"]
+
+
+def test_budget_check_flags_slow_imports():
+    result = measure_cold_start(["scripts.utils"], budget=0)["scripts.utils"]
+    assert result["heavy_modules"] == []
+    assert not result["within_budget"]
+
+
+def test_pandas_loads_on_first_spreadsheet():
+    pytest.importorskip("pandas")
+    loaded = run_fresh(
+        "import sys, json, tempfile\n"
+        "from scripts.utils import iter_file_chunks\n"
+        "before = 'pandas' in sys.modules\n"
+        "with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:\n"
+        "    f.write('name,score\\nada,1\\n')\n"
+        "chunks = list(iter_file_chunks(f.name, 'csv', {'filename': 'scores.csv'}))\n"
+        "print(json.dumps([before, 'pandas' in sys.modules, len(chunks)]))\n"
+    )
+    assert loaded == [False, True, 1]
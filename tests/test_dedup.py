@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+
+from scripts.benchmark import FakeEmbeddingClient
+from scripts.dedup import add_references
+from scripts.ingest import ingest_files, make_job
+from scripts.utils import EMBEDDING_PROVIDERS, register_embedding_client
+from scripts.vector_store import LocalVectorStore
+
+API_KEY = "test-dedup"
+
+
+def test_add_references_skips_known_references():
+    metadata = {"duplicate_count": 1, "duplicates": [{"filename": "a.csv", "row": 601}]}
+    add_references(metadata, 2, [{"filename": "a.csv", "row": 601}, {"filename": "a.csv", "row": 602}])
+    assert metadata == {"duplicate_count": 2, "duplicates": [{"filename": "a.csv", "row": 601}, {"filename": "a.csv", "row": 602}]}
+
+
+def test_reingesting_a_file_records_each_duplicate_once(isolated_caches):
+    register_embedding_client("Cohere", API_KEY, FakeEmbeddingClient(EMBEDDING_PROVIDERS["Cohere"]["dimension"]))
+    path = isolated_caches / "a.csv"
+    lines = ["name,score"] + [f"item {i},{i}" for i in range(600)] + ["item 0,0"]  # The last row repeats the first
+    path.write_text("\n".join(lines) + "\n")
+    store = LocalVectorStore(str(isolated_caches / "store"))
+
+    for _ in range(3):
+        job = make_job(str(path), table_batch_rows=100)
+        [(_, result)] = ingest_files([job], store, None, 1024, "Cohere", API_KEY, None, dedup="Document")
+        assert result["status"] == "uploaded", result["error"]
+
+    assert store.count() == 600
+    [first] = store.get(store.ids({"row": "1"}))
+    assert first["metadata"]["duplicate_count"] == 1
+    assert first["metadata"]["duplicates"] == [{"filename": "a.csv", "row": 601}]
+    store.close()
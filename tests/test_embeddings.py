@@ -0,0 +1,37 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from scripts.benchmark import FakeEmbeddingClient
+from scripts.utils import EMBEDDING_PROVIDERS, embed_batches, generate_embeddings, register_embedding_client
+
+API_KEY = "test-embeddings"
+TEXTS = ["first text", "second text", "third text", "fourth text"]
+
+
+@pytest.fixture
+def provider(isolated_caches):
+    client = FakeEmbeddingClient(EMBEDDING_PROVIDERS["Cohere"]["dimension"])
+    register_embedding_client("Cohere", API_KEY, client)
+    return client
+
+
+def expected(client, texts):
+    return np.asarray(client.embed(texts).embeddings, dtype=np.float32)
+
+
+def test_embed_batches_yields_cache_hits_first(provider):
+    generate_embeddings(TEXTS[2:], "Cohere", API_KEY, None)  # Cache the last two
+
+    batches = list(embed_batches(TEXTS, "Cohere", API_KEY, None))
+    assert [indices for indices, _ in batches] == [[2, 3], [0, 1]]
+    for indices, vectors in batches:
+        assert np.allclose(vectors, expected(provider, [TEXTS[i] for i in indices]))
+
+
+def test_generate_embeddings_returns_input_order(provider):
+    generate_embeddings(TEXTS[2:], "Cohere", API_KEY, None)
+
+    vectors = generate_embeddings(TEXTS, "Cohere", API_KEY, None)
+    assert len(vectors) == len(TEXTS)
+    assert np.allclose(np.stack(vectors), expected(provider, TEXTS))
@@ -0,0 +1,49 @@
+import sqlite3
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from scripts.search import LocalSearchIndex
+from scripts.vector_store import LocalVectorStore
+
+
+def make_row(content, embedding):
+    return {"content": content, "embedding": np.asarray(embedding, dtype=np.float32), "metadata": {"filename": "a.txt"}}
+
+
+# Connection whose next multi-row insert fails after the index has already seen the appended vectors
+class InterruptedConnection:
+    def __init__(self, conn, before_failure):
+        self.conn = conn
+        self.before_failure = before_failure
+
+    def executemany(self, *args):
+        self.before_failure()
+        raise sqlite3.OperationalError("disk I/O error")
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+def test_index_drops_vectors_of_a_failed_insert(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    store.add([make_row("first", [1, 0, 0, 0])])
+    # A second handle on the same directory, like the search page while the CLI ingests
+    reader = LocalVectorStore(str(tmp_path))
+    index = LocalSearchIndex(reader)
+    index.refresh()
+
+    store.conn = InterruptedConnection(store.conn, index.refresh)
+    with pytest.raises(sqlite3.OperationalError):
+        store.add([make_row("lost", [0, 5, 0, 0])])
+    store.conn = store.conn.conn
+    assert index.rows == 2  # Indexed before the rollback
+
+    store.add([make_row("replacement", [0, 0, 1, 0])])  # Reuses the rolled-back id
+    found, scores = index.search(np.asarray([0, 0, 1, 0], dtype=np.float32), k=1)
+    assert found.tolist() == [1]
+    assert scores[0] == pytest.approx(1.0)
+    assert [row["content"] for row in reader.get(found)] == ["replacement"]
+    store.close()
+    reader.close()
+    index.close()
@@ -0,0 +1,53 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from scripts.benchmark import FakeHTTPError
+from scripts.vector_store import BatchWriter
+
+
+# Store whose first `failures` inserts raise `error`; rows with content "bad" are always rejected
+class FlakyStore:
+    def __init__(self, error=None, failures=0):
+        self.error = error
+        self.failures = failures
+        self.calls = []
+        self.rows = []
+
+    def add(self, rows):
+        self.calls.append(len(rows))
+        if self.failures:
+            self.failures -= 1
+            raise self.error
+        if any(row["content"] == "bad" for row in rows):
+            raise ValueError("invalid row")
+        self.rows.extend(rows)
+        return len(rows)
+
+
+def make_rows(contents):
+    return [{"content": content, "embedding": [0.5, 0.5], "metadata": {}} for content in contents]
+
+
+def test_throttled_insert_retries_the_whole_batch():
+    store = FlakyStore(FakeHTTPError(429, retry_after=0.01), failures=2)
+    with BatchWriter(store, max_rows=100) as writer:
+        writer.add_many(make_rows(f"row {i}" for i in range(8)))
+    assert store.calls == [8, 8, 8]
+    assert writer.rows_written == 8 and writer.rows_failed == 0
+
+
+def test_rejected_insert_splits_to_isolate_bad_rows():
+    store = FlakyStore()
+    with BatchWriter(store, max_rows=100) as writer:
+        writer.add_many(make_rows(["a", "b", "bad", "c"]))
+    assert writer.rows_written == 3 and writer.rows_failed == 1
+    assert [row["content"] for row in store.rows] == ["a", "b", "c"]
+
+
+def test_exhausted_retries_fail_the_batch_without_splitting():
+    store = FlakyStore(FakeHTTPError(503, retry_after=0.01), failures=100)
+    with BatchWriter(store, max_rows=100) as writer:
+        writer.add_many(make_rows(["a", "b", "c", "d"]))
+    assert store.calls == [4] * 6  # The first attempt and five retries
+    assert writer.rows_written == 0 and writer.rows_failed == 4